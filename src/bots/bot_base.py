@@ -1,13 +1,17 @@
 from gui.popup import show_confirm_box, show_alert_box
 from trade_platforms.test_wrapper import TestWrapper
 from trade_platforms.validation_wrapper import ValidationWrapper
-from trade_platforms.platform_wrapper_base import PlatformWrapper
+from trade_platforms.platform_wrapper_base import PlatformWrapper, CYCLE_FETCH_ORDERBOOK, CYCLE_FETCH_PRICE
+from trade_platforms.multi_asset_ledger import MultiAssetLedger
+from trade_platforms.vectorized_backtest import run_vectorized_backtest, VectorizedBacktestResult
 
+from concurrent.futures import ThreadPoolExecutor
 import copy
 from datetime import timedelta
 from enum import Enum
 import pandas as pd
 import plotly.express as px
+import threading
 from typing import List
 
 
@@ -55,6 +59,15 @@ def _isPlotOption(config, option):
     return config & option.value == option.value
 
 
+## Trading state of a single market, the bot sets its per-market attributes on it
+#  (for example indicators or counters, see BotBase._init_market_state()).
+#  The attributes of the bot itself are shared by all markets.
+class MarketState():
+    def __init__(self, market):
+        ## Platform name of the market.
+        self.market = market
+
+
 class BotBase():
     """Base class to handle generic bot behaviour."""
 
@@ -68,11 +81,30 @@ class BotBase():
         self.platforms = dict()
         for trade_platform in platforms:
             self.platforms[trade_platform.name] = trade_platform
-        # Test mode platform client wrapper.
+        # Test and Validation mode platform client wrappers, one per market (platform name -> wrapper).
+        # The markets of a mode trade on a shared ledger and are evaluated in parallel, see evaluate().
+        self.testWrappers = dict()
+        self.validationWrappers = dict()
+        test_ledger = MultiAssetLedger()
+        validation_ledger = MultiAssetLedger()
+        for name in self.platforms.keys():
+            self.testWrappers[name] = TestWrapper(self.platforms, resolution_sec, market=name)
+            self.testWrappers[name].share_ledger(test_ledger)
+            self.validationWrappers[name] = ValidationWrapper(self.platforms, market=name)
+            self.validationWrappers[name].share_ledger(validation_ledger)
+        # Test mode platform client wrapper of the first market.
         # Contains all client side functionality for test mode.
-        self.testWrapper = TestWrapper(self.platforms, resolution_sec)
-        # Validation mode platform client wrapper.
-        self.validationWrapper = ValidationWrapper(self.platforms)
+        self.testWrapper = list(self.testWrappers.values())[0]
+        # Validation mode platform client wrapper of the first market.
+        self.validationWrapper = list(self.validationWrappers.values())[0]
+        # Market evaluated by the current thread, the API calls of the trade callback
+        # without market address this market. See _evaluate_market().
+        self.market_context = threading.local()
+        # Trading state per market (platform name -> MarketState), created on first use.
+        self.market_states = dict()
+        self.market_state_lock = threading.RLock()
+        # Evaluates the markets in parallel, created on the first multi-market cycle.
+        self.market_executor = None
         # Run mode. See Mode(Enum).
         self.mode = mode
         # if self.mode == Mode.Production and \
@@ -80,6 +112,8 @@ class BotBase():
         #     sys.exit(0)
         # Stores the candle resolution in minutes.
         self.resolution_sec = resolution_sec
+        # Headless mode, no plots are accumulated or shown. See set_headless().
+        self.headless = False
 
         # Plotting data
         self.BTC_per_window_of_interest = list()
@@ -113,17 +147,30 @@ class BotBase():
         """
 
         if self.mode == Mode.Production:
-            if market is None:
-                return list(self.platforms.values())[0]
-            else:
-                platform_name = f"{market[0]}-{market[1]}-{market[2]}"
-                if platform_name not in self.platforms:
-                    raise Exception(f"{platform_name} is an unknown market name")
-                return self.platforms[platform_name]
-        elif self.mode == Mode.Validation:
-            return self.validationWrapper
-        elif self.mode == Mode.Test:
-            return self.testWrapper
+            wrappers = self.platforms
+        else:
+            wrappers = self._simulated_wrappers()
+        if market is None:
+            wrapper = getattr(self.market_context, 'wrapper', None)
+            if wrapper is not None and self.mode != Mode.Production:
+                return wrapper
+            return list(wrappers.values())[0]
+        platform_name = f"{market[0]}-{market[1]}-{market[2]}"
+        if platform_name not in wrappers:
+            raise Exception(f"{platform_name} is an unknown market name")
+        return wrappers[platform_name]
+
+    ## Returns the simulated market wrappers of the Test or Validation mode (platform name -> wrapper).
+    def _simulated_wrappers(self):
+        if self.mode == Mode.Test:
+            return self.testWrappers
+        return self.validationWrappers
+
+    ## Returns the wrappers a setting applies to: the market, or every simulated market without market.
+    def _select_platform_wrappers(self, market) -> List[PlatformWrapper]:
+        if market is None and self.mode != Mode.Production:
+            return list(self._simulated_wrappers().values())
+        return [self._select_platform_wrapper(market)]
 
     def plot_data(self, timestamp, plots=0, config=0):
         """
@@ -132,6 +179,8 @@ class BotBase():
             Parameters:
                 - timestamp (datetime): stores the timestamp at the time of plotting.
         """
+        if self.headless:
+            return
         if _isPlotOption(plots, PlotOptions.Candles):
             self.plot_historical(
                 start_date=self.get_start_timestamp().timestamp(),
@@ -168,8 +217,11 @@ class BotBase():
     def accumulate_plot_data(self, timestamp, window_of_interest_min=15, config=0):
         """
             Accumulates plot data.
+            The plots follow the first market, the balances of the other markets are not plotted.
             Parameters:
                 - timestamp (datetime): stores the timestamp at the time of accumulation."""
+        if self.headless:
+            return
         # Generic tasks, collecting plot data within the window of interest
         if (timestamp - self.previous_timestamp >= timedelta(
                 seconds=window_of_interest_min * 60)):
@@ -178,8 +230,8 @@ class BotBase():
             current_balances = self.get_balances()
             length = len(self.BTC_per_window_of_interest) - 1
             self.BTC_per_window_of_interest[length] = \
-                current_balances['BTC']['total'] - \
-                self.previous_balances['BTC']['total']
+                current_balances[self.testWrapper.BASE]['total'] - \
+                self.previous_balances[self.testWrapper.BASE]['total']
             length = len(self.balance_USD_per_window_of_interest) - 1
             self.balance_USD_per_window_of_interest[length] = \
                 current_balances[self.testWrapper.USD]['total'] - \
@@ -213,7 +265,7 @@ class BotBase():
                 "BTC_start"]
 
             total = \
-                current_balances['BTC']['total'] + \
+                current_balances[self.testWrapper.BASE]['total'] + \
                 current_balances[self.testWrapper.USD]['total'] / self.get_current_price()
             self.output_base.loc[len(self.output_base)] = [
                 timestamp,
@@ -250,7 +302,7 @@ class BotBase():
             #     "BTC_USD_value"]
 
             total = \
-                current_balances['BTC']['usdValue'] + \
+                current_balances[self.testWrapper.BASE]['usdValue'] + \
                 current_balances[self.testWrapper.USD]['total']
             self.output_quote.loc[len(self.output_quote)] = [
                 timestamp,
@@ -318,9 +370,78 @@ class BotBase():
     def get_current_candle(self, market=None):
         return self._select_platform_wrapper(market).get_current_candle()
 
-    ## API: Returns the market data.
+    ## API: Returns the last count closed candles of a higher timeframe (for example '1h').
+    #  In Test mode set_resample_timeframes() has to be called before the run.
+    def get_closed_candles(self, timeframe, count, market=None):
+        return self._select_platform_wrapper(market).get_closed_candles(timeframe, count)
+
+    ## API: Enables resampling the test candles to higher timeframes. Only useful in Test mode.
+    #  @param timeframes list of timeframes, for example ['5m', '1h', '1d']
+    def set_resample_timeframes(self, timeframes, capacity=None):
+        for test_wrapper in self.testWrappers.values():
+            test_wrapper.set_resample_timeframes(timeframes, capacity)
+
+    ## API: Enables sub-candle tick replay in Test mode (see TestWrapper.set_sub_candle_ticks()).
+    #  @param tick_count number of ticks per candle, 0 replays whole candles.
+    #  @param seed seed of the intra-candle path generator, the markets use consecutive seeds.
+    def set_sub_candle_ticks(self, tick_count=15, seed=None):
+        for (index, test_wrapper) in enumerate(self.testWrappers.values()):
+            test_wrapper.set_sub_candle_ticks(tick_count, None if seed is None else seed + index)
+
+    ## API: Sets the synthetic orderbook the orders are matched against in Test mode
+    #  (see TestWrapper.set_synthetic_order_book()).
+    def set_synthetic_order_book(
+            self, depth=10, spread=0.0002, level_step=0.0001, volume_fraction=0.05, seed=None):
+        for (index, test_wrapper) in enumerate(self.testWrappers.values()):
+            test_wrapper.set_synthetic_order_book(
+                depth, spread, level_step, volume_fraction, None if seed is None else seed + index)
+
+    ## API: Keeps the market data (price, orderbook and current candle) of the platforms up to date
+    #  from WebSocket streams instead of polling them every cycle.
+    #  Only useful in Validation and Production mode.
+    #  @param enabled false stops the streams, the market data is polled again.
+    def set_streaming(self, enabled=True):
+        if self.mode == Mode.Test:
+            show_alert_box("You are using set_streaming(). \
+It does not do anything in test mode")
+            return
+        for trade_platform in self.platforms.values():
+            if enabled:
+                trade_platform.start_streaming(self.resolution_sec)
+            else:
+                trade_platform.stop_streaming()
+
+    ## API: Starts the cycles at the candle boundaries (every resolution_sec seconds plus the offset)
+    #  instead of waiting a fixed time between them. Missed boundaries of an overrunning cycle are
+    #  skipped and reported. Only useful in Validation and Production mode.
+    #  @param offset_sec delay after the candle close, gives the platform time to publish the candle.
+    #  @param enabled false restores the fixed wait time.
+    def set_cycle_alignment(self, market=None, offset_sec=0.0, enabled=True):
+        if self.mode == Mode.Test:
+            show_alert_box("You are using set_cycle_alignment(). \
+It does not do anything in test mode")
+            return
+        period_sec = self.resolution_sec if enabled else None
+        for wrapper in self._select_platform_wrappers(market):
+            wrapper.set_cycle_alignment(period_sec, offset_sec)
+
+    ## API: Declares the market data fetched at the beginning of every cycle
+    #  (see PlatformWrapper.set_cycle_fetches()). Remote fetches run in parallel, undeclared data
+    #  is not fetched. Declaring 'balances' serves get_balances() from the cycle fetch.
+    #  @param deadline_sec seconds a cycle waits for its fetches, late results are discarded, the data keeps its previous value.
+    def set_cycle_fetches(
+            self, market=None, fetches=(CYCLE_FETCH_ORDERBOOK, CYCLE_FETCH_PRICE), deadline_sec=None):
+        for wrapper in self._select_platform_wrappers(market):
+            wrapper.set_cycle_fetches(fetches, deadline_sec)
+
+    ## API: Returns the timing statistics of the aligned cycles (see set_cycle_alignment()).
+    def get_cycle_stats(self, market=None):
+        return self._select_platform_wrapper(market).get_cycle_stats()
+
+    ## API: Sets the wait time between cycles, of every simulated market without market.
     def set_wait_time(self, market=None, wait_time_seconds=0):
-        return self._select_platform_wrapper(market).set_wait_time(wait_time_seconds)
+        for wrapper in self._select_platform_wrappers(market):
+            wrapper.set_wait_time(wait_time_seconds)
 
     ## API: Returns the market data.
     def market_data(self, market=None):
@@ -353,32 +474,136 @@ class BotBase():
         return self._select_platform_wrapper(market).plot_historical(
             start_date, end_date, resolution)
 
-    def get_candle_plot(self, market=0):
+    def get_candle_plot(self, market=None):
         return self._select_platform_wrapper(market).get_candle_plot()
 
-    def show_plot(self, plots, market=0):
+    def show_plot(self, plots, market=None):
+        if self.headless:
+            return
         if _isPlotOption(plots, PlotOptions.Candles):
             self._select_platform_wrapper(market).show_candles()
 
+    ## API: Enables headless mode. No plots are collected or shown and the test progress is not printed.
+    #  Used when running bots in background processes, for example in a parameter sweep.
+    def set_headless(self, headless=True):
+        self.headless = headless
+        for test_wrapper in self.testWrappers.values():
+            test_wrapper.headless = headless
+
     ## Base class method for running the bot.
     def run(self):
         pass
 
+    def run_vectorized(self, initial_position: float = 0.0) -> VectorizedBacktestResult:
+        """
+            Runs the bot on the whole test data interval at once using the vectorized _signal().
+            Fills, fees and the equity curve are computed in bulk, so it is meant to quickly screen
+            ideas before running them cycle by cycle. Only available in Test mode.
+
+            Parameters:
+                - initial_position (float): fraction of the start balance held in base currency.
+
+            Returns:
+                - (VectorizedBacktestResult): the equity curve, positions, fees and metrics.
+        """
+        if self.mode != Mode.Test:
+            raise Exception("run_vectorized() is only available in Test mode")
+        candles = self.testWrapper.get_data_columns()
+        positions = self._signal(candles)
+        if positions is None:
+            raise Exception("run_vectorized(): _signal() is not implemented by the bot")
+        return run_vectorized_backtest(
+            candles,
+            positions,
+            start_balance=self.testWrapper.get_balances()[self.testWrapper.USD]['total'],
+            fee=self.testWrapper.get_account_info()['takerFee'],
+            initial_position=initial_position)
+
     ## Evaluates the platform side procedures. For example, returning current market data.
+    #  In Test and Validation mode every market is evaluated in parallel, unless market is given,
+    #  the trade callback is called once per market (see _evaluate_markets()).
+    #  The callbacks of the markets run at the same time, per-market state belongs to get_market_state().
     def evaluate(self, trade, market=None):
+        if market is None and self.mode != Mode.Production and len(self._simulated_wrappers()) > 1:
+            return self._evaluate_markets(trade)
         return self._select_platform_wrapper(market).evaluate(trade)
 
+    ## Evaluates the simulated markets in parallel.
+    #  The market data, the replay, the order matching and the trade callbacks of the markets
+    #  run in parallel. The API calls of the trade callback without market address the market
+    #  it is called for. The attributes of the bot are shared by the markets, the per-market
+    #  trading state is kept in get_market_state().
+    #  Test mode replays the markets in time order: only the markets having the earliest next
+    #  candle are evaluated, a market missing a candle skips the cycle.
+    #  @return (running, timestamp), running is false if any market stopped.
+    def _evaluate_markets(self, trade):
+        markets = list(self._simulated_wrappers().items())
+        if self.mode == Mode.Test:
+            next_times = [test_wrapper.next_candle_time() for (_, test_wrapper) in markets]
+            if all(next_time is None for next_time in next_times):
+                # End of the playback, the wrappers report it.
+                results = [test_wrapper.evaluate(trade) for (_, test_wrapper) in markets]
+                return (False, max(timestamp for (_, timestamp) in results))
+            first_time = min(next_time for next_time in next_times if next_time is not None)
+            markets = [market for (market, next_time) in zip(markets, next_times) if next_time == first_time]
+        if self.market_executor is None:
+            self.market_executor = ThreadPoolExecutor(
+                max_workers=len(self._simulated_wrappers()), thread_name_prefix='MarketEvaluation')
+        results = list(self.market_executor.map(
+            lambda market: self._evaluate_market(market[0], market[1], trade), markets))
+        running = all(market_running for (market_running, _) in results)
+        return (running, min(timestamp for (_, timestamp) in results))
+
+    def _evaluate_market(self, name, wrapper, trade):
+        self.market_context.name = name
+        self.market_context.wrapper = wrapper
+        try:
+            return wrapper.evaluate(trade)
+        finally:
+            self.market_context.name = None
+            self.market_context.wrapper = None
+
+    ## API: Returns the trading state (MarketState) of the market.
+    #  Without market it is the state of the market the trade callback is called for,
+    #  the state of the first market outside of the callbacks.
+    #  The state is created and initialized by _init_market_state() on first use.
+    def get_market_state(self, market=None):
+        if market is not None:
+            name = f"{market[0]}-{market[1]}-{market[2]}"
+            if name not in self.platforms:
+                raise Exception(f"{name} is an unknown market name")
+        else:
+            name = getattr(self.market_context, 'name', None)
+            if name is None:
+                name = list(self.platforms.keys())[0]
+        with self.market_state_lock:
+            if name not in self.market_states:
+                state = MarketState(name)
+                self._init_market_state(state)
+                self.market_states[name] = state
+            return self.market_states[name]
+
     ## Maintenance work at the end of the iteration.
     def cleanup_iteration(self, market=None):
-        return self._select_platform_wrapper(market).cleanup_iteration()
+        for wrapper in self._select_platform_wrappers(market):
+            wrapper.cleanup_iteration()
 
     ## Sets test data interval. Only useful in Test mode.
+    #  @param test_data_location data set location(s) of the markets (see TestWrapper.set_data_interval()),
+    #  or a dictionary of platform name -> location(s) when several markets are traded.
+    #  None looks the data sets of every market up in the data set catalog.
     def set_test_data_interval(self, test_data_location, start_time, end_time):
         if self.mode != Mode.Test:
             show_alert_box("You are using set_data_interval(). \
 It does not do anything in production, or validation mode")
             return
-        self.testWrapper.set_data_interval(test_data_location, start_time, end_time)
+        for (name, test_wrapper) in self.testWrappers.items():
+            location = test_data_location
+            if isinstance(test_data_location, dict):
+                if name not in test_data_location:
+                    raise Exception(f"set_test_data_interval(): No test data given for {name}")
+                location = test_data_location[name]
+            test_wrapper.set_data_interval(location, start_time, end_time)
 
     ## Sets test or validation start balance. Only useful in Test and Validation mode.
     def set_start_balance(self, balance_USD):
@@ -386,7 +611,8 @@ It does not do anything in production, or validation mode")
             show_alert_box("You are using set_start_balance(df). \
 It does not do anything in production mode")
             return
-        self.testWrapper.set_start_balance(balance_USD)
+        # The markets share the ledger, the balance is set once.
+        self._select_platform_wrapper(None).set_start_balance(balance_USD)
 
     ## API: Gets the starting timestamp of the bot execution.
     def get_start_timestamp(self):
@@ -403,3 +629,15 @@ It does not do anything in production mode")
     ## Base class method of trading.
     def _trade(self):
         pass
+
+    ## Base class method initializing the trading state of a market (see get_market_state()).
+    #  @param state MarketState the bot sets its per-market attributes on.
+    def _init_market_state(self, state):
+        pass
+
+    ## Base class method of the vectorized trading signal used by run_vectorized().
+    #  @param candles dictionary of column name -> NumPy array of the whole test interval.
+    #  @return array of target positions (fraction of the equity held in base currency) per candle,
+    #  NaN keeps the previous position.
+    def _signal(self, candles):
+        return None
@@ -11,9 +11,16 @@ class HelloBot(BotBase):
     """
     def __init__(self, platforms, mode=Mode.Test, resolution_sec=60):
         super(HelloBot, self).__init__(platforms, mode, resolution_sec)
-        self.count = 0
+        self.order_id_watermark = 0
+
+    def _init_market_state(self, state):
+        """
+            Initializes the trading state of a market. The markets of a multi-market bot
+            trade in parallel, anything that belongs to a single market is kept here.
+        """
+        state.count = 0
         # Arbitrary structure to show order visualization.
-        self.completed_orders = pd.DataFrame({
+        state.completed_orders = pd.DataFrame({
             'order_id': [],
             'expiry_length': [],
             'status': [],
@@ -27,15 +34,14 @@ class HelloBot(BotBase):
             'side': [],
         })
 
-        self.order_id_watermark = 0
-
     def _determine_bias(self):
         """
             Implement your way of market bias detector
             This example will switch bias every cycle.
         """
-        self.count += 1
-        if self.count % 2 == 1:
+        state = self.get_market_state()
+        state.count += 1
+        if state.count % 2 == 1:
             return 'bullish'
         return 'bearish'
 
@@ -70,7 +76,8 @@ class HelloBot(BotBase):
                     'start_price': 7184,
                     'side': 'buy',
                 })
-                self.completed_orders = pd.concat([self.completed_orders, new_order])
+                state = self.get_market_state()
+                state.completed_orders = pd.concat([state.completed_orders, new_order])
             else:
                 # Order failed. Balance has not enough free amount'
                 pass
@@ -78,7 +85,6 @@ class HelloBot(BotBase):
 
     def _setup(self):
         """Load your test data set or any local variables, members if needed."""
-        self.count = 0
         # Setup the main loop with an initial evaluation.
         (running, timestamp) = self.evaluate(self._trade)
         # Optional: Setup plot data
@@ -125,7 +131,7 @@ class HelloBot(BotBase):
                 # BaseCurrencyFree = 0x0100
                 # Candle price history
                 # Candles = 0x0200
-                self.accumulate_plot_data(timestamp, window_of_interest_seconds=15)
+                self.accumulate_plot_data(timestamp, window_of_interest_min=15)
                 ##########################
 
                 ##########################
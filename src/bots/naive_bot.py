@@ -1,6 +1,8 @@
 from plotly.subplots import make_subplots
-from bots.bot_base import Mode, BotBase
+from bots.bot_base import Mode, BotBase, PlotOptions
+from bots.utils.indicators import RollingSum
 
+import numpy as np
 import pandas as pd
 from os.path import exists
 from datetime import datetime, timedelta
@@ -45,15 +47,28 @@ class NaiveBot(BotBase):
     FTX_DATASET_PATH = 'src/bots/data/candle_\
 dataset_ftx_20200101-20220101_minutes_res_day_chunks.h5'
 
-    def __init__(self, platforms, mode=Mode.Test):
-        super(NaiveBot, self).__init__(platforms, mode)
+    def __init__(self, platforms, mode=Mode.Test, resolution_sec=60, price_offset=500, candle_count=5):
+        super(NaiveBot, self).__init__(platforms, mode, resolution_sec)
+        ## Distance of the closing order price from the market price.
+        self.price_offset = price_offset
+        ## Number of candles the market structure is determined from.
+        self.candle_count = candle_count
         self.BTC_per_window_of_interest = list()
         self.balance_USD_per_window_of_interest = list()
-        self.candle_history_accumulator = 0
-        self.candle_history = list()
+
+    ## Every market tracks the sum of the directions of its last candle_count non-doji candles.
+    def _init_market_state(self, state):
+        state.candle_direction_sum = RollingSum(self.candle_count)
 
     def run(self):
-        self.order_based_on_candle_direction_TEST()
+        """Main loop of the algorithm."""
+        (running, timestamp) = self.evaluate(self._trade)
+        self.init_plot_data()
+        while running:
+            (running, timestamp) = self.evaluate(self._trade)
+            self.accumulate_plot_data(timestamp)
+            self.cleanup_iteration()
+        self.plot_data(timestamp, PlotOptions.USDPlot.value | PlotOptions.BTCPlot.value)
 
     def train(self):
         if not exists(self.FTX_DATASET_PATH):
@@ -256,21 +271,48 @@ dataset_ftx_20200101-20220101_minutes_res_day_chunks.h5'
         if df['close'] < df['open']:
             diff = -1
 
+        candle_direction_sum = self.get_market_state().candle_direction_sum
         if diff != 0:
-            self.candle_history_accumulator += diff
-            self.candle_history.append(diff)
+            candle_direction_sum.update(diff)
 
-        if len(self.candle_history) > 5:
-            self.candle_history_accumulator -= self.candle_history[0]
-            self.candle_history.pop(0)
-
-        if len(self.candle_history) >= 5:
-            if self.candle_history_accumulator > 2.0:
+        if candle_direction_sum.ready:
+            if candle_direction_sum.value > 2.0:
                 return 'bullish'
-            elif self.candle_history_accumulator < -2.0:
+            elif candle_direction_sum.value < -2.0:
                 return 'bearish'
         return 'uncertain'
 
+    ## Vectorized version of _determine_market_structure_based_last_x_candles().
+    #  @return array of 1 (bullish), -1 (bearish) and 0 (uncertain) per candle.
+    def _market_structure_based_last_x_candles_vectorized(self, candles):
+        candle_count = self.candle_count
+        direction = np.sign(candles['close'] - candles['open'])
+        # Only the non-doji candles are counted, like in the cyclic version.
+        changed = np.flatnonzero(direction)
+        structure = np.zeros(len(direction))
+        if len(changed) < candle_count:
+            return structure
+        accumulated = np.cumsum(direction[changed])
+        window_sum = accumulated.copy()
+        window_sum[candle_count:] -= accumulated[:-candle_count]
+        window_structure = np.where(
+            window_sum > 2.0, 1.0, np.where(window_sum < -2.0, -1.0, 0.0))
+        window_structure[:candle_count - 1] = 0.0
+        # Doji candles keep the structure of the last non-doji candle.
+        last_changed = np.searchsorted(changed, np.arange(len(direction)), side='right') - 1
+        valid = last_changed >= 0
+        structure[valid] = window_structure[last_changed[valid]]
+        return structure
+
+    ## Vectorized signal for BotBase.run_vectorized().
+    #  Holds base currency in bullish and quote currency in bearish market structure.
+    def _signal(self, candles):
+        structure = self._market_structure_based_last_x_candles_vectorized(candles)
+        positions = np.full(len(structure), np.nan)
+        positions[structure > 0] = 1.0
+        positions[structure < 0] = 0.0
+        return positions
+
     def _determine_market_structure_based_on_candle_direction(self, df):
         if df['close'] > df['open']:
             return 'bullish'
@@ -303,7 +345,7 @@ dataset_ftx_20200101-20220101_minutes_res_day_chunks.h5'
             order_result = self.place_order(
                 side='buy', price=price, volume=order_volume_USD / market_value)
             if order_result is not None:
-                price = market_value + 500
+                price = market_value + self.price_offset
                 order_result = self.place_order(
                     side='sell', price=price, volume=order_volume_USD / market_value)
         elif market_structure == 'bearish':
@@ -311,7 +353,7 @@ dataset_ftx_20200101-20220101_minutes_res_day_chunks.h5'
             order_result = self.place_order(
                 side='sell', price=price, volume=order_volume_USD / market_value)
             if order_result is not None:
-                price = market_value - 500
+                price = market_value - self.price_offset
                 order_result = self.place_order(
                     side='buy', price=price, volume=order_volume_USD / market_value)
 
@@ -320,16 +362,19 @@ dataset_ftx_20200101-20220101_minutes_res_day_chunks.h5'
         order_volume_USD = 1
         market_structure = self._determine_market_structure(df)
         if market_structure == 'bullish':
-            price = market_value + 500
+            price = market_value + self.price_offset
             self.place_order(
                 side='sell', price=price, volume=order_volume_USD / market_value)
         elif market_structure == 'bearish':
-            price = market_value - 500
+            price = market_value - self.price_offset
             self.place_order(
                 side='buy', price=price, volume=order_volume_USD / market_value)
 
-    def _trade(self, df):
+    def _trade(self, df=None):
+        if df is None:
+            df = self.get_current_candle()
         self._trade_on_predicted_market_structure(df)
+        return True
 
     ## Naive algorithm to buy and sell at fixed price and volume,
     # based on the candle direction
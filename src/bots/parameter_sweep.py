@@ -0,0 +1,148 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import product
+from multiprocessing import shared_memory
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from bots.bot_base import Mode
+from trade_platforms.candle_columns import CandleColumns
+
+# Test data set attached from shared memory in the worker processes.
+_shared_candles = None
+# Shared memory handles of the worker process, they must live as long as the arrays using them.
+_shared_blocks = list()
+
+
+def _share_candles(candles: CandleColumns):
+    """
+        Copies the numeric columns of the data set to shared memory blocks.
+
+        Returns:
+            - blocks (list): the created shared memory blocks.
+            - descriptors (list): (column name, block name, dtype, length) per column.
+    """
+    blocks = list()
+    descriptors = list()
+    for name, column in candles.columns.items():
+        if column.dtype.hasobject:
+            # Object columns can not be shared, and they are not used by the replay.
+            continue
+        block = shared_memory.SharedMemory(create=True, size=max(column.nbytes, 1))
+        shared = np.ndarray(column.shape, dtype=column.dtype, buffer=block.buf)
+        shared[:] = column
+        blocks.append(block)
+        descriptors.append((name, block.name, column.dtype.str, len(column)))
+    return (blocks, descriptors)
+
+
+def _attach_shared_candles(descriptors, datetime_columns):
+    """Process pool initializer, attaches the data set shared by the parent process."""
+    global _shared_candles
+    columns = dict()
+    for (name, block_name, dtype, length) in descriptors:
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared_blocks.append(block)
+        column = np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+        column.flags.writeable = False
+        columns[name] = column
+    _shared_candles = CandleColumns(columns, datetime_columns)
+
+
+def _default_platforms():
+    from trade_platforms.binance_wrapper import Binance
+    return [Binance(base_currency="BTC", quote_currency="USDT")]
+
+
+def _run_single(bot_class, parameters, platforms, start_time, end_time, start_balance, vectorized):
+    """Runs a single headless test of the bot on the shared data set and returns its metrics."""
+    begin = time.time()
+    try:
+        if platforms is None:
+            platforms = _default_platforms()
+        bot = bot_class(platforms=platforms, mode=Mode.Test, **parameters)
+        bot.set_headless(True)
+        bot.testWrapper.set_data_columns(_shared_candles, start_time, end_time)
+        bot.set_start_balance(start_balance)
+        bot.set_wait_time(wait_time_seconds=0)
+        if vectorized:
+            metrics = bot.run_vectorized().metrics()
+        else:
+            bot.run()
+            wrapper = bot.testWrapper
+            balances = wrapper.get_balances()
+            price = wrapper.get_current_price()
+            quote_total = balances[wrapper.USD]['total']
+            base_total = balances[wrapper.BASE]['total']
+            metrics = {
+                "start_balance": start_balance,
+                "final_balance": quote_total + base_total * price,
+                "quote_total": quote_total,
+                "base_total": base_total,
+                "final_price": price,
+                "cycles": wrapper.row_progress - wrapper.start_row,
+                "orders": wrapper.order_id_watermark,
+                "open_orders": len(wrapper.orders)
+            }
+        metrics["total_return"] = metrics["final_balance"] / start_balance - 1.0
+        metrics["error"] = None
+    except Exception:
+        metrics = {"error": traceback.format_exc()}
+    metrics["exec_time"] = time.time() - begin
+    return metrics
+
+
+def run_parameter_sweep(
+        bot_class,
+        parameter_grid: dict,
+        dataset_file: str,
+        start_time: datetime,
+        end_time: datetime,
+        start_balance: float = 200,
+        platforms: list = None,
+        vectorized: bool = False,
+        max_workers: int = None) -> pd.DataFrame:
+    """
+        Runs the bot in Test mode for every combination of the parameter grid on a process pool.
+        The data set is loaded once and shared with the workers through shared memory.
+        The runs are headless, no popups, plots or progress prints are made.
+
+        Parameters:
+            - bot_class (class): the bot to run, the parameters are passed to its constructor.
+            - parameter_grid (dict): constructor argument name -> list of values to try.
+            - dataset_file (str): data set generated by generate_candle_historical_dataset().
+            - start_time (datetime): test data feed starting time.
+            - end_time (datetime): test data feed end time.
+            - start_balance (float): start balance in quote currency.
+            - platforms (list): platform wrappers passed to the bot, default is Binance BTC/USDT.
+            - vectorized (bool): runs the bot with run_vectorized() instead of run().
+            - max_workers (int): number of worker processes, default is the number of CPUs.
+
+        Returns:
+            - (pd.DataFrame): one row per parameter combination with the parameters and the run metrics.
+    """
+    names = list(parameter_grid.keys())
+    combinations = [dict(zip(names, values)) for values in product(*parameter_grid.values())]
+    candles = CandleColumns.from_hdf(dataset_file)
+    (blocks, descriptors) = _share_candles(candles)
+    try:
+        with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_attach_shared_candles,
+                initargs=(descriptors, candles.datetime_columns)) as executor:
+            futures = [
+                executor.submit(
+                    _run_single, bot_class, parameters, platforms,
+                    start_time, end_time, start_balance, vectorized)
+                for parameters in combinations]
+            results = [future.result() for future in futures]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    rows = [{**parameters, **metrics} for (parameters, metrics) in zip(combinations, results)]
+    return pd.DataFrame(rows)
@@ -1,3 +1,7 @@
+from collections import deque
+import numpy as np
+
+
 ## Single sample stored in the alpha-beta filter containers.
 class Sample:
     def __init__(self, price, t):
@@ -9,38 +13,225 @@ class Sample:
 
 
 ## Execute alpha-beta data filtering and prediction.
+#  By default every sample and price change is kept (history_size=None),
+#  history_size=0 keeps none of them (constant memory) and history_size=N keeps the last N.
 class AlphaBetaFilter:
-    def __init__(self, init_sample, alpha=1, beta=0.1, price_change=0.0):
+    def __init__(self, init_sample, alpha=1, beta=0.1, price_change=0.0, history_size=None):
         ## Alpha parameter (to compensate price error)
         self.alpha = alpha
         ## Beta parameter (to compensate price change error)
         self.beta = beta
         ## Stores the price changes.
-        self.price_change_list = [price_change]
-        ## Stores all the price samples
-        self.sample_list = [init_sample]
+        self.price_change_list = [price_change] if history_size is None else \
+            deque([price_change], maxlen=history_size)
+        ## Stores the price samples
+        self.sample_list = [init_sample] if history_size is None else \
+            deque([init_sample], maxlen=history_size)
+        self.last_price = init_sample.price
+        self.last_time = init_sample.time
+        self.last_price_change = price_change
+        self.history_size = history_size
         self.predicted_price = 0
         self.predicted_price_change = 0
 
     @property
     def last_sample(self):
-        return self.sample_list[-1]
-
-    @property
-    def last_price_change(self):
-        return self.price_change_list[-1]
+        return Sample(self.last_price, self.last_time)
 
     ## Stores the new sample and predicts the new price.
     def add_sample(self, s: Sample):
-        delta_t = s.time - self.last_sample.time
+        self.add_price(s.price, s.time, s)
+
+    ## Same as add_sample() without allocating a Sample, unless the history is kept.
+    def add_price(self, price, t, sample=None):
+        delta_t = t - self.last_time
         self.predicted_price = \
             self.predicted_price + (delta_t * self.last_price_change)
         self.predicted_price_change = self.last_price_change
-        error = s.price - self.predicted_price
+        error = price - self.predicted_price
         self.predicted_price = self.predicted_price + self.alpha * error
         self.predicted_price_change = \
             self.predicted_price_change + (self.beta / delta_t) * error
 
+        self.last_price = price
+        self.last_time = t
+        self.last_price_change = self.predicted_price_change
         # for debugging and results
-        self.price_change_list.append(self.predicted_price_change)
-        self.sample_list.append(s)
+        if self.history_size != 0:
+            self.price_change_list.append(self.predicted_price_change)
+            self.sample_list.append(Sample(price, t) if sample is None else sample)
+
+
+## The filter step is an affine map of the (price, price change) state:
+#  state' = M * state + c, with
+#  M = [[1 - alpha, (1 - alpha) * dt], [-beta / dt, 1 - beta]] and c = [alpha, beta / dt] * price.
+#  The series is cut to about sqrt(n) blocks of sqrt(n) samples. First the maps of every block
+#  are composed (vectorized over the blocks and filters), then the block start states are chained,
+#  finally the filter runs from every block start at once.
+#  So there are only O(sqrt(n)) NumPy steps per series.
+def _filter_states(prices, delta_t, alpha, beta, predicted_price, price_change):
+    """Returns the filtered price and price change (K, n) after each sample starting from the given state."""
+    (alpha, beta) = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(alpha, dtype=np.float64)), np.atleast_1d(np.asarray(beta, dtype=np.float64)))
+    filter_count = len(alpha)
+    length = len(prices)
+    block_size = max(1, int(np.ceil(np.sqrt(length))))
+    block_count = -(-length // block_size)
+    padding = block_count * block_size - length
+    # Padded steps are cut from the result.
+    prices = np.concatenate((prices, np.zeros(padding))).reshape(block_count, block_size)
+    delta_t = np.concatenate((delta_t, np.ones(padding))).reshape(block_count, block_size)
+    alpha = alpha[:, np.newaxis]
+    beta = beta[:, np.newaxis]
+
+    # Composed map of every block, shape (K, blocks).
+    shape = (filter_count, block_count)
+    (m11, m12, m21, m22) = (np.ones(shape), np.zeros(shape), np.zeros(shape), np.ones(shape))
+    (c1, c2) = (np.zeros(shape), np.zeros(shape))
+    s11 = 1.0 - alpha
+    s22 = 1.0 - beta
+    for step in range(block_size):
+        price = prices[:, step]
+        s12 = s11 * delta_t[:, step]
+        s21 = -beta / delta_t[:, step]
+        (m11, m12, m21, m22, c1, c2) = (
+            s11 * m11 + s12 * m21, s11 * m12 + s12 * m22,
+            s21 * m11 + s22 * m21, s21 * m12 + s22 * m22,
+            s11 * c1 + s12 * c2 + alpha * price, s21 * c1 + s22 * c2 - s21 * price)
+
+    # State at the start of every block.
+    block_prices = np.empty(shape)
+    block_changes = np.empty(shape)
+    block_prices[:, 0] = predicted_price
+    block_changes[:, 0] = price_change
+    for block in range(1, block_count):
+        previous_price = block_prices[:, block - 1]
+        previous_change = block_changes[:, block - 1]
+        block_prices[:, block] = \
+            m11[:, block - 1] * previous_price + m12[:, block - 1] * previous_change + c1[:, block - 1]
+        block_changes[:, block] = \
+            m21[:, block - 1] * previous_price + m22[:, block - 1] * previous_change + c2[:, block - 1]
+
+    # The filter itself from every block start, the same arithmetic as AlphaBetaFilter.add_price().
+    filtered_prices = np.empty((filter_count, block_size, block_count))
+    filtered_changes = np.empty((filter_count, block_size, block_count))
+    (predicted, change) = (block_prices, block_changes)
+    for step in range(block_size):
+        dt = delta_t[:, step]
+        predicted = predicted + dt * change
+        error = prices[:, step] - predicted
+        predicted = predicted + alpha * error
+        change = change + (beta / dt) * error
+        filtered_prices[:, step] = predicted
+        filtered_changes[:, step] = change
+    return (
+        filtered_prices.transpose(0, 2, 1).reshape(filter_count, -1)[:, :length],
+        filtered_changes.transpose(0, 2, 1).reshape(filter_count, -1)[:, :length])
+
+
+def _delta_times(prices, times):
+    if times is None:
+        return np.ones(len(prices) - 1)
+    return np.diff(np.asarray(times, dtype=np.float64))
+
+
+def alpha_beta_filter(prices, times=None, alpha=1, beta=0.1, price_change=0.0, predicted_price=0.0):
+    """
+        Filters a whole price series at once, vectorized over blocks of the series (and the filters).
+        The result equals adding the samples one by one to an AlphaBetaFilter
+        created with the first sample (up to floating point rounding).
+
+        Parameters:
+            - prices (np.ndarray): the price samples, the first one initializes the filter.
+            - times (np.ndarray): time of the samples (numbers), None means one time unit per sample.
+            - alpha (float or np.ndarray): alpha parameter, an array of K values filters with K filters.
+            - beta (float or np.ndarray): beta parameter, broadcast with alpha.
+            - price_change (float): initial price change.
+            - predicted_price (float): initial predicted price.
+
+        Returns:
+            - predicted_prices (np.ndarray): predicted price after each sample but the first,
+              shape (n - 1,) or (K, n - 1).
+            - predicted_price_changes (np.ndarray): predicted price changes, same shape.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if len(prices) < 2:
+        shape = np.broadcast(np.asarray(alpha), np.asarray(beta)).shape + (0,)
+        return (np.empty(shape), np.empty(shape))
+    (predicted_prices, predicted_price_changes) = _filter_states(
+        prices[1:], _delta_times(prices, times), alpha, beta, predicted_price, price_change)
+    if np.ndim(alpha) == 0 and np.ndim(beta) == 0:
+        return (predicted_prices[0], predicted_price_changes[0])
+    return (predicted_prices, predicted_price_changes)
+
+
+## Runs many alpha-beta filters (pairs of alpha and beta) over the same price series at once,
+#  for example to tune the filter parameters. The series is processed in chunks,
+#  vectorized over the filters and blocks of the chunk, so the memory use is bounded by chunk_size:
+#  about 8 float64 work arrays of chunk_size values, 64 * chunk_size bytes (4 MiB at the default).
+#  The filters start from the first price, one step prediction errors are accumulated per filter.
+class AlphaBetaFilterBank:
+    def __init__(self, alphas, betas, price_change=0.0, chunk_size=1 << 16):
+        (alphas, betas) = np.broadcast_arrays(
+            np.asarray(alphas, dtype=np.float64), np.asarray(betas, dtype=np.float64))
+        self.alphas = alphas.ravel()
+        self.betas = betas.ravel()
+        ## Number of filter and time step values processed at once (filters * time steps of a chunk).
+        self.chunk_size = chunk_size
+        self.predicted_prices = None
+        self.predicted_price_changes = np.full(len(self.alphas), float(price_change))
+        self.last_time = None
+        self.squared_error_sum = np.zeros(len(self.alphas))
+        self.error_count = 0
+
+    def __len__(self):
+        return len(self.alphas)
+
+    ## Feeds the next part of the price series to every filter.
+    #  @param times time of the samples, None means one time unit per sample.
+    def add_prices(self, prices, times=None):
+        prices = np.asarray(prices, dtype=np.float64)
+        if times is None:
+            first = 0.0 if self.last_time is None else self.last_time + 1.0
+            times = first + np.arange(len(prices), dtype=np.float64)
+        times = np.asarray(times, dtype=np.float64)
+        if len(prices) == 0:
+            return
+        if self.predicted_prices is None:
+            # The first sample initializes the filters.
+            self.predicted_prices = np.full(len(self.alphas), prices[0])
+            self.last_time = times[0]
+            prices = prices[1:]
+            times = times[1:]
+            if len(prices) == 0:
+                return
+        step = max(1, self.chunk_size // len(self.alphas))
+        for first in range(0, len(prices), step):
+            self._add_chunk(prices[first:first + step], times[first:first + step])
+
+    def _add_chunk(self, prices, times):
+        delta_t = np.diff(np.concatenate(([self.last_time], times)))
+        (filtered, changes) = _filter_states(
+            prices, delta_t, self.alphas, self.betas,
+            self.predicted_prices, self.predicted_price_changes)
+        # One step prediction before each sample is seen.
+        previous_prices = np.concatenate((self.predicted_prices[:, np.newaxis], filtered[:, :-1]), axis=1)
+        previous_changes = np.concatenate(
+            (self.predicted_price_changes[:, np.newaxis], changes[:, :-1]), axis=1)
+        errors = prices - (previous_prices + delta_t * previous_changes)
+        self.squared_error_sum += np.einsum('ij,ij->i', errors, errors)
+        self.error_count += len(prices)
+        self.predicted_prices = filtered[:, -1].copy()
+        self.predicted_price_changes = changes[:, -1].copy()
+        self.last_time = times[-1]
+
+    ## Root mean square of the one step prediction errors per filter.
+    def prediction_errors(self):
+        if self.error_count == 0:
+            return np.full(len(self.alphas), np.nan)
+        return np.sqrt(self.squared_error_sum / self.error_count)
+
+    ## Returns the (alpha, beta) pair with the smallest prediction error.
+    def best(self):
+        index = int(np.nanargmin(self.prediction_errors()))
+        return (float(self.alphas[index]), float(self.betas[index]))
@@ -0,0 +1,459 @@
+##############################################################
+## Streaming technical indicators.
+## Every indicator updates in constant time and memory per candle
+## and has a vectorized batch function giving the same results over a whole array
+## (up to floating point rounding for the recursive EMA, RSI and ATR),
+## so a bot can warm up an indicator on history instantly and keep updating
+## it cycle by cycle afterwards.
+## Values are NaN until the indicator has enough samples.
+##############################################################
+
+from collections import deque
+import math
+import numpy as np
+
+NAN = float('nan')
+
+
+def _as_float_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _anchored_cumsum(values, anchor):
+    """Cumulative sum of the values shifted by the anchor (keeps the sums small for precision)."""
+    return np.cumsum(values - anchor)
+
+
+def _affine_recurrence(values, initial, multiplier, step):
+    """
+        Runs state = step(state, value) over the values and returns the state after every value.
+        The step has to be affine in the state: step(state, value) = multiplier * state + step(0, value).
+        The series is cut to about sqrt(n) blocks of sqrt(n) values (like alpha_beta_filter()):
+        the offsets of the blocks are computed vectorized over the blocks, the block start states
+        are chained, then the step runs from every block start at once.
+    """
+    length = len(values)
+    if length == 0:
+        return np.empty(0)
+    block_size = max(1, int(np.ceil(np.sqrt(length))))
+    block_count = -(-length // block_size)
+    blocks = np.concatenate(
+        (values, np.zeros(block_count * block_size - length))).reshape(block_count, block_size)
+    offsets = np.zeros(block_count)
+    for index in range(block_size):
+        offsets = step(offsets, blocks[:, index])
+    block_multiplier = multiplier ** block_size
+    starts = np.empty(block_count)
+    starts[0] = initial
+    for block in range(1, block_count):
+        starts[block] = block_multiplier * starts[block - 1] + offsets[block - 1]
+    states = np.empty((block_count, block_size))
+    state = starts
+    for index in range(block_size):
+        state = step(state, blocks[:, index])
+        states[:, index] = state
+    return states.reshape(-1)[:length]
+
+
+def _seed_average(values, period):
+    """Average of the first period values, summed in order like the streaming indicators."""
+    seed_sum = 0.0
+    for value in values[:period].tolist():
+        seed_sum = seed_sum + value
+    return seed_sum / period
+
+
+def _wilder_average(values, period):
+    """Wilder smoothing seeded with the average of the first period values, NaN before."""
+    output = np.full(len(values), NAN)
+    if len(values) < period:
+        return output
+    output[period - 1] = _seed_average(values, period)
+    output[period:] = _affine_recurrence(
+        values[period:], output[period - 1], (period - 1) / period,
+        lambda state, value: (state * (period - 1) + value) / period)
+    return output
+
+
+def _window_sums(cumulative, period):
+    """Differences of the cumulative sums over the last period elements."""
+    sums = np.full(len(cumulative), NAN)
+    if len(cumulative) < period:
+        return sums
+    sums[period - 1] = cumulative[period - 1]
+    sums[period:] = cumulative[period:] - cumulative[:-period]
+    return sums
+
+
+## Sum of the last period values.
+#  Values are anchored to the first one, so the running sums stay small.
+class RollingSum():
+    def __init__(self, period):
+        self.period = period
+        self.anchor = None
+        self.cumulative = 0.0
+        # Cumulative sums of the last period + 1 samples.
+        self.history = deque([0.0], maxlen=period + 1)
+        self.count = 0
+        ## Sum of the anchored values of the window.
+        self.anchored_sum = NAN
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    ## Sum of the window.
+    @property
+    def value(self):
+        if not self.ready:
+            return NAN
+        return self.anchored_sum + self.anchor * self.period
+
+    def update(self, value):
+        if self.anchor is None:
+            self.anchor = value
+        self.cumulative = self.cumulative + (value - self.anchor)
+        self.history.append(self.cumulative)
+        self.count += 1
+        if self.ready:
+            self.anchored_sum = self.cumulative - self.history[0]
+        return self.value
+
+
+def rolling_sum(values, period):
+    """Batch version of RollingSum."""
+    values = _as_float_array(values)
+    if len(values) == 0:
+        return values.copy()
+    return _window_sums(_anchored_cumsum(values, values[0]), period) + values[0] * period
+
+
+## Simple moving average.
+class SMA():
+    def __init__(self, period):
+        self.period = period
+        self.rolling_sum = RollingSum(period)
+
+    @property
+    def ready(self):
+        return self.rolling_sum.ready
+
+    @property
+    def value(self):
+        if not self.ready:
+            return NAN
+        return self.rolling_sum.anchored_sum / self.period + self.rolling_sum.anchor
+
+    def update(self, value):
+        self.rolling_sum.update(value)
+        return self.value
+
+
+def sma(values, period):
+    """Batch version of SMA."""
+    values = _as_float_array(values)
+    if len(values) == 0:
+        return values.copy()
+    return _window_sums(_anchored_cumsum(values, values[0]), period) / period + values[0]
+
+
+## Exponential moving average, seeded with the simple average of the first period values.
+class EMA():
+    def __init__(self, period, alpha=None):
+        self.period = period
+        self.alpha = 2.0 / (period + 1) if alpha is None else alpha
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    def update(self, value):
+        self.count += 1
+        if self.count < self.period:
+            self.seed_sum = self.seed_sum + value
+        elif self.count == self.period:
+            self.seed_sum = self.seed_sum + value
+            self.value = self.seed_sum / self.period
+        else:
+            self.value = self.value + self.alpha * (value - self.value)
+        return self.value
+
+
+def ema(values, period, alpha=None):
+    """Batch version of EMA, the recurrence is vectorized by _affine_recurrence()."""
+    values = _as_float_array(values)
+    alpha = 2.0 / (period + 1) if alpha is None else alpha
+    output = np.full(len(values), NAN)
+    if len(values) < period:
+        return output
+    output[period - 1] = _seed_average(values, period)
+    output[period:] = _affine_recurrence(
+        values[period:], output[period - 1], 1.0 - alpha,
+        lambda state, value: state + alpha * (value - state))
+    return output
+
+
+## Relative strength index with Wilder smoothing.
+class RSI():
+    def __init__(self, period=14):
+        self.period = period
+        self.previous = None
+        self.count = 0
+        self.average_gain = 0.0
+        self.average_loss = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    def update(self, value):
+        if self.previous is None:
+            self.previous = value
+            return self.value
+        change = value - self.previous
+        self.previous = value
+        gain = change if change > 0.0 else 0.0
+        loss = -change if change < 0.0 else 0.0
+        self.count += 1
+        if self.count <= self.period:
+            self.average_gain = self.average_gain + gain
+            self.average_loss = self.average_loss + loss
+            if self.count < self.period:
+                return self.value
+            self.average_gain = self.average_gain / self.period
+            self.average_loss = self.average_loss / self.period
+        else:
+            self.average_gain = (self.average_gain * (self.period - 1) + gain) / self.period
+            self.average_loss = (self.average_loss * (self.period - 1) + loss) / self.period
+        self.value = _rsi_value(self.average_gain, self.average_loss)
+        return self.value
+
+
+def _rsi_value(average_gain, average_loss):
+    if average_loss == 0.0:
+        return 100.0
+    return 100.0 - 100.0 / (1.0 + average_gain / average_loss)
+
+
+def rsi(values, period=14):
+    """Batch version of RSI, the Wilder smoothing is vectorized by _affine_recurrence()."""
+    values = _as_float_array(values)
+    output = np.full(len(values), NAN)
+    if len(values) <= period:
+        return output
+    changes = np.diff(values)
+    average_gain = _wilder_average(np.where(changes > 0.0, changes, 0.0), period)[period - 1:]
+    average_loss = _wilder_average(np.where(changes < 0.0, -changes, 0.0), period)[period - 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        output[period:] = np.where(
+            average_loss == 0.0, 100.0, 100.0 - 100.0 / (1.0 + average_gain / average_loss))
+    return output
+
+
+def _true_range(high, low, previous_close):
+    if previous_close is None:
+        return high - low
+    return max(high - low, abs(high - previous_close), abs(low - previous_close))
+
+
+## Average true range with Wilder smoothing.
+class ATR():
+    def __init__(self, period=14):
+        self.period = period
+        self.previous_close = None
+        self.count = 0
+        self.value = NAN
+        self.seed_sum = 0.0
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    def update(self, high, low, close):
+        true_range = _true_range(high, low, self.previous_close)
+        self.previous_close = close
+        self.count += 1
+        if self.count < self.period:
+            self.seed_sum = self.seed_sum + true_range
+        elif self.count == self.period:
+            self.seed_sum = self.seed_sum + true_range
+            self.value = self.seed_sum / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + true_range) / self.period
+        return self.value
+
+
+def atr(high, low, close, period=14):
+    """Batch version of ATR, the Wilder smoothing is vectorized by _affine_recurrence()."""
+    high = _as_float_array(high)
+    low = _as_float_array(low)
+    close = _as_float_array(close)
+    true_range = high - low
+    if len(close) > 1:
+        true_range[1:] = np.maximum(
+            true_range[1:],
+            np.maximum(np.abs(high[1:] - close[:-1]), np.abs(low[1:] - close[:-1])))
+    return _wilder_average(true_range, period)
+
+
+def _bollinger_value(anchored_sum, anchored_square_sum, anchor, period, width):
+    mean = anchored_sum / period
+    variance = (anchored_square_sum - anchored_sum * mean) / period
+    deviation = math.sqrt(variance) if variance > 0.0 else 0.0
+    middle = mean + anchor
+    return (middle, middle + width * deviation, middle - width * deviation)
+
+
+## Bollinger bands (simple moving average +/- width * population standard deviation).
+class Bollinger():
+    def __init__(self, period=20, width=2.0):
+        self.period = period
+        self.width = width
+        self.anchor = None
+        self.sums = RollingSum(period)
+        self.square_sums = RollingSum(period)
+        ## (middle, upper, lower)
+        self.value = (NAN, NAN, NAN)
+
+    @property
+    def ready(self):
+        return self.sums.ready
+
+    def update(self, value):
+        if self.anchor is None:
+            self.anchor = value
+            # The rolling sums are anchored to zero, the values are already shifted here.
+            self.sums.anchor = 0.0
+            self.square_sums.anchor = 0.0
+        shifted = value - self.anchor
+        self.sums.update(shifted)
+        self.square_sums.update(shifted * shifted)
+        if self.ready:
+            self.value = _bollinger_value(
+                self.sums.anchored_sum, self.square_sums.anchored_sum, self.anchor, self.period, self.width)
+        return self.value
+
+
+def bollinger(values, period=20, width=2.0):
+    """
+        Batch version of Bollinger.
+
+        Returns:
+            - (middle, upper, lower) arrays.
+    """
+    values = _as_float_array(values)
+    middle = np.full(len(values), NAN)
+    upper = np.full(len(values), NAN)
+    lower = np.full(len(values), NAN)
+    if len(values) == 0:
+        return (middle, upper, lower)
+    shifted = values - values[0]
+    sums = _window_sums(np.cumsum(shifted), period)
+    square_sums = _window_sums(np.cumsum(shifted * shifted), period)
+    mean = sums / period
+    variance = (square_sums - sums * mean) / period
+    deviation = np.sqrt(np.where(variance > 0.0, variance, 0.0))
+    middle = mean + values[0]
+    upper = middle + width * deviation
+    lower = middle - width * deviation
+    return (middle, upper, lower)
+
+
+## Minimum or maximum of the last period values (monotonic queue, amortized O(1)).
+class _RollingExtreme():
+    def __init__(self, period, is_better):
+        self.period = period
+        self.is_better = is_better
+        # (index, value) pairs, values are monotonic.
+        self.queue = deque()
+        self.count = 0
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    @property
+    def value(self):
+        if not self.ready:
+            return NAN
+        return self.queue[0][1]
+
+    def update(self, value):
+        while len(self.queue) > 0 and not self.is_better(self.queue[-1][1], value):
+            self.queue.pop()
+        self.queue.append((self.count, value))
+        if self.queue[0][0] <= self.count - self.period:
+            self.queue.popleft()
+        self.count += 1
+        return self.value
+
+
+## Rolling minimum.
+class RollingMin(_RollingExtreme):
+    def __init__(self, period):
+        super(RollingMin, self).__init__(period, lambda kept, new: kept < new)
+
+
+## Rolling maximum.
+class RollingMax(_RollingExtreme):
+    def __init__(self, period):
+        super(RollingMax, self).__init__(period, lambda kept, new: kept > new)
+
+
+def _rolling_extreme(values, period, reduce):
+    values = _as_float_array(values)
+    output = np.full(len(values), NAN)
+    if len(values) < period:
+        return output
+    output[period - 1:] = reduce(np.lib.stride_tricks.sliding_window_view(values, period), axis=1)
+    return output
+
+
+def rolling_min(values, period):
+    """Batch version of RollingMin."""
+    return _rolling_extreme(values, period, np.min)
+
+
+def rolling_max(values, period):
+    """Batch version of RollingMax."""
+    return _rolling_extreme(values, period, np.max)
+
+
+## Volume weighted average price of the typical price (high + low + close) / 3,
+#  cumulated since the first candle (or the last reset()).
+class VWAP():
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.price_volume = 0.0
+        self.volume = 0.0
+        self.value = NAN
+
+    @property
+    def ready(self):
+        return self.volume > 0.0
+
+    def update(self, high, low, close, volume):
+        typical_price = (high + low + close) / 3.0
+        self.price_volume = self.price_volume + typical_price * volume
+        self.volume = self.volume + volume
+        self.value = self.price_volume / self.volume if self.volume > 0.0 else NAN
+        return self.value
+
+
+def vwap(high, low, close, volume):
+    """Batch version of VWAP."""
+    high = _as_float_array(high)
+    low = _as_float_array(low)
+    close = _as_float_array(close)
+    volume = _as_float_array(volume)
+    typical_price = (high + low + close) / 3.0
+    price_volume = np.cumsum(typical_price * volume)
+    cumulative_volume = np.cumsum(volume)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(cumulative_volume > 0.0, price_volume / cumulative_volume, NAN)
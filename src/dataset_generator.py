@@ -1,14 +1,40 @@
 from matplotlib import units
 from trade_platforms.platform_wrapper_base import Platforms
-from trade_platforms.binance_wrapper import Binance
+from trade_platforms.binance_wrapper import Binance, BINANCE_REQUEST_WEIGHT_PER_MINUTE
 from trade_platforms.platform_wrapper_base import PlatformWrapper
 
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from gui.popup import show_error_box
 from os.path import exists
-from os import mkdir, remove
+from os import mkdir, remove, replace
+from glob import escape, glob
+import json
+import numpy as np
 import pandas as pd
-from datetime import timedelta, datetime
+from datetime import datetime
+
+from trade_platforms.columnar_dataset import \
+    ColumnarDatasetWriter, COLUMNAR_EXTENSION, is_columnar_dataset, open_columnar_dataset
+from trade_platforms.dataset_coverage import \
+    coverage_file_name, find_gaps, read_coverage_report, write_coverage_report
+from trade_platforms.rate_limiter import TokenBucket, request_weight_limiter
+from trade_platforms.dataset_catalog import \
+    find_covering_datasets, register_dataset, scan_datasets, unregister_dataset
+
+## Data set file formats.
+DATASET_FORMAT_HDF = '.h5'
+DATASET_FORMAT_COLUMNAR = COLUMNAR_EXTENSION
+
+## Candles per historical data request.
+CHUNK_CANDLES = 1000
+## Concurrent historical data requests.
+DEFAULT_DOWNLOAD_WORKERS = 8
+## Attempts of a chunk request before the download fails.
+CHUNK_RETRIES = 5
+## File name suffix of the checkpoint stored next to a data set while it is downloaded.
+CHECKPOINT_SUFFIX = '.checkpoint.json'
 
 
 def get_platform_client(platform) -> PlatformWrapper:
@@ -16,20 +42,29 @@ def get_platform_client(platform) -> PlatformWrapper:
         Returns the requested platform client.
 
         Parameters:
-            - platorm (Platforms): The id of the platform to be connected.
+            - platorm (Platforms): The id of the platform to be connected,
+              an optional 'api_url' entry overrides the REST url of the platform.
 
         Returns:
             The selected platform wrapper.
     """
 
     if platform['platform_type'] == Platforms.Binance:
-        return Binance(
+        client = Binance(
             base_currency=platform['base_currency'],
             quote_currency=platform['quote_currency'])
+        if 'api_url' in platform:
+            client.api_url = platform['api_url']
+        return client
 
 
 def generate_dataset_filename(
-        dataset: str, platform: Platforms, start_time: datetime, end_time: datetime, resolution_sec: int) -> str:
+        dataset: str,
+        platform: Platforms,
+        start_time: datetime,
+        end_time: datetime,
+        resolution_sec: int,
+        dataset_format: str = DATASET_FORMAT_HDF) -> str:
     """
         Generates a dataset file name based on the platform,
         start/end time and resolution.
@@ -40,6 +75,7 @@ def generate_dataset_filename(
             - start_time (datetime): defines the start time of the dataset.
             - end_time (datetime): defines the end time of the dataset.
             - resolution_sec (int): Stores the resolution of candles to get in seconds.
+            - dataset_format (str): DATASET_FORMAT_HDF or DATASET_FORMAT_COLUMNAR.
 
         Return:
             - (str): the path and filename of the dataset.
@@ -47,60 +83,461 @@ def generate_dataset_filename(
     start_string = start_time.strftime("%Y%m%d_T%H%M")
     end_string = end_time.strftime("%Y%m%d_T%H%M")
     filename = f"{platform['platform_type'].value}_{platform['base_currency']}_\
-{platform['quote_currency']}_{dataset}_{start_string}_{end_string}_{resolution_sec}s.h5"
+{platform['quote_currency']}_{dataset}_{start_string}_{end_string}_{resolution_sec}s{dataset_format}"
     path = "src/data/"
     return f"{path}{filename}"
 
 
+def checkpoint_file_name(dataset_file_name: str) -> str:
+    """Returns the download checkpoint path belonging to the data set."""
+    return f"{dataset_file_name.rstrip('/')}{CHECKPOINT_SUFFIX}"
+
+
+def read_download_checkpoint(dataset_file_name: str) -> dict:
+    """
+        Returns the checkpoint of an unfinished download of the data set.
+
+        Returns:
+            - (dict): 'next_time' (start time of the next chunk to fetch in epoch nanoseconds) and
+              'rows' (rows of the data set written until then), None if the data set is not downloaded.
+    """
+    if not exists(checkpoint_file_name(dataset_file_name)):
+        return None
+    with open(checkpoint_file_name(dataset_file_name), 'r') as f:
+        return json.load(f)
+
+
+def _write_download_checkpoint(dataset_file_name: str, next_time: int, rows: int):
+    temp_file_name = f"{checkpoint_file_name(dataset_file_name)}.tmp"
+    with open(temp_file_name, 'w') as f:
+        json.dump({'next_time': int(next_time), 'rows': int(rows)}, f)
+    replace(temp_file_name, checkpoint_file_name(dataset_file_name))
+
+
+def _dataset_length(dataset_file_name: str) -> int:
+    """Returns the number of rows of an HDF or columnar data set."""
+    if is_columnar_dataset(dataset_file_name):
+        return len(ColumnarDatasetWriter(dataset_file_name))
+    with pd.HDFStore(dataset_file_name, mode='r') as store:
+        if 'data' not in store:
+            return 0
+        return store.get_storer('data').nrows
+
+
+def find_extendable_dataset(
+        dataset: str,
+        platform: Platforms,
+        start_time: datetime,
+        end_time: datetime,
+        resolution_sec: int,
+        dataset_format: str = DATASET_FORMAT_HDF) -> tuple:
+    """
+        Finds the complete data set having the same market, start time, resolution and format
+        with the latest end time before end_time, only its tail has to be downloaded to extend it.
+
+        Returns:
+            - (tuple): (file name, end time) of the data set, None if there is none.
+    """
+    # The name of an empty range ends with the start time twice.
+    start_string = start_time.strftime("%Y%m%d_T%H%M")
+    suffix = f"_{resolution_sec}s{dataset_format}"
+    empty_range_name = generate_dataset_filename(
+        dataset, platform, start_time, start_time, resolution_sec, dataset_format)
+    prefix = empty_range_name[:-len(suffix) - len(start_string)]
+    extendable = None
+    for file_name in glob(f"{escape(prefix)}*{escape(suffix)}"):
+        try:
+            dataset_end_time = datetime.strptime(file_name[len(prefix):-len(suffix)], "%Y%m%d_T%H%M")
+        except ValueError:
+            continue
+        if dataset_end_time >= end_time or exists(checkpoint_file_name(file_name)):
+            continue
+        if extendable is None or dataset_end_time > extendable[1]:
+            extendable = (file_name, dataset_end_time)
+    return extendable
+
+
+def _candle_chunks(first: int, last: int, resolution_sec: int) -> list:
+    """
+        Splits the candle start times [first, last] (epoch nanoseconds) into chunks
+        of CHUNK_CANDLES candles (one request each).
+
+        Returns:
+            - (list): (chunk first, chunk last) start times in epoch nanoseconds.
+    """
+    step = resolution_sec * 1000000000
+    chunk_firsts = np.arange(first, last + 1, CHUNK_CANDLES * step, dtype=np.int64)
+    chunk_lasts = np.minimum(chunk_firsts + (CHUNK_CANDLES - 1) * step, last)
+    return list(zip(chunk_firsts.tolist(), chunk_lasts.tolist()))
+
+
+def _fetch_chunk(
+        platform_client: PlatformWrapper,
+        first: int,
+        last: int,
+        resolution_sec: int) -> pd.DataFrame:
+    """
+        Fetches the candles of a chunk, failed requests are retried with an exponential back off.
+        The platform client schedules the request by its request weight.
+    """
+    for attempt in range(CHUNK_RETRIES):
+        try:
+            return platform_client.historical_data(
+                start_time=first / 1000000000,
+                end_time=last / 1000000000,
+                resolution_sec=resolution_sec)
+        except Exception as e:
+            if attempt == CHUNK_RETRIES - 1:
+                raise
+            print(f"Fetching candles from {pd.Timestamp(first)} failed ({e}), retrying")
+            time.sleep(2 ** attempt)
+
+
+def _download_chunks(
+        platform_client: PlatformWrapper,
+        executor: ThreadPoolExecutor,
+        chunks: list,
+        resolution_sec: int,
+        window: int,
+        write_chunk):
+    """
+        Fetches the chunks concurrently and passes them to write_chunk(first, last, df)
+        in chunk order. At most window chunks are fetched or waiting to be written at a time,
+        so the memory use does not depend on the length of the range.
+    """
+    pending = deque()
+    next_chunk = 0
+    try:
+        while next_chunk < len(chunks) or len(pending) > 0:
+            while next_chunk < len(chunks) and len(pending) < window:
+                (first, last) = chunks[next_chunk]
+                pending.append((first, last, executor.submit(
+                    _fetch_chunk, platform_client, first, last, resolution_sec)))
+                next_chunk += 1
+            (first, last, future) = pending.popleft()
+            write_chunk(first, last, future.result())
+    finally:
+        for (_, _, future) in pending:
+            future.cancel()
+
+
 def generate_candle_historical_dataset(
-        platform: Platforms, start_time: datetime, end_time: datetime, resolution_sec: int) -> str:
+        platform: Platforms,
+        start_time: datetime,
+        end_time: datetime,
+        resolution_sec: int,
+        dataset_format: str = DATASET_FORMAT_HDF,
+        max_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+        rate_limiter: TokenBucket = None,
+        executor: ThreadPoolExecutor = None) -> str:
     """
         Generates candle data set from platform historical data.
         Lowest resolution is 15 seconds.
+        The data set is either an HDF file or a memory mapped columnar data set
+        (see trade_platforms.columnar_dataset, existing HDF files can be converted
+        with convert_hdf_to_columnar()).
+        The range is split into chunks of CHUNK_CANDLES candles which are fetched concurrently
+        with a single platform client and written to the data set in order. Requests are
+        throttled by a token bucket synchronized with the request weight the platform reports.
+        Progress is checkpointed after every chunk (see read_download_checkpoint()), a failed
+        download keeps its data and the next call resumes it from the last written chunk.
+        If a complete data set of the same market and start time ends earlier,
+        it is renamed and only the missing tail is downloaded, the catalog entry of the renamed
+        file covers the old range until the extension is complete.
+        Nothing is downloaded if the data sets of the catalog (see trade_platforms.dataset_catalog)
+        already cover the range.
 
         Parameters:
             - platform (Platforms): Defines the platform id the data is generated from.
+              An optional 'api_url' entry overrides the REST url of the platform (for example a local
+              stand-in server).
             - start_time (datetime): defines the start time of the dataset.
             - end_time (datetime): defines the end time of the dataset.
             - resolution_sec (int): Stores the resolution of candles to get in seconds.
+            - dataset_format (str): DATASET_FORMAT_HDF or DATASET_FORMAT_COLUMNAR.
+            - max_workers (int): number of concurrent requests.
+            - rate_limiter (TokenBucket): request weight limiter, shared by the downloads of the same IP.
+              The own limiter of the platform client is used if None.
+            - executor (ThreadPoolExecutor): pool the requests are sent from,
+              a pool of max_workers threads is created if None.
 
         Returns:
-            - (str): the generated file's name and path
+            - (str): the generated file's name and path, or the stored data set covering the range.
+              (list) file names in time order if only several stored data sets cover the range together
+              (TestWrapper.set_data_interval() plays them one after another).
     """
     dataset_file_name = generate_dataset_filename(
-        "candles", platform, start_time, end_time, resolution_sec)
-    if exists(dataset_file_name):
+        "candles", platform, start_time, end_time, resolution_sec, dataset_format)
+    checkpoint = read_download_checkpoint(dataset_file_name)
+    if exists(dataset_file_name) and checkpoint is None:
         print("Dataset already created")
         return dataset_file_name
 
     if not exists('src/data'):
         mkdir('src/data')
 
-    timestamp = start_time
-    store = pd.HDFStore(dataset_file_name)
-    try:
-        while timestamp < end_time:
-            time.sleep(2)
-            start_date = timestamp
-            # Data is always stored in chunks of 1000
-            timestamp += timedelta(seconds=resolution_sec * 1000)
-            end_date = timestamp
+    if checkpoint is None and not exists(dataset_file_name):
+        scan_datasets()
+        covering = find_covering_datasets(
+            platform, "candles", start_time, end_time, resolution_sec, dataset_format)
+        if covering is not None:
+            print(f"Dataset covered by {', '.join(covering)}")
+            return covering[0] if len(covering) == 1 else covering
 
-            platform_client = get_platform_client(platform)
-            df = platform_client.historical_data(
-                start_time=start_date.timestamp(),
-                end_time=None,
-                resolution_sec=resolution_sec)
-            df['startTime'] = pd.to_datetime(
-                df['startTime'],
-                unit='ms')
-            print(f"Get data from {str(start_date)} to {str(end_date)} len {len(df)}")
-            store.append("data", df, format='table', data_columns=True)
-            timestamp += timedelta(seconds=1)
-        store.close()
+    step = resolution_sec * 1000000000
+    first = pd.Timestamp(start_time).value
+    last = pd.Timestamp(end_time).value - step
+    rows = 0
+    if not exists(dataset_file_name):
+        checkpoint = None
+        extendable = find_extendable_dataset(
+            "candles", platform, start_time, end_time, resolution_sec, dataset_format)
+        if extendable is not None:
+            (extendable_file_name, extendable_end_time) = extendable
+            print(f"Extending {extendable_file_name} to {end_time}")
+            checkpoint = {
+                'next_time': pd.Timestamp(extendable_end_time).value,
+                'rows': _dataset_length(extendable_file_name)}
+            _write_download_checkpoint(dataset_file_name, **checkpoint)
+            replace(extendable_file_name, dataset_file_name)
+            # The renamed file keeps serving the old range until the extension is complete,
+            # also if the download of the tail fails.
+            register_dataset(
+                dataset_file_name, platform, "candles", start_time, extendable_end_time,
+                resolution_sec, dataset_format)
+            unregister_dataset(extendable_file_name)
+            # The report keeps the known unfillable gaps, the repair rewrites it for the new range.
+            if exists(coverage_file_name(extendable_file_name)):
+                replace(coverage_file_name(extendable_file_name), coverage_file_name(dataset_file_name))
+    if checkpoint is not None:
+        first = checkpoint['next_time']
+        rows = checkpoint['rows']
+        print(f"Resuming download from {pd.Timestamp(first)}")
+    _write_download_checkpoint(dataset_file_name, first, rows)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    platform_client = get_platform_client(platform)
+    platform_client.set_http_options(pool_size=max_workers)
+    if rate_limiter is not None:
+        platform_client.set_rate_limiter(rate_limiter)
+    # Downloaded candles are stored in the data set, caching them too would only churn the cache.
+    platform_client.set_kline_cache(None)
+
+    chunks = _candle_chunks(first, last, resolution_sec)
+
+    # Rows written after the checkpoint belong to an unfinished chunk, they are fetched again.
+    if dataset_format == DATASET_FORMAT_COLUMNAR:
+        store = ColumnarDatasetWriter(dataset_file_name)
+        store.truncate(rows)
+    else:
+        store = pd.HDFStore(dataset_file_name)
+        if 'data' in store and store.get_storer('data').nrows > rows:
+            store.remove('data', start=rows)
+
+    def write_chunk(chunk_first, chunk_last, df):
+        nonlocal rows
+        if df is None:
+            raise Exception(f"No historical data for {platform['base_currency']}{platform['quote_currency']}")
+        print(f"Get data from {pd.Timestamp(chunk_first)} to {pd.Timestamp(chunk_last)} len {len(df)}")
+        if len(df) > 0:
+            if dataset_format == DATASET_FORMAT_COLUMNAR:
+                store.append(df)
+            else:
+                store.append("data", df, format='table', data_columns=True)
+                store.flush()
+            rows += len(df)
+        _write_download_checkpoint(dataset_file_name, chunk_last + step, rows)
+
+    try:
+        _download_chunks(
+            platform_client, executor, chunks, resolution_sec,
+            2 * max_workers, write_chunk)
+        if dataset_format == DATASET_FORMAT_HDF:
+            store.close()
+        # Only the range after the last repair (the report of an extended data set) is checked.
+        report = read_coverage_report(dataset_file_name)
+        repair_candle_dataset(
+            platform, dataset_file_name, start_time, end_time, resolution_sec, platform_client,
+            check_from=int(report['end_time']) if report is not None else None)
+        remove(checkpoint_file_name(dataset_file_name))
+        register_dataset(
+            dataset_file_name, platform, "candles", start_time, end_time, resolution_sec, dataset_format)
     except Exception as e:
         show_error_box(e)
         print(e)
-        remove(dataset_file_name)
+        if dataset_format == DATASET_FORMAT_HDF:
+            store.close()
+        print(f"Download stopped, {rows} candles are kept, it is resumed by the next call")
         return None
+    finally:
+        platform_client.close()
+        if own_executor:
+            executor.shutdown()
     return dataset_file_name
+
+
+def generate_candle_historical_datasets(
+        platforms: list,
+        start_time: datetime,
+        end_time: datetime,
+        resolution_sec: int,
+        dataset_format: str = DATASET_FORMAT_HDF,
+        max_workers: int = DEFAULT_DOWNLOAD_WORKERS) -> list:
+    """
+        Generates the candle data sets of several markets in one job.
+        The markets are downloaded at the same time, their requests share one thread pool
+        and one request weight limiter (the platform limits the weight per IP).
+
+        Parameters:
+            - platforms (list): platform dicts, one per market (see generate_candle_historical_dataset()).
+            - start_time (datetime): defines the start time of the datasets.
+            - end_time (datetime): defines the end time of the datasets.
+            - resolution_sec (int): Stores the resolution of candles to get in seconds.
+            - dataset_format (str): DATASET_FORMAT_HDF or DATASET_FORMAT_COLUMNAR.
+            - max_workers (int): number of concurrent requests of all markets.
+
+        Returns:
+            - (list): the generated file names (see generate_candle_historical_dataset())
+              in the order of the platforms, None for failed ones.
+    """
+    rate_limiter = request_weight_limiter(BINANCE_REQUEST_WEIGHT_PER_MINUTE)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            ThreadPoolExecutor(max_workers=len(platforms)) as market_executor:
+        futures = [market_executor.submit(
+            generate_candle_historical_dataset, platform, start_time, end_time, resolution_sec,
+            dataset_format, max_workers, rate_limiter, executor) for platform in platforms]
+        return [future.result() for future in futures]
+
+
+def load_candle_dataset(dataset_file_name: str, first_row: int = 0) -> pd.DataFrame:
+    """Loads an HDF or columnar data set into a data frame, from first_row to the end."""
+    if is_columnar_dataset(dataset_file_name):
+        candles = open_columnar_dataset(dataset_file_name)
+        columns = candles.slice(first_row, len(candles))
+        for name in candles.datetime_columns:
+            columns[name] = columns[name].view('datetime64[ns]')
+        return pd.DataFrame(columns)
+    with pd.HDFStore(dataset_file_name, mode='r') as store:
+        return store.select('data', start=first_row)
+
+
+def _load_start_times(dataset_file_name: str) -> np.ndarray:
+    """Returns the startTime column of a data set in epoch nanoseconds, memory mapped for columnar data sets."""
+    if is_columnar_dataset(dataset_file_name):
+        return open_columnar_dataset(dataset_file_name).start_time
+    with pd.HDFStore(dataset_file_name, mode='r') as store:
+        return store.select_column('data', 'startTime').to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def _rewrite_candle_dataset_tail(dataset_file_name: str, first_row: int, df: pd.DataFrame):
+    """Replaces the rows of an HDF or columnar data set from first_row on with the data frame."""
+    if is_columnar_dataset(dataset_file_name):
+        writer = ColumnarDatasetWriter(dataset_file_name)
+        writer.truncate(first_row)
+        writer.append(df)
+        return
+    with pd.HDFStore(dataset_file_name) as store:
+        if store.get_storer('data').nrows > first_row:
+            store.remove('data', start=first_row)
+        store.append("data", df, format='table', data_columns=True)
+
+
+def _fetch_candle_range(
+        platform_client: PlatformWrapper, first: int, last: int, resolution_sec: int) -> pd.DataFrame:
+    """Fetches the candles starting within [first, last] (epoch nanoseconds) in chunks of CHUNK_CANDLES."""
+    chunks = list()
+    for (chunk_first, chunk_last) in _candle_chunks(first, last, resolution_sec):
+        df = platform_client.historical_data(
+            start_time=chunk_first / 1000000000,
+            end_time=chunk_last / 1000000000,
+            resolution_sec=resolution_sec)
+        if df is not None and len(df) > 0:
+            chunks.append(df)
+    if len(chunks) == 0:
+        return None
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _within_gaps(gap, gaps) -> bool:
+    """Returns true if the gap [first, last] is within one of the gaps."""
+    return bool(np.any((gaps[:, 0] <= gap[0]) & (gaps[:, 1] >= gap[1]))) if len(gaps) > 0 else False
+
+
+def repair_candle_dataset(
+        platform: Platforms,
+        dataset_file_name: str,
+        start_time: datetime,
+        end_time: datetime,
+        resolution_sec: int,
+        platform_client: PlatformWrapper = None,
+        check_from: int = None) -> dict:
+    """
+        Validates the candle data set and repairs it if needed.
+        Only the startTime column is read (memory mapped for columnar data sets).
+        Duplicated candles are dropped, missing intervals are re-fetched from the platform
+        (only the missing ranges are downloaded), and only the rows from the first changed
+        candle on are rewritten. Intervals the platform has no data for remain gaps,
+        they are recorded as unfillable in the coverage report (see trade_platforms.dataset_coverage)
+        written next to the data set, and they are not fetched again by later repairs.
+
+        Parameters:
+            - platform (Platforms): Defines the platform id the data is generated from.
+            - dataset_file_name (str): the HDF or columnar data set.
+            - start_time (datetime): defines the start time of the dataset.
+            - end_time (datetime): defines the end time of the dataset.
+            - resolution_sec (int): Stores the resolution of candles in seconds.
+            - platform_client (PlatformWrapper): client the missing candles are fetched with,
+              a new one is created for the platform if None.
+            - check_from (int): only the gaps after this time (epoch ns) are re-fetched, for example
+              the start of an incremental download. None checks the whole range.
+
+        Returns:
+            - (dict): the coverage report.
+    """
+    start_times = _load_start_times(dataset_file_name)
+    report = read_coverage_report(dataset_file_name)
+    unfillable = report['unfillable_gaps'] if report is not None else np.empty((0, 2), dtype=np.int64)
+    is_sorted = bool(np.all(start_times[1:] >= start_times[:-1]))
+    if not is_sorted:
+        start_times = np.sort(start_times, kind='stable')
+    (duplicates, gaps) = find_gaps(start_times, resolution_sec, start_time, end_time)
+    if check_from is not None:
+        gaps = gaps[gaps[:, 1] >= check_from]
+        gaps[:, 0] = np.maximum(gaps[:, 0], check_from)
+    gaps = np.array([gap for gap in gaps if not _within_gaps(gap, unfillable)], dtype=np.int64).reshape(-1, 2)
+    print(f"Data set validation: {len(duplicates)} duplicate(s), {len(gaps)} gap(s) to fetch")
+
+    fetched = list()
+    new_unfillable = list()
+    if platform is not None:
+        if platform_client is None and len(gaps) > 0:
+            platform_client = get_platform_client(platform)
+        for (first, last) in gaps:
+            print(f"Re-fetching missing candles from {pd.Timestamp(first)} to {pd.Timestamp(last)}")
+            missing = _fetch_candle_range(platform_client, int(first), int(last), resolution_sec)
+            if missing is None:
+                new_unfillable.append((first, last))
+            else:
+                fetched.append(missing)
+    if len(new_unfillable) > 0:
+        unfillable = np.concatenate((unfillable, np.array(new_unfillable, dtype=np.int64)))
+
+    if not is_sorted or len(duplicates) > 0 or len(fetched) > 0:
+        # Rows before the first changed candle stay as they are.
+        first_row = 0
+        if is_sorted:
+            changed = [int(duplicates[0]) - 1] if len(duplicates) > 0 else []
+            for missing in fetched:
+                first_fetched = missing['startTime'].to_numpy(dtype='datetime64[ns]').view(np.int64).min()
+                changed.append(int(np.searchsorted(start_times, first_fetched)))
+            first_row = max(0, min(changed))
+        df = pd.concat([load_candle_dataset(dataset_file_name, first_row)] + fetched, ignore_index=True)
+        df = df.sort_values('startTime', kind='stable').drop_duplicates('startTime')
+        df = df.reset_index(drop=True)
+        _rewrite_candle_dataset_tail(dataset_file_name, first_row, df)
+        start_times = _load_start_times(dataset_file_name)
+
+    return write_coverage_report(
+        dataset_file_name, start_times, resolution_sec, start_time, end_time, unfillable)
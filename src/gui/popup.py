@@ -1,7 +1,9 @@
-import pyautogui
+# pyautogui needs a display when imported, so it is only imported when a box is shown.
+# This keeps the bots importable in headless processes.
 
 
 def show_confirm_box(message):
+    import pyautogui
     result = pyautogui.confirm(message)
     if result == "OK":
         return True
@@ -9,8 +11,10 @@ def show_confirm_box(message):
 
 
 def show_alert_box(message):
+    import pyautogui
     pyautogui.alert(text=message, title="Info")
 
 
 def show_error_box(message):
+    import pyautogui
     pyautogui.alert(text=message, title="Error")
@@ -1,5 +1,6 @@
 import logging
 import os
+import threading
 from dotenv import load_dotenv
 import pandas as pd
 from datetime import timedelta
@@ -10,17 +11,68 @@ from Crypto.Hash import SHA256
 from Crypto.PublicKey import RSA
 from Crypto.Signature import pkcs1_15
 
+from requests.adapters import HTTPAdapter
 from binance.spot import Spot as Client
 from binance.lib.utils import config_logging
 from trade_platforms.platform_wrapper_base import PlatformWrapper
+from trade_platforms.endpoint_latency import EndpointLatency
+from trade_platforms.local_order_book import LocalOrderBook
+from trade_platforms.fill_engine import BookSide
+from trade_platforms.kline_cache import KlineCache
+from trade_platforms.rate_limiter import request_weight_limiter
+from trade_platforms.market_stream import \
+    MarketStream, binance_stream_names, BINANCE_STREAM_URL, BINANCE_TESTNET_STREAM_URL
+from trade_platforms.request_scheduler import \
+    RequestScheduler, PRIORITY_ORDER, PRIORITY_MARKET_DATA, PRIORITY_HISTORY
 
 config_logging(logging, logging.DEBUG)
 
+## Request weight the platform allows per minute and IP.
+BINANCE_REQUEST_WEIGHT_PER_MINUTE = 6000
+## Request weights of the used REST endpoints (connector method name -> weight).
+BINANCE_REQUEST_WEIGHTS = {
+    'account': 20,
+    'get_orders': 20,
+    'get_order': 4,
+    'exchange_info': 20,
+    'ticker_price': 2,
+    'klines': 2
+}
+
+
+def binance_interval(resolution_sec):
+    """Returns the kline interval string of the resolution."""
+    resolution_str = f"{resolution_sec}s"
+    if resolution_sec == 60:
+        resolution_str = "1m"
+    elif resolution_sec == 900:
+        resolution_str = "15m"
+    elif resolution_sec == 1200:
+        resolution_str = "30m"
+    elif resolution_sec == 60 * 60:
+        resolution_str = "1h"
+    elif resolution_sec == 1440 * 60:
+        resolution_str = "1d"
+    return resolution_str
+
+
+def binance_request_weight(endpoint, limit=None):
+    """Returns the request weight of a REST endpoint call, the depth weight depends on the limit."""
+    if endpoint == 'depth':
+        if limit is None or limit <= 100:
+            return 5
+        if limit <= 500:
+            return 25
+        if limit <= 1000:
+            return 50
+        return 250
+    return BINANCE_REQUEST_WEIGHTS.get(endpoint, 1)
+
 
 class Binance(PlatformWrapper):
     OPENING_TIME_NAME = 0
 
-    def __init__(self, base_currency, quote_currency):
+    def __init__(self, base_currency, quote_currency, pool_size=10, timeout=10):
         super(Binance, self).__init__(f'Binance-{base_currency}-{quote_currency}')
         self.api_url = 'https://api1.binance.com'
         self.testnet = False
@@ -34,75 +86,311 @@ class Binance(PlatformWrapper):
             self.symbol = None
         else:
             self.symbol = base_currency + quote_currency
+        ## Number of kept alive connections of the client.
+        self.pool_size = pool_size
+        ## Request timeout in seconds.
+        self.timeout = timeout
+        ## Long-lived clients, (key, secret, base url) -> client, see client().
+        self.clients = dict()
+        self.clients_lock = threading.Lock()
+        ## Request latency per REST endpoint.
+        self.latency = EndpointLatency()
+        ## TokenBucket of the request weight, synchronized with the usage reported by the platform.
+        self.rate_limiter = request_weight_limiter(BINANCE_REQUEST_WEIGHT_PER_MINUTE)
+        ## Every REST call is scheduled by the request weight budget, see _request().
+        self.scheduler = RequestScheduler(self.rate_limiter)
+        ## On-disk cache of the closed klines, None requests every kline from the platform.
+        self.kline_cache = KlineCache()
+        ## Local copy of the orderbook, see fetch_orderbook() and apply_depth_update().
+        self.order_book = LocalOrderBook()
+        ## True while the orderbook is kept up to date by diff-depth stream events,
+        #  no REST snapshot is needed per cycle then.
+        self.order_book_streamed = False
+        ## Diff-depth events received while the orderbook is seeded from a snapshot, see _resync_order_book().
+        self.depth_buffer = list()
+        ## True while a snapshot is fetched to seed the streamed orderbook.
+        self.order_book_resyncing = False
+        ## Base url of the market data streams.
+        self.stream_url = BINANCE_STREAM_URL
+        ## Market data stream, see start_streaming(). None while the market data is polled.
+        self.stream = None
+        ## Guards the orderbook and the streamed state updated by the stream thread.
+        self.stream_lock = threading.Lock()
+        ## Latest (best bid, best ask) of the bookTicker stream.
+        self.best_bid_ask = None
+        ## Latest candle of the kline stream.
+        self.streamed_candle = None
+        ## The cycle fetches are REST requests, they are sent in parallel.
+        self.fetch_concurrently = True
 
+    ## Returns the long-lived client of the credentials.
+    #  Clients are created once and reuse a keep-alive connection pool,
+    #  so a request costs a single round trip instead of a new connection.
+    #  Thread safe, concurrent requests share the client.
     def client(self, key, secret, base_url):
-        if self.testnet:
-            return ClientTestNet(key, secret, base_url=base_url)
-        else:
-            return Client(key, secret, base_url=base_url)
+        client = self.clients.get((key, secret, base_url))
+        if client is not None:
+            return client
+        with self.clients_lock:
+            client = self.clients.get((key, secret, base_url))
+            if client is not None:
+                return client
+            if self.testnet:
+                client = ClientTestNet(key, secret, base_url=base_url, timeout=self.timeout)
+            else:
+                client = Client(key, secret, base_url=base_url, timeout=self.timeout)
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            client.session.mount('https://', adapter)
+            client.session.mount('http://', adapter)
+            client.session.hooks['response'].append(self._on_response)
+            self.clients[(key, secret, base_url)] = client
+            return client
 
-    def get_account_info(self):
+    ## Response hook of the client sessions, records the latency and the request weight usage.
+    def _on_response(self, response, *args, **kwargs):
+        self.latency.record_response(response)
+        used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        if used_weight is not None:
+            self.rate_limiter.sync_used(int(used_weight))
+        # Too many requests (429) or IP banned (418)
+        if response.status_code in (418, 429):
+            self.rate_limiter.pause(int(response.headers.get('Retry-After', 60)))
+        return response
+
+    ## Sets the KlineCache serving the closed klines, None disables caching.
+    def set_kline_cache(self, kline_cache):
+        self.kline_cache = kline_cache
+
+    ## Sets the TokenBucket the request weight usage is reported to.
+    #  It can be shared by the wrappers of several markets (the limit is per IP).
+    def set_rate_limiter(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+        self.scheduler = RequestScheduler(rate_limiter)
+
+    ## Sends a REST call through the request scheduler.
+    #  The call waits for its request weight, identical concurrent calls are sent once.
+    #  @param endpoint connector method name of the endpoint.
+    #  @param priority PRIORITY_ORDER, PRIORITY_MARKET_DATA or PRIORITY_HISTORY.
+    def _request(self, endpoint, priority, *args, **kwargs):
         client = self.client(self.api_key, self.api_secret, base_url=self.api_url)
-        return client.account(recvWindow=6000)
+        key = (endpoint, args, tuple(sorted(kwargs.items())))
+        return self.scheduler.submit(
+            key, binance_request_weight(endpoint, kwargs.get('limit')), priority,
+            lambda: getattr(client, endpoint)(*args, **kwargs))
+
+    ## Returns the request scheduler counters ('sent', 'coalesced', 'weight').
+    def get_request_stats(self):
+        return dict(self.scheduler.stats)
+
+    ## Changes the connection pool size and the request timeout, the clients are recreated.
+    def set_http_options(self, pool_size=None, timeout=None):
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if timeout is not None:
+            self.timeout = timeout
+        self.close()
+
+    ## Closes the connections of the clients and stops the cycle fetch threads.
+    def close(self):
+        with self.clients_lock:
+            for client in self.clients.values():
+                client.session.close()
+            self.clients = dict()
+        if self.fetch_executor is not None:
+            self.fetch_executor.shutdown(wait=False)
+            self.fetch_executor = None
+
+    ## Returns the request latency counters per endpoint (count, total, min, max, last, mean seconds).
+    def get_latency_stats(self):
+        return self.latency.to_dataframe()
+
+    def get_account_info(self):
+        return self._request('account', PRIORITY_ORDER, recvWindow=6000)
 
     def get_order_history(self, start_time):
-        client = self.client(self.api_key, self.api_secret, base_url=self.api_url)
-        return client.get_orders(self.symbol, startTime=int(start_time * 1000))
+        return self._request('get_orders', PRIORITY_ORDER, self.symbol, startTime=int(start_time * 1000))
 
     def get_order(self, order_id):
-        client = self.client(self.api_key, self.api_secret, base_url=self.api_url)
-        return pd.DataFrame(client.get_order(self.symbol, order_id))
+        return pd.DataFrame(self._request('get_order', PRIORITY_ORDER, self.symbol, order_id))
 
     def exchange_info(self):
-        client = self.client(self.api_key, self.api_secret, base_url=self.api_url)
-        return pd.DataFrame(client.exchange_info()['symbols'])
+        return pd.DataFrame(self._request('exchange_info', PRIORITY_MARKET_DATA)['symbols'])
+
+    ## Fetches a depth snapshot {'lastUpdateId', 'bids', 'asks'}.
+    def fetch_orderbook_snapshot(self, limit):
+        return self._request('depth', PRIORITY_MARKET_DATA, self.symbol, limit=limit)
 
+    ## Returns the orderbook as (bids, asks) BookSide arrays, bids descending, asks ascending.
+    #  The streamed local orderbook is used while it is in sync, otherwise a REST snapshot is fetched.
+    #  The snapshot is requested without holding the stream lock, so the stream thread is never blocked.
+    #  The returned arrays are copies, the stream keeps updating the local orderbook.
     def fetch_orderbook(self, limit):
-        client = self.client(self.api_key, self.api_secret, base_url=self.api_url)
-        orderbook = client.depth(self.symbol, limit=limit)
-        orderbook_bids = pd.DataFrame(orderbook['bids'])
-        orderbook_asks = pd.DataFrame(orderbook['asks'])
-        orderbook_bids.columns = ['price', 'volume']
-        orderbook_asks.columns = ['price', 'volume']
-        orderbook_bids.sort_values(by='price', ascending=False)
-        return (orderbook_bids, orderbook_asks)
+        with self.stream_lock:
+            if self.order_book_streamed and self.order_book.synced and not self.order_book_resyncing:
+                return self._copy_order_book(self.order_book, limit)
+        snapshot_book = LocalOrderBook()
+        snapshot_book.apply_snapshot(self.fetch_orderbook_snapshot(limit))
+        with self.stream_lock:
+            if not self.order_book_streamed:
+                self.order_book = snapshot_book
+        return self._copy_order_book(snapshot_book, limit)
+
+    @staticmethod
+    def _copy_order_book(order_book, limit):
+        bids = order_book.bids(limit)
+        asks = order_book.asks(limit)
+        return (BookSide(bids.price.copy(), bids.volume.copy()),
+                BookSide(asks.price.copy(), asks.volume.copy()))
+
+    ## Applies a diff-depth stream event (<symbol>@depth) to the local orderbook.
+    #  Called on the stream thread, it never waits for a request: if the orderbook is not seeded
+    #  or an update is missing, the snapshot is fetched on a background thread
+    #  (see _resync_order_book()) and the events are buffered until it arrives.
+    def apply_depth_update(self, event, snapshot_limit=1000):
+        with self.stream_lock:
+            self.order_book_streamed = True
+            if self.order_book_resyncing:
+                self.depth_buffer.append(event)
+                return
+            if self.order_book.synced:
+                self.order_book.apply_diff(event)
+                if self.order_book.synced:
+                    return
+            self.order_book_resyncing = True
+            self.depth_buffer = [event]
+        threading.Thread(
+            target=self._resync_order_book, args=(snapshot_limit,), name='OrderBookResync', daemon=True).start()
+
+    ## Seeds the streamed orderbook from a new snapshot and the events buffered meanwhile.
+    #  The continuity check of LocalOrderBook.sync() drops the events older than the snapshot,
+    #  a snapshot older than the buffered events is fetched again.
+    def _resync_order_book(self, snapshot_limit):
+        try:
+            while True:
+                snapshot = self.fetch_orderbook_snapshot(snapshot_limit)
+                with self.stream_lock:
+                    if not self.order_book_streamed:
+                        return
+                    events = self.depth_buffer
+                    self.depth_buffer = list()
+                    if self.order_book.sync(snapshot, events):
+                        return
+                    # The events did not connect to the snapshot, they are kept for the next one.
+                    self.depth_buffer = events
+        except Exception as e:
+            # The next event starts a new resynchronization.
+            if self.stream is not None:
+                self.stream.last_error = e
+            with self.stream_lock:
+                self.order_book.synced = False
+        finally:
+            with self.stream_lock:
+                self.order_book_resyncing = False
+
+    ## Subscribes to the bookTicker, depth and kline streams of the market.
+    #  The streams are received on a background thread and keep the price, the local orderbook
+    #  and the current candle up to date in memory, so a cycle reads them without REST requests.
+    #  @param resolution_sec resolution of the streamed candles.
+    #  @param depth_speed_ms update speed of the depth stream, 100 or 1000.
+    def start_streaming(self, resolution_sec=60, depth_speed_ms=100):
+        if self.stream is not None:
+            return
+        self.order_book_streamed = True
+        self.stream = MarketStream(
+            self.stream_url,
+            binance_stream_names(self.symbol, binance_interval(resolution_sec), depth_speed_ms),
+            {'bookTicker': self._on_book_ticker, 'depth': self.apply_depth_update, 'kline': self._on_kline},
+            on_connect=self._on_stream_connect)
+        self.stream.start()
+
+    ## Stops the streams, the market data is polled again.
+    def stop_streaming(self):
+        if self.stream is None:
+            return
+        self.stream.stop()
+        self.stream = None
+        with self.stream_lock:
+            self.order_book_streamed = False
+            self.depth_buffer = list()
+            self.best_bid_ask = None
+            self.streamed_candle = None
+
+    def _on_stream_connect(self):
+        # Depth events were missed while disconnected, the orderbook is seeded again.
+        with self.stream_lock:
+            self.order_book.synced = False
+            self.depth_buffer = list()
+
+    def _on_book_ticker(self, event):
+        self.best_bid_ask = (float(event['b']), float(event['a']))
+
+    def _on_kline(self, event):
+        kline = event['k']
+        self.streamed_candle = {
+            'startTime': pd.Timestamp(kline['t'], unit='ms'),
+            'open': float(kline['o']),
+            'high': float(kline['h']),
+            'low': float(kline['l']),
+            'close': float(kline['c']),
+            'volume': float(kline['v']),
+            'closeTime': pd.Timestamp(kline['T'], unit='ms'),
+            'quoteAssetVolume': float(kline['q']),
+            'noOfTrades': int(kline['n']),
+            'takerByBaseAssetVol': float(kline['V']),
+            'takerByQuoteAssetVol': float(kline['Q']),
+            'closed': bool(kline['x'])
+        }
+
+    ## Returns the current candle of the kline stream, None if the market data is not streamed.
+    def get_current_candle(self):
+        return self.streamed_candle
+
+    def get_candle_opening_price(self):
+        if self.streamed_candle is None:
+            return None
+        return self.streamed_candle['open']
 
     ## Get historical data
+    #  Closed candles are served from the kline cache (see KlineCache), only the open tail is requested.
     #  @param start_date starting date of the data
     #  @param end_date end date of the data
     #  @param resolution of the data
     def historical_data(
             self, start_time, end_time, resolution_sec=1, limit=1000):
         # Specify the base and quote currencies to get single market data
-        client = self.client(self.api_key, self.api_secret, base_url=self.api_url)
-        resolution_str = f"{resolution_sec}s"
-        if resolution_sec == 60:
-            resolution_str = "1m"
-        elif resolution_sec == 900:
-            resolution_str = "15m"
-        elif resolution_sec == 1200:
-            resolution_str = "30m"
-        elif resolution_sec == 60 * 60:
-            resolution_str = "1h"
-        elif resolution_sec == 1440 * 60:
-            resolution_str = "1d"
-        if start_time is None:
-            candles = client.klines(
+        resolution_str = binance_interval(resolution_sec)
+        start_ms = None if start_time is None else int(start_time * 1000)
+        end_ms = None if end_time is None else int(end_time * 1000)
+        # Requests of the latest candles (no start time) always change, they are not cached.
+        if self.kline_cache is None or start_ms is None:
+            return self._request_klines(resolution_str, start_ms, end_ms, limit)
+        return self.kline_cache.fetch(
+            self.symbol, resolution_str, resolution_sec * 1000, start_ms, end_ms, limit,
+            lambda first_ms, last_ms, count: self._request_klines(resolution_str, first_ms, last_ms, count))
+
+    ## Requests klines from the platform.
+    #  @return the parsed data frame, None for an invalid symbol.
+    def _request_klines(self, resolution_str, start_ms, end_ms, limit):
+        if start_ms is None:
+            candles = self._request(
+                'klines', PRIORITY_HISTORY,
                 self.symbol,
                 resolution_str,
                 limit=limit)
-        elif end_time is None:
-            candles = client.klines(
+        elif end_ms is None:
+            candles = self._request(
+                'klines', PRIORITY_HISTORY,
                 self.symbol,
                 resolution_str,
-                startTime=int(start_time * 1000),
+                startTime=start_ms,
                 limit=limit)
         else:
-            candles = client.klines(
+            candles = self._request(
+                'klines', PRIORITY_HISTORY,
                 self.symbol,
                 resolution_str,
-                startTime=int(start_time * 1000),
-                endTime=int(end_time * 1000),
+                startTime=start_ms,
+                endTime=end_ms,
                 limit=limit)
         if 'msg' in candles and candles['msg'] == "Invalid symbol.":
             return None
@@ -158,22 +446,36 @@ class Binance(PlatformWrapper):
             print("No price returned...")
             return 0
 
-    ## Returns all wallet balances.
-    def get_balances(self):
+    ## Fetches all wallet balances.
+    def fetch_balances(self):
         account = self.get_account_info()
         return account['balances']
 
+    ## Returns all wallet balances.
+    #  The balances fetched at the beginning of the cycle are reused (see set_cycle_fetches()).
+    def get_balances(self):
+        if self.cycle_balances is not None:
+            return self.cycle_balances
+        return self.fetch_balances()
+
     ## Gets the current price from the platform wrapper.
+    #  While streaming it is the mid price of the bookTicker stream (the last close before the first event).
     def fetch_current_price(self):
-        client = self.client(self.api_key, self.api_secret, base_url=self.api_url)
-        return client.ticker_price(self.symbol)['price']
+        if self.stream is not None:
+            best_bid_ask = self.best_bid_ask
+            if best_bid_ask is not None:
+                return (best_bid_ask[0] + best_bid_ask[1]) / 2.0
+            if self.streamed_candle is not None:
+                return self.streamed_candle['close']
+        return float(self._request('ticker_price', PRIORITY_MARKET_DATA, self.symbol)['price'])
 
 
 class BinanceTestNet(Binance):
-    def __init__(self, base_currency, quote_currency):
-        super(BinanceTestNet, self).__init__(base_currency, quote_currency)
+    def __init__(self, base_currency, quote_currency, pool_size=10, timeout=10):
+        super(BinanceTestNet, self).__init__(base_currency, quote_currency, pool_size, timeout)
         self.testnet = True
         self.api_url = 'https://testnet.binance.vision'
+        self.stream_url = BINANCE_TESTNET_STREAM_URL
         self.api_key = os.getenv("BINANCE_TESTNET_API_KEY")
         self.api_secret = None
 
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+## Name of the candle opening time column.
+START_TIME = 'startTime'
+## Price and volume columns that are always stored as float64.
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _is_datetime_column(series):
+    return pd.api.types.is_datetime64_any_dtype(series)
+
+
+## Columnar, NumPy backed candle data set used for replaying test data.
+#  Timestamps are stored as int64 epoch nanoseconds,
+#  OHLCV values as contiguous float64 arrays.
+#  Any additional column of the source data frame is kept as a NumPy array too,
+#  datetime columns are converted to int64 epoch nanoseconds.
+class CandleColumns():
+    def __init__(self, columns, datetime_columns=(START_TIME,)):
+        if START_TIME not in columns:
+            raise Exception(f"CandleColumns(): '{START_TIME}' column is missing")
+        ## Dictionary of column name -> NumPy array.
+        self.columns = columns
+        ## Names of the columns holding epoch nanoseconds, that shall be returned as timestamps.
+        self.datetime_columns = frozenset(datetime_columns)
+        ## Candle opening times in epoch nanoseconds.
+        self.start_time = columns[START_TIME]
+        self.length = len(self.start_time)
+
+    ## Creates the columnar data set from a pandas data frame.
+    #  @param df data frame with at least startTime and OHLCV columns.
+    @classmethod
+    def from_dataframe(cls, df):
+        columns = dict()
+        datetime_columns = list()
+        for name in df.columns:
+            series = df[name]
+            if _is_datetime_column(series):
+                columns[name] = np.ascontiguousarray(
+                    series.to_numpy(dtype='datetime64[ns]').view(np.int64))
+                datetime_columns.append(name)
+            elif name in OHLCV_COLUMNS:
+                columns[name] = np.ascontiguousarray(series.to_numpy(dtype=np.float64))
+            else:
+                columns[name] = np.ascontiguousarray(series.to_numpy())
+        return cls(columns, datetime_columns)
+
+    ## Loads the columnar data set from an HDF file generated by dataset_generator.
+    @classmethod
+    def from_hdf(cls, path):
+        with pd.HDFStore(path, mode='r') as store:
+            return cls.from_dataframe(store['data'])
+
+    ## Returns the names of all stored columns.
+    def names(self):
+        return list(self.columns.keys())
+
+    ## Returns a lightweight view of the candle at the requested row.
+    def candle(self, index):
+        return CandleView(self, index)
+
+    ## Returns zero-copy slices of all columns for the rows [first, last).
+    def slice(self, first, last):
+        return {name: column[first:last] for name, column in self.columns.items()}
+
+    ## Returns true if the start times are in increasing order.
+    def is_sorted(self):
+        return bool(np.all(self.start_time[1:] > self.start_time[:-1]))
+
+    ## Returns a copy of the data set sorted by start time, duplicate start times are dropped.
+    def sorted(self):
+        (_, order) = np.unique(self.start_time, return_index=True)
+        columns = {name: column[order] for name, column in self.columns.items()}
+        return CandleColumns(columns, self.datetime_columns)
+
+    ## Binary searches the start time index.
+    #  @param timestamp datetime, pd.Timestamp or epoch nanoseconds
+    #  @param side 'left' returns the first candle starting at or after the timestamp,
+    #  'right' returns the first candle starting after it.
+    #  @return row index, len() if there is no such candle.
+    def seek(self, timestamp, side='left'):
+        if not isinstance(timestamp, (int, np.integer)):
+            timestamp = pd.Timestamp(timestamp).value
+        return int(np.searchsorted(self.start_time, timestamp, side=side))
+
+    def __len__(self):
+        return self.length
+
+
+## Read-only, dictionary like view of a single candle of a CandleColumns set.
+#  Values are read straight from the underlying arrays, nothing is copied.
+class CandleView():
+    __slots__ = ('_data', 'index')
+
+    def __init__(self, data, index):
+        self._data = data
+        ## Row index of the candle in the data set.
+        self.index = index
+
+    ## Returns the CandleColumns data set the view reads from.
+    @property
+    def data_set(self):
+        return self._data
+
+    def __getitem__(self, key):
+        value = self._data.columns[key][self.index]
+        if key in self._data.datetime_columns:
+            return pd.Timestamp(int(value))
+        return value
+
+    def __contains__(self, key):
+        return key in self._data.columns
+
+    def get(self, key, default=None):
+        if key not in self._data.columns:
+            return default
+        return self[key]
+
+    def keys(self):
+        return self._data.columns.keys()
+
+    ## Returns the candle as a dictionary.
+    def to_dict(self):
+        return {key: self[key] for key in self._data.columns}
+
+    ## Returns the candle as a pandas Series (same as a data frame row would be).
+    def to_series(self):
+        return pd.Series(self.to_dict())
+
+    def __repr__(self):
+        return f"CandleView({self.index}, {self.to_dict()})"
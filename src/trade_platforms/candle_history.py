@@ -0,0 +1,145 @@
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from trade_platforms.candle_columns import START_TIME
+
+
+def _to_epoch_ns(value):
+    """Converts None, epoch seconds, datetime or pd.Timestamp to epoch nanoseconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value * 1000000000)
+    if isinstance(value, datetime) or isinstance(value, str):
+        return pd.Timestamp(value).value
+    return int(value)
+
+
+## Preallocated candle history buffer.
+#  Candles are appended in O(1) (amortized) and time range queries are answered
+#  with a binary search on the start time column, returning zero-copy slices.
+#  If capacity is set, only the last capacity candles are kept. The buffer is then
+#  twice the capacity, so the retained window is always a contiguous slice and it is
+#  compacted to the front only once every capacity appends.
+class CandleHistory():
+    def __init__(self, capacity=None, initial_size=1024):
+        ## Maximum number of retained candles, None means unbounded.
+        self.capacity = capacity
+        self.initial_size = initial_size if capacity is None else 2 * capacity
+        ## Dictionary of column name -> preallocated NumPy array.
+        self.buffers = None
+        ## Names of the columns holding epoch nanoseconds.
+        self.datetime_columns = frozenset()
+        # Retained window is buffers[begin:end]
+        self.begin = 0
+        self.end = 0
+
+    ## Allocates the buffers matching the columns of a CandleColumns data set.
+    def allocate_like(self, data):
+        self.buffers = {
+            name: np.empty(self.initial_size, dtype=column.dtype)
+            for name, column in data.columns.items()}
+        self.datetime_columns = data.datetime_columns
+        self.begin = 0
+        self.end = 0
+
+    ## Allocates the buffers for the given columns.
+    #  @param dtypes dictionary of column name -> NumPy dtype
+    #  @param datetime_columns names of the columns holding epoch nanoseconds
+    def allocate(self, dtypes, datetime_columns=(START_TIME,)):
+        self.buffers = {
+            name: np.empty(self.initial_size, dtype=dtype) for name, dtype in dtypes.items()}
+        self.datetime_columns = frozenset(datetime_columns)
+        self.begin = 0
+        self.end = 0
+
+    def _make_room(self):
+        size = len(self.buffers[START_TIME])
+        if self.end < size:
+            return
+        length = self.end - self.begin
+        if self.capacity is None:
+            for name, buffer in self.buffers.items():
+                grown = np.empty(2 * size, dtype=buffer.dtype)
+                grown[:length] = buffer[self.begin:self.end]
+                self.buffers[name] = grown
+        else:
+            for buffer in self.buffers.values():
+                buffer[:length] = buffer[self.begin:self.end]
+        self.begin = 0
+        self.end = length
+
+    ## Appends a single candle.
+    #  @param candle CandleView of the candle to store.
+    def append(self, candle):
+        if self.buffers is None:
+            self.allocate_like(candle.data_set)
+        self._make_room()
+        row = candle.index
+        for name, column in candle.data_set.columns.items():
+            self.buffers[name][self.end] = column[row]
+        self.end += 1
+        if self.capacity is not None and self.end - self.begin > self.capacity:
+            self.begin += 1
+
+    ## Appends a single candle given as values.
+    #  @param values dictionary of column name -> value, it must contain every allocated column.
+    def append_values(self, values):
+        self._make_room()
+        for name, buffer in self.buffers.items():
+            buffer[self.end] = values[name]
+        self.end += 1
+        if self.capacity is not None and self.end - self.begin > self.capacity:
+            self.begin += 1
+
+    ## Returns zero-copy column slices of the last count candles.
+    def tail(self, count):
+        if self.buffers is None:
+            return dict()
+        first = max(self.begin, self.end - count)
+        return {name: buffer[first:self.end] for name, buffer in self.buffers.items()}
+
+    ## Returns the zero-copy column arrays of the retained window.
+    def columns(self):
+        if self.buffers is None:
+            return dict()
+        return {name: buffer[self.begin:self.end] for name, buffer in self.buffers.items()}
+
+    ## Returns the row range [first, last) of candles starting within [start_time, end_time].
+    #  @param start_time None, epoch seconds or datetime.
+    #  @param end_time None, epoch seconds or datetime (inclusive).
+    def search(self, start_time=None, end_time=None):
+        if self.buffers is None:
+            return (0, 0)
+        start_times = self.buffers[START_TIME][self.begin:self.end]
+        first = 0
+        last = len(start_times)
+        start_ns = _to_epoch_ns(start_time)
+        end_ns = _to_epoch_ns(end_time)
+        if start_ns is not None:
+            first = int(np.searchsorted(start_times, start_ns, side='left'))
+        if end_ns is not None:
+            last = int(np.searchsorted(start_times, end_ns, side='right'))
+        return (self.begin + first, self.begin + max(first, last))
+
+    ## Returns zero-copy column slices of the candles within [start_time, end_time].
+    def slice(self, start_time=None, end_time=None):
+        (first, last) = self.search(start_time, end_time)
+        if self.buffers is None:
+            return dict()
+        return {name: buffer[first:last] for name, buffer in self.buffers.items()}
+
+    ## Returns the candles within [start_time, end_time] as a data frame sharing memory with the buffer.
+    #  The data frame is only valid until the next append, copy it if it needs to be kept.
+    def to_dataframe(self, start_time=None, end_time=None):
+        return self.columns_to_dataframe(self.slice(start_time, end_time))
+
+    ## Returns the columns (returned by slice() or tail()) as a data frame sharing memory with the buffer.
+    def columns_to_dataframe(self, columns):
+        for name in self.datetime_columns:
+            columns[name] = columns[name].view('datetime64[ns]')
+        return pd.DataFrame(columns, copy=False)
+
+    def __len__(self):
+        return self.end - self.begin
@@ -0,0 +1,69 @@
+import numpy as np
+
+## Default number of ticks generated per candle.
+DEFAULT_TICK_COUNT = 15
+
+
+def generate_candle_paths(open, high, low, close, tick_count=DEFAULT_TICK_COUNT, seed=None, noise=0.5):
+    """
+        Generates intra-candle price paths for a whole candle data set at once.
+        Every path starts at the open, ends at the close and visits the high and the low
+        (the extreme nearer to the open is more likely to come first) at random ticks.
+        Between these anchors the price follows a Brownian bridge clipped to [low, high],
+        so the path is always consistent with the candle.
+
+        Parameters:
+            - open, high, low, close (np.ndarray): candle prices.
+            - tick_count (int): number of ticks per candle, at least 4.
+            - seed (int or np.random.Generator): seed of the random generator, the same seed
+              gives the same paths.
+            - noise (float): standard deviation of the bridge noise relative to the candle range.
+
+        Returns:
+            - (np.ndarray): (candle count, tick_count) array of tick prices.
+    """
+    if tick_count < 4:
+        raise Exception("generate_candle_paths(): At least 4 ticks are needed per candle")
+    rng = np.random.default_rng(seed)
+    open = np.asarray(open, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    candle_count = len(open)
+    rows = np.arange(candle_count)[:, np.newaxis]
+
+    # Two distinct random ticks between the open and the close for the extremes.
+    first = rng.integers(1, tick_count - 1, candle_count)
+    second = rng.integers(1, tick_count - 2, candle_count)
+    second += second >= first
+    (first, second) = (np.minimum(first, second), np.maximum(first, second))
+    distance_to_high = high - open
+    distance_to_low = open - low
+    total = distance_to_high + distance_to_low
+    low_probability = np.divide(
+        distance_to_high, total, out=np.full(candle_count, 0.5), where=total > 0)
+    low_first = rng.random(candle_count) < low_probability
+    anchor_ticks = np.stack(
+        (np.zeros(candle_count, dtype=np.int64), first, second, np.full(candle_count, tick_count - 1)), axis=1)
+    anchor_prices = np.stack(
+        (open, np.where(low_first, low, high), np.where(low_first, high, low), close), axis=1)
+
+    # Segment (between two anchors) of every tick.
+    ticks = np.arange(tick_count)
+    segment = (ticks >= first[:, np.newaxis]).astype(np.int64) + (ticks >= second[:, np.newaxis])
+    segment_start = anchor_ticks[rows, segment]
+    segment_end = anchor_ticks[rows, segment + 1]
+    position = (ticks - segment_start) / (segment_end - segment_start)
+    start_price = anchor_prices[rows, segment]
+    paths = start_price + position * (anchor_prices[rows, segment + 1] - start_price)
+
+    # Brownian bridge, zero at every anchor.
+    scale = (high - low)[:, np.newaxis] * (noise / np.sqrt(tick_count))
+    walk = np.cumsum(rng.standard_normal((candle_count, tick_count)), axis=1) * scale
+    walk_start = np.take_along_axis(walk, segment_start, axis=1)
+    walk_end = np.take_along_axis(walk, segment_end, axis=1)
+    paths += walk - walk_start - position * (walk_end - walk_start)
+    paths = np.clip(paths, low[:, np.newaxis], high[:, np.newaxis])
+    # The anchors are exact, not interpolated.
+    paths[rows, anchor_ticks] = anchor_prices
+    return paths
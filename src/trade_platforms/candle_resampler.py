@@ -0,0 +1,144 @@
+import re
+import numpy as np
+
+from trade_platforms.candle_history import CandleHistory
+
+NANOSECONDS = 1000000000
+_TIMEFRAME_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60}
+## Columns of the resampled candles.
+RESAMPLED_COLUMNS = {
+    'startTime': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64}
+
+
+def parse_timeframe(timeframe) -> int:
+    """
+        Converts a timeframe to seconds.
+
+        Parameters:
+            - timeframe (str or int): for example '1s', '5m', '4h', '1d', or already seconds.
+
+        Returns:
+            - (int): the length of the timeframe in seconds.
+    """
+    if isinstance(timeframe, (int, np.integer)):
+        return int(timeframe)
+    match = re.fullmatch(r'(\d+)([smhdw])', timeframe)
+    if match is None:
+        raise Exception(f"parse_timeframe(): Unknown timeframe {timeframe}")
+    return int(match.group(1)) * _TIMEFRAME_UNITS[match.group(2)]
+
+
+def resample_columns(columns: dict, timeframe) -> dict:
+    """
+        Resamples a whole candle data set to a higher timeframe at once.
+        Candles are grouped to epoch aligned buckets (like the platform does),
+        the last bucket may be incomplete.
+
+        Parameters:
+            - columns (dict): column name -> NumPy array, startTime in epoch nanoseconds and OHLCV.
+            - timeframe (str or int): the timeframe to resample to, see parse_timeframe().
+
+        Returns:
+            - (dict): startTime, open, high, low, close, volume arrays of the resampled candles.
+    """
+    step = parse_timeframe(timeframe) * NANOSECONDS
+    start_times = np.asarray(columns['startTime'], dtype=np.int64)
+    if len(start_times) == 0:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in RESAMPLED_COLUMNS.items()}
+    buckets = start_times - start_times % step
+    first_rows = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    last_rows = np.concatenate((first_rows[1:], [len(buckets)])) - 1
+    return {
+        'startTime': buckets[first_rows],
+        'open': np.asarray(columns['open'], dtype=np.float64)[first_rows],
+        'high': np.maximum.reduceat(np.asarray(columns['high'], dtype=np.float64), first_rows),
+        'low': np.minimum.reduceat(np.asarray(columns['low'], dtype=np.float64), first_rows),
+        'close': np.asarray(columns['close'], dtype=np.float64)[last_rows],
+        'volume': np.add.reduceat(np.asarray(columns['volume'], dtype=np.float64), first_rows)}
+
+
+## Keeps a single higher timeframe up to date from base candles.
+class _TimeframeAggregator():
+    def __init__(self, timeframe_sec, base_resolution_sec, capacity):
+        self.step = timeframe_sec * NANOSECONDS
+        self.base_step = base_resolution_sec * NANOSECONDS
+        ## Closed candles of the timeframe.
+        self.closed = CandleHistory(capacity)
+        self.closed.allocate(RESAMPLED_COLUMNS)
+        ## The candle being aggregated, None before the first base candle.
+        self.current = None
+
+    def update(self, start_time, open, high, low, close, volume):
+        bucket = start_time - start_time % self.step
+        current = self.current
+        if current is not None and current['startTime'] != bucket:
+            self.closed.append_values(current)
+            current = None
+        if current is None:
+            self.current = {
+                'startTime': bucket, 'open': open, 'high': high,
+                'low': low, 'close': close, 'volume': volume}
+        else:
+            if high > current['high']:
+                current['high'] = high
+            if low < current['low']:
+                current['low'] = low
+            current['close'] = close
+            current['volume'] += volume
+        # Closed as soon as the last base candle of the bucket arrives.
+        if start_time + self.base_step >= bucket + self.step:
+            self.closed.append_values(self.current)
+            self.current = None
+
+
+## Incremental multi-timeframe candle resampler.
+#  Consumes base candles (for example 1s or 1m) and keeps any number of higher timeframes
+#  up to date in O(1) per base candle. Closed candles of every timeframe are kept in
+#  a CandleHistory buffer, so the last N closed candles are returned without re-aggregation.
+class CandleResampler():
+    def __init__(self, timeframes, base_resolution_sec=60, capacity=None):
+        ## Timeframe name -> aggregator
+        self.aggregators = {
+            timeframe: _TimeframeAggregator(parse_timeframe(timeframe), base_resolution_sec, capacity)
+            for timeframe in timeframes}
+
+    ## Adds a base candle given by its values.
+    #  @param start_time candle start time in epoch nanoseconds.
+    def update(self, start_time, open, high, low, close, volume):
+        for aggregator in self.aggregators.values():
+            aggregator.update(start_time, open, high, low, close, volume)
+
+    ## Adds a base candle given as a CandleView.
+    def update_candle(self, candle):
+        columns = candle.data_set.columns
+        row = candle.index
+        self.update(
+            int(columns['startTime'][row]),
+            float(columns['open'][row]),
+            float(columns['high'][row]),
+            float(columns['low'][row]),
+            float(columns['close'][row]),
+            float(columns['volume'][row]))
+
+    def _aggregator(self, timeframe):
+        if timeframe not in self.aggregators:
+            raise Exception(f"CandleResampler: {timeframe} timeframe is not resampled")
+        return self.aggregators[timeframe]
+
+    ## Returns the last count closed candles of the timeframe as a data frame
+    #  sharing memory with the resampler buffers (valid until the next update).
+    def get_closed_candles(self, timeframe, count):
+        closed = self._aggregator(timeframe).closed
+        return closed.columns_to_dataframe(closed.tail(count))
+
+    ## Returns the still open candle of the timeframe as a dictionary, None if there is none.
+    def get_current_candle(self, timeframe):
+        current = self._aggregator(timeframe).current
+        if current is None:
+            return None
+        return dict(current)
@@ -0,0 +1,162 @@
+import json
+import os
+from os.path import exists, isdir, join
+
+import numpy as np
+import pandas as pd
+
+from trade_platforms.candle_columns import CandleColumns, OHLCV_COLUMNS, START_TIME
+
+## File extension (directory suffix) of the columnar data sets.
+COLUMNAR_EXTENSION = '.cols'
+## Name of the metadata file within the data set directory.
+METADATA_FILE = 'meta.json'
+COLUMNAR_VERSION = 1
+
+
+def is_columnar_dataset(path):
+    """Returns true if the path is a columnar data set directory."""
+    return path is not None and isdir(path) and exists(join(path, METADATA_FILE))
+
+
+def _column_file(path, name):
+    return join(path, f"{name}.bin")
+
+
+def _dataframe_columns(df):
+    """Converts the data frame columns to the arrays stored in the data set."""
+    columns = dict()
+    datetime_columns = list()
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            columns[name] = series.to_numpy(dtype='datetime64[ns]').view(np.int64)
+            datetime_columns.append(name)
+        elif name in OHLCV_COLUMNS:
+            columns[name] = series.to_numpy(dtype=np.float64)
+        else:
+            column = series.to_numpy()
+            if column.dtype.hasobject:
+                # Only fixed size types can be memory mapped.
+                continue
+            columns[name] = column
+    return (columns, datetime_columns)
+
+
+## Writes a columnar data set chunk by chunk.
+#  Every column is stored as a raw little endian binary file (<column>.bin)
+#  and a small metadata header (meta.json) holds the column types and the row count.
+#  The metadata is updated after every appended chunk, so an interrupted
+#  download leaves a consistent data set behind.
+class ColumnarDatasetWriter():
+    def __init__(self, path):
+        self.path = path
+        if not exists(path):
+            os.makedirs(path)
+        self.metadata = None
+        if exists(join(path, METADATA_FILE)):
+            with open(join(path, METADATA_FILE), 'r') as f:
+                self.metadata = json.load(f)
+
+    ## Appends the rows of the data frame to the data set.
+    def append(self, df):
+        (columns, datetime_columns) = _dataframe_columns(df)
+        if self.metadata is None:
+            self.metadata = {
+                "version": COLUMNAR_VERSION,
+                "length": 0,
+                "columns": {name: column.dtype.newbyteorder('<').str for name, column in columns.items()},
+                "datetime_columns": datetime_columns
+            }
+        for name, dtype in self.metadata['columns'].items():
+            column = np.ascontiguousarray(columns[name], dtype=np.dtype(dtype))
+            with open(_column_file(self.path, name), 'ab') as f:
+                f.seek(self.metadata['length'] * column.itemsize)
+                f.truncate()
+                f.write(column.tobytes())
+        self.metadata['length'] += len(df)
+        self._write_metadata()
+
+    ## Drops the rows after the first length rows (for example the rows of an unfinished chunk).
+    def truncate(self, length):
+        if self.metadata is None or length >= self.metadata['length']:
+            return
+        for name, dtype in self.metadata['columns'].items():
+            with open(_column_file(self.path, name), 'ab') as f:
+                f.truncate(length * np.dtype(dtype).itemsize)
+        self.metadata['length'] = length
+        self._write_metadata()
+
+    def _write_metadata(self):
+        temp_file = join(self.path, f"{METADATA_FILE}.tmp")
+        with open(temp_file, 'w') as f:
+            json.dump(self.metadata, f)
+        os.replace(temp_file, join(self.path, METADATA_FILE))
+
+    def __len__(self):
+        if self.metadata is None:
+            return 0
+        return self.metadata['length']
+
+
+def read_columnar_metadata(path):
+    """Returns the metadata header of a columnar data set."""
+    with open(join(path, METADATA_FILE), 'r') as f:
+        return json.load(f)
+
+
+def open_columnar_dataset(path, start_time=None, end_time=None) -> CandleColumns:
+    """
+        Opens a columnar data set lazily.
+        Columns are memory mapped, only the start time column is binary searched for the
+        [start_time, end_time] interval, so only the pages covering the interval are read from disk.
+
+        Parameters:
+            - path (str): the data set directory.
+            - start_time (datetime): first candle to include, None means from the beginning.
+            - end_time (datetime): last candle to include, None means until the end.
+
+        Returns:
+            - (CandleColumns): memory mapped, read-only columns of the interval.
+    """
+    metadata = read_columnar_metadata(path)
+    length = metadata['length']
+    columns = dict()
+    for name, dtype in metadata['columns'].items():
+        if length == 0:
+            columns[name] = np.empty(0, dtype=np.dtype(dtype))
+            continue
+        columns[name] = np.memmap(
+            _column_file(path, name), dtype=np.dtype(dtype), mode='r', shape=(length,))
+    first = 0
+    last = length
+    if start_time is not None:
+        first = int(np.searchsorted(columns[START_TIME], pd.Timestamp(start_time).value, side='left'))
+    if end_time is not None:
+        last = int(np.searchsorted(columns[START_TIME], pd.Timestamp(end_time).value, side='right'))
+    columns = {name: column[first:last] for name, column in columns.items()}
+    return CandleColumns(columns, metadata['datetime_columns'])
+
+
+def convert_hdf_to_columnar(hdf_path, columnar_path=None, chunk_size=1000000) -> str:
+    """
+        Converts an HDF data set generated by dataset_generator to the columnar format.
+
+        Parameters:
+            - hdf_path (str): the .h5 data set.
+            - columnar_path (str): the output directory, default is the HDF path with .cols extension.
+            - chunk_size (int): number of rows converted at once.
+
+        Returns:
+            - (str): the columnar data set path.
+    """
+    if columnar_path is None:
+        columnar_path = os.path.splitext(hdf_path)[0] + COLUMNAR_EXTENSION
+    if exists(columnar_path):
+        raise Exception(f"convert_hdf_to_columnar(): {columnar_path} already exists")
+    writer = ColumnarDatasetWriter(columnar_path)
+    with pd.HDFStore(hdf_path, mode='r') as store:
+        row_count = store.get_storer('data').nrows
+        for start in range(0, row_count, chunk_size):
+            writer.append(store.select('data', start=start, stop=start + chunk_size))
+    return columnar_path
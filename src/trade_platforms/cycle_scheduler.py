@@ -0,0 +1,83 @@
+import math
+import time
+from collections import namedtuple
+
+## A fired cycle.
+#  boundary: wall-clock time (epoch seconds) the cycle is scheduled for,
+#  lateness: seconds the cycle started after its boundary,
+#  missed: number of boundaries skipped since the previous cycle (the previous cycle overran them).
+CycleTick = namedtuple('CycleTick', ['boundary', 'lateness', 'missed'])
+
+## Weight of the newest wake-up latency in the latency estimate.
+WAKE_LATENCY_SMOOTHING = 0.2
+## The last part of a wait is slept in steps of this length, so the wake-up is not late.
+FINE_SLEEP_SEC = 0.001
+
+
+## Fires cycles at wall-clock boundaries (multiples of the period plus an offset),
+#  for example at every candle close.
+#  Waits are computed from the absolute boundary, so the fetch and trade latency of the
+#  cycles does not accumulate. The wake-up latency of the sleep is measured and the
+#  scheduler wakes that much earlier. If a cycle overruns one or more boundaries,
+#  the missed cycles are coalesced into the next one instead of being fired back to back.
+class CycleScheduler():
+    def __init__(self, period_sec, offset_sec=0.0, clock=time.time, sleep=time.sleep):
+        if period_sec <= 0:
+            raise Exception("CycleScheduler: period has to be positive")
+        self.period_sec = period_sec
+        self.offset_sec = offset_sec
+        self.clock = clock
+        self.sleep = sleep
+        ## Boundary of the last fired cycle, None before the first one.
+        self.last_boundary = None
+        ## Estimated wake-up latency of the sleep in seconds.
+        self.wake_latency = 0.0
+        ## Counters: 'cycles', 'overruns' (cycles following an overrun), 'missed' (skipped boundaries),
+        #  'max_lateness' and 'total_lateness' in seconds.
+        self.stats = {'cycles': 0, 'overruns': 0, 'missed': 0, 'max_lateness': 0.0, 'total_lateness': 0.0}
+
+    ## Returns the first boundary after the time.
+    def next_boundary(self, now):
+        return (math.floor((now - self.offset_sec) / self.period_sec) + 1) * self.period_sec + self.offset_sec
+
+    ## Waits until the next boundary.
+    #  @return CycleTick of the fired cycle.
+    def wait(self):
+        now = self.clock()
+        missed = 0
+        if self.last_boundary is None:
+            boundary = self.next_boundary(now)
+        else:
+            boundary = self.last_boundary + self.period_sec
+            if now >= boundary + self.period_sec:
+                # Overrun, the latest passed boundary fires right away.
+                latest = self.next_boundary(now) - self.period_sec
+                missed = int(round((latest - boundary) / self.period_sec))
+                boundary = latest
+        remaining = boundary - now - self.wake_latency
+        if remaining > 0.0:
+            self.sleep(remaining)
+            slept_until = self.clock()
+            self.wake_latency += WAKE_LATENCY_SMOOTHING * (
+                (slept_until - (boundary - self.wake_latency)) - self.wake_latency)
+            self.wake_latency = max(0.0, self.wake_latency)
+            now = slept_until
+        while now < boundary:
+            self.sleep(min(FINE_SLEEP_SEC, boundary - now))
+            now = self.clock()
+        lateness = now - boundary
+        self.last_boundary = boundary
+        self.stats['cycles'] += 1
+        self.stats['missed'] += missed
+        if missed > 0:
+            self.stats['overruns'] += 1
+        self.stats['total_lateness'] += lateness
+        self.stats['max_lateness'] = max(self.stats['max_lateness'], lateness)
+        return CycleTick(boundary, lateness, missed)
+
+    ## Returns the counters and the mean lateness.
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['mean_lateness'] = stats['total_lateness'] / stats['cycles'] if stats['cycles'] > 0 else 0.0
+        stats['wake_latency'] = self.wake_latency
+        return stats
@@ -0,0 +1,163 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from glob import glob
+from os.path import basename, exists, join
+
+import pandas as pd
+
+## Index of the stored data sets.
+CATALOG_FILE = 'src/data/catalog.json'
+CATALOG_VERSION = 1
+## Checkpoint file suffix of the unfinished downloads, those are not complete data sets.
+_CHECKPOINT_SUFFIX = '.checkpoint.json'
+## <platform>_<base>_<quote>_<dataset>_<start>_<end>_<resolution>s<format>, see generate_dataset_filename().
+_DATASET_FILENAME = re.compile(
+    r'^(?P<platform_type>[^_]+)_(?P<base_currency>[^_]+)_(?P<quote_currency>[^_]+)_(?P<dataset>.+)_'
+    r'(?P<start>\d{8}_T\d{4})_(?P<end>\d{8}_T\d{4})_(?P<resolution_sec>\d+)s(?P<format>\.[a-z0-9]+)$')
+
+## Serializes the read-modify-write cycles of the catalog file within the process.
+_catalog_lock = threading.Lock()
+
+
+def _platform_type(platform):
+    platform_type = platform['platform_type']
+    return getattr(platform_type, 'value', platform_type)
+
+
+def parse_dataset_filename(file_name):
+    """
+        Returns the catalog entry of a data set file name generated by generate_dataset_filename(),
+        None if the name does not follow the naming scheme.
+    """
+    match = _DATASET_FILENAME.match(basename(file_name.rstrip('/')))
+    if match is None:
+        return None
+    return {
+        "platform_type": match['platform_type'],
+        "base_currency": match['base_currency'],
+        "quote_currency": match['quote_currency'],
+        "dataset": match['dataset'],
+        "resolution_sec": int(match['resolution_sec']),
+        "format": match['format'],
+        "start_time": pd.Timestamp(datetime.strptime(match['start'], "%Y%m%d_T%H%M")).value,
+        "end_time": pd.Timestamp(datetime.strptime(match['end'], "%Y%m%d_T%H%M")).value
+    }
+
+
+def load_catalog(catalog_file=CATALOG_FILE):
+    """
+        Loads the data set catalog.
+
+        Returns:
+            - (dict): file name -> entry (platform_type, base_currency, quote_currency, dataset,
+              resolution_sec, format and the covered [start_time, end_time) in epoch nanoseconds).
+    """
+    if not exists(catalog_file):
+        return dict()
+    with open(catalog_file, 'r') as f:
+        return json.load(f)['datasets']
+
+
+def _save_catalog(datasets, catalog_file):
+    temp_file = f"{catalog_file}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump({"version": CATALOG_VERSION, "datasets": datasets}, f, indent=1)
+    os.replace(temp_file, catalog_file)
+
+
+def register_dataset(
+        file_name, platform, dataset, start_time, end_time, resolution_sec, dataset_format,
+        catalog_file=CATALOG_FILE):
+    """Adds a complete data set covering [start_time, end_time) to the catalog."""
+    with _catalog_lock:
+        datasets = load_catalog(catalog_file)
+        datasets[file_name] = {
+            "platform_type": _platform_type(platform),
+            "base_currency": platform['base_currency'],
+            "quote_currency": platform['quote_currency'],
+            "dataset": dataset,
+            "resolution_sec": int(resolution_sec),
+            "format": dataset_format,
+            "start_time": pd.Timestamp(start_time).value,
+            "end_time": pd.Timestamp(end_time).value
+        }
+        _save_catalog(datasets, catalog_file)
+
+
+def unregister_dataset(file_name, catalog_file=CATALOG_FILE):
+    """Removes a data set from the catalog."""
+    with _catalog_lock:
+        datasets = load_catalog(catalog_file)
+        if datasets.pop(file_name, None) is not None:
+            _save_catalog(datasets, catalog_file)
+
+
+def scan_datasets(directory=None, catalog_file=CATALOG_FILE):
+    """
+        Adds the complete data sets of the directory missing from the catalog (for example the ones
+        downloaded before the catalog existed) and drops the entries of deleted files.
+        The covered interval is taken from the file name.
+    """
+    if directory is None:
+        directory = os.path.dirname(catalog_file)
+    with _catalog_lock:
+        datasets = load_catalog(catalog_file)
+        changed = False
+        for file_name in list(datasets.keys()):
+            if not exists(file_name):
+                del datasets[file_name]
+                changed = True
+        for file_name in glob(join(directory, '*')):
+            if file_name in datasets or exists(f"{file_name}{_CHECKPOINT_SUFFIX}"):
+                continue
+            entry = parse_dataset_filename(file_name)
+            if entry is None:
+                continue
+            datasets[file_name] = entry
+            changed = True
+        if changed:
+            _save_catalog(datasets, catalog_file)
+
+
+def find_covering_datasets(
+        platform, dataset, start_time, end_time, resolution_sec, dataset_format=None,
+        catalog_file=CATALOG_FILE):
+    """
+        Finds the stored data sets covering [start_time, end_time) of the market.
+        A single data set is returned if there is one covering the whole interval,
+        otherwise the fewest data sets that together cover it.
+
+        Parameters:
+            - platform (dict): platform_type, base_currency and quote_currency of the market.
+            - dataset (str): data set type (for example "candles").
+            - dataset_format (str): format of the data sets, None accepts any format.
+
+        Returns:
+            - (list): file names in time order, None if the catalog does not cover the interval.
+    """
+    first = pd.Timestamp(start_time).value
+    last = pd.Timestamp(end_time).value
+    candidates = [
+        (entry['start_time'], entry['end_time'], file_name)
+        for file_name, entry in load_catalog(catalog_file).items()
+        if entry['platform_type'] == _platform_type(platform)
+        and entry['base_currency'] == platform['base_currency']
+        and entry['quote_currency'] == platform['quote_currency']
+        and entry['dataset'] == dataset
+        and entry['resolution_sec'] == resolution_sec
+        and (dataset_format is None or entry['format'] == dataset_format)
+        and entry['end_time'] > first and entry['start_time'] < last
+        and exists(file_name)]
+    # Greedy interval cover: the data set reaching the farthest from the covered point is taken.
+    covering = list()
+    covered = first
+    while covered < last:
+        reaching = [candidate for candidate in candidates if candidate[0] <= covered < candidate[1]]
+        if len(reaching) == 0:
+            return None
+        (_, covered, file_name) = max(reaching, key=lambda candidate: candidate[1])
+        covering.append(file_name)
+    return covering
@@ -0,0 +1,126 @@
+from os.path import exists
+
+import numpy as np
+import pandas as pd
+
+## File name suffix of the coverage report stored next to a data set.
+COVERAGE_SUFFIX = '.coverage.npz'
+NANOSECONDS = 1000000000
+
+
+def coverage_file_name(dataset_file_name):
+    """Returns the coverage report path belonging to the data set."""
+    return f"{dataset_file_name.rstrip('/')}{COVERAGE_SUFFIX}"
+
+
+def find_gaps(start_times, resolution_sec, start_time=None, end_time=None):
+    """
+        Finds the duplicated and missing candles of a sorted start time column.
+
+        Parameters:
+            - start_times (np.ndarray): sorted candle start times in epoch nanoseconds.
+            - resolution_sec (int): candle resolution in seconds.
+            - start_time (datetime): expected first candle, default is the first candle of the data.
+            - end_time (datetime): end of the expected interval (exclusive), default is after the last candle.
+
+        Returns:
+            - duplicates (np.ndarray): indices of the candles having the same start time as the previous one.
+            - gaps (np.ndarray): (n, 2) array of [first missing, last missing] start times in epoch nanoseconds.
+    """
+    step = resolution_sec * NANOSECONDS
+    start_times = np.asarray(start_times, dtype=np.int64)
+    duplicates = np.flatnonzero(np.diff(start_times) == 0) + 1
+    unique = np.delete(start_times, duplicates)
+    # Bounds of the expected interval are virtual candles, so leading and trailing gaps are found too.
+    first = unique[0] if len(unique) > 0 else None
+    if start_time is not None:
+        first = pd.Timestamp(start_time).value
+    last = unique[-1] + step if len(unique) > 0 else None
+    if end_time is not None:
+        last = pd.Timestamp(end_time).value
+    if first is None or last is None:
+        return (duplicates, np.empty((0, 2), dtype=np.int64))
+    unique = unique[(unique >= first) & (unique < last)]
+    bounds = np.concatenate(([first - step], unique, [last]))
+    diff = np.diff(bounds)
+    gap_index = np.flatnonzero(diff > step)
+    gaps = np.empty((len(gap_index), 2), dtype=np.int64)
+    gaps[:, 0] = bounds[gap_index] + step
+    gaps[:, 1] = bounds[gap_index + 1] - step
+    return (duplicates, gaps)
+
+
+def coverage_bitmap(start_times, resolution_sec, start_time, end_time):
+    """
+        Returns the packed bitmap of the candle slots of [start_time, end_time) that are present.
+        Bit i (big bit order, see np.packbits) stands for the candle at start_time + i * resolution.
+    """
+    step = resolution_sec * NANOSECONDS
+    first = pd.Timestamp(start_time).value
+    slot_count = int((pd.Timestamp(end_time).value - first) // step)
+    slots = (np.asarray(start_times, dtype=np.int64) - first) // step
+    slots = slots[(slots >= 0) & (slots < slot_count)]
+    present = np.zeros(slot_count, dtype=bool)
+    present[slots] = True
+    return (np.packbits(present), slot_count)
+
+
+def write_coverage_report(
+        dataset_file_name, start_times, resolution_sec, start_time, end_time, unfillable_gaps=None):
+    """
+        Writes the coverage report (bitmap and gap metadata) next to the data set.
+        unfillable_gaps ((n, 2) array of first and last missing epoch ns) are the gaps the platform
+        has no data for, they are not fetched again.
+
+        Returns:
+            - (dict): the written report (see read_coverage_report()).
+    """
+    (duplicates, gaps) = find_gaps(start_times, resolution_sec, start_time, end_time)
+    (bitmap, slot_count) = coverage_bitmap(start_times, resolution_sec, start_time, end_time)
+    report = {
+        "start_time": np.int64(pd.Timestamp(start_time).value),
+        "end_time": np.int64(pd.Timestamp(end_time).value),
+        "resolution_sec": np.int64(resolution_sec),
+        "slot_count": np.int64(slot_count),
+        "covered_count": np.int64(np.unpackbits(bitmap, count=slot_count).sum()),
+        "duplicate_count": np.int64(len(duplicates)),
+        "gaps": gaps,
+        "unfillable_gaps": np.empty((0, 2), dtype=np.int64) if unfillable_gaps is None else
+        np.asarray(unfillable_gaps, dtype=np.int64).reshape(-1, 2),
+        "bitmap": bitmap
+    }
+    with open(coverage_file_name(dataset_file_name), 'wb') as f:
+        np.savez_compressed(f, **report)
+    return report
+
+
+def read_coverage_report(dataset_file_name):
+    """
+        Reads the coverage report of the data set, None if there is no report.
+
+        Returns:
+            - (dict): start_time, end_time (epoch ns), resolution_sec, slot_count, covered_count,
+              duplicate_count, gaps ((n, 2) array of first and last missing epoch ns), unfillable_gaps
+              (the gaps the platform has no data for, same format) and the packed bitmap.
+    """
+    if dataset_file_name is None or not exists(coverage_file_name(dataset_file_name)):
+        return None
+    with np.load(coverage_file_name(dataset_file_name)) as report:
+        report = {name: report[name] for name in report.files}
+    if 'unfillable_gaps' not in report:
+        # Report written before the unfillable gaps were recorded.
+        report['unfillable_gaps'] = np.empty((0, 2), dtype=np.int64)
+    return report
+
+
+def coverage_ratio(report, start_time, end_time):
+    """Returns the ratio of the present candles of [start_time, end_time) based on the coverage report."""
+    step = int(report['resolution_sec']) * NANOSECONDS
+    first = max(0, int((pd.Timestamp(start_time).value - int(report['start_time'])) // step))
+    last = min(
+        int(report['slot_count']),
+        int(-(-(pd.Timestamp(end_time).value - int(report['start_time'])) // step)))
+    if last <= first:
+        return 0.0
+    present = np.unpackbits(report['bitmap'], count=int(report['slot_count']))[first:last]
+    return float(present.mean())
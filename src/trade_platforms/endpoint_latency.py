@@ -0,0 +1,46 @@
+import threading
+import pandas as pd
+
+
+## Per endpoint request latency counters.
+#  Thread safe, requests of concurrent fetches can be recorded at the same time.
+class EndpointLatency():
+    def __init__(self):
+        self.lock = threading.Lock()
+        ## Endpoint path -> {'count', 'total', 'min', 'max', 'last'} (seconds)
+        self.counters = dict()
+
+    ## Records a request of the endpoint.
+    #  @param endpoint the url path of the request without the query string.
+    #  @param seconds round trip time of the request.
+    def record(self, endpoint, seconds):
+        with self.lock:
+            counter = self.counters.get(endpoint)
+            if counter is None:
+                self.counters[endpoint] = {
+                    'count': 1, 'total': seconds, 'min': seconds, 'max': seconds, 'last': seconds}
+                return
+            counter['count'] += 1
+            counter['total'] += seconds
+            counter['last'] = seconds
+            if seconds < counter['min']:
+                counter['min'] = seconds
+            if seconds > counter['max']:
+                counter['max'] = seconds
+
+    ## Records a requests.Response, can be registered as a session response hook.
+    def record_response(self, response, *args, **kwargs):
+        self.record(response.request.path_url.split('?')[0], response.elapsed.total_seconds())
+        return response
+
+    ## Returns the counters and the mean latency per endpoint.
+    def to_dataframe(self):
+        with self.lock:
+            df = pd.DataFrame.from_dict(
+                self.counters, orient='index', columns=['count', 'total', 'min', 'max', 'last'])
+        df['mean'] = df['total'] / df['count']
+        return df
+
+    def reset(self):
+        with self.lock:
+            self.counters = dict()
@@ -0,0 +1,126 @@
+from collections import namedtuple
+import numpy as np
+
+## One side of an L2 order book as NumPy arrays, best level first.
+BookSide = namedtuple('BookSide', ['price', 'volume'])
+
+
+def _cumulative_book(prices, volumes):
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    return (prices, np.cumsum(volumes), np.cumsum(prices * volumes))
+
+
+def walk_book_sizes(prices, volumes, sizes):
+    """
+        Computes the fills of market orders of many sizes walking the same side of the order book.
+        Every size is filled independently, starting from the best level.
+
+        Parameters:
+            - prices (np.ndarray): level prices in best first order (ascending asks, descending bids).
+            - volumes (np.ndarray): base currency volume of the levels.
+            - sizes (np.ndarray): order sizes in base currency.
+
+        Returns:
+            - vwap (np.ndarray): volume weighted average fill price, NaN if nothing is filled.
+            - filled (np.ndarray): filled size, less than the order size if the book is not deep enough.
+            - levels (np.ndarray): number of levels (partially) consumed.
+    """
+    (prices, cumulative_volume, cumulative_cost) = _cumulative_book(prices, volumes)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    if len(prices) == 0:
+        return (np.full(sizes.shape, np.nan), np.zeros(sizes.shape), np.zeros(sizes.shape, dtype=np.int64))
+    # Index of the level the order is completed on.
+    last = np.searchsorted(cumulative_volume, sizes, side='left')
+    exhausted = last >= len(prices)
+    last = np.minimum(last, len(prices) - 1)
+    previous_volume = np.where(last > 0, cumulative_volume[last - 1], 0.0)
+    previous_cost = np.where(last > 0, cumulative_cost[last - 1], 0.0)
+    filled = np.where(exhausted, cumulative_volume[-1], sizes)
+    cost = np.where(
+        exhausted, cumulative_cost[-1], previous_cost + (sizes - previous_volume) * prices[last])
+    levels = np.where(exhausted, len(prices), last + 1)
+    levels = np.where(filled > 0.0, levels, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vwap = np.where(filled > 0.0, cost / filled, np.nan)
+    return (vwap, filled, levels)
+
+
+def walk_book(prices, volumes, size):
+    """
+        Computes the fill of a single market order, see walk_book_sizes().
+
+        Returns:
+            - vwap (float): volume weighted average fill price, NaN if nothing is filled.
+            - filled (float): filled size.
+            - levels (int): number of levels (partially) consumed.
+    """
+    (vwap, filled, levels) = walk_book_sizes(prices, volumes, [size])
+    return (float(vwap[0]), float(filled[0]), int(levels[0]))
+
+
+def estimate_slippage(prices, volumes, sizes):
+    """
+        Estimates the slippage of market orders of many sizes.
+
+        Returns:
+            - slippage (np.ndarray): relative distance of the fill VWAP from the best price
+              (always positive, the cost of the order size).
+            - filled (np.ndarray): filled size of each order.
+    """
+    (vwap, filled, _) = walk_book_sizes(prices, volumes, sizes)
+    if len(prices) == 0:
+        return (vwap, filled)
+    best = float(prices[0])
+    return (np.abs(vwap - best) / best, filled)
+
+
+def best_first(prices, volumes, side):
+    """
+        Returns the prices and volumes of an order book side in best first order,
+        without copying if they are already sorted.
+
+        Parameters:
+            - side (str): 'buy' for the asks a buy order walks, 'sell' for the bids.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    steps = np.diff(prices)
+    if side == 'buy':
+        if np.all(steps >= 0):
+            return (prices, volumes)
+        order = np.argsort(prices, kind='stable')
+    else:
+        if np.all(steps <= 0):
+            return (prices, volumes)
+        order = np.argsort(-prices, kind='stable')
+    return (prices[order], volumes[order])
+
+
+def as_book_side(orderbook, side) -> BookSide:
+    """
+        Converts an order book side (BookSide, or a data frame with 'price' and 'volume' columns)
+        to a BookSide in best first order.
+
+        Parameters:
+            - side (str): 'buy' for the asks a buy order walks, 'sell' for the bids.
+    """
+    if isinstance(orderbook, BookSide):
+        return orderbook
+    return BookSide(*best_first(orderbook['price'], orderbook['volume'], side))
+
+
+def crossing_volume(book_side: BookSide, limit_price, side):
+    """
+        Returns the volume of the levels a limit order crosses.
+
+        Parameters:
+            - book_side (BookSide): the opposite side in best first order (asks for a buy order).
+            - limit_price (float): the limit price of the order.
+            - side (str): side of the limit order, 'buy' or 'sell'.
+    """
+    if side == 'buy':
+        count = np.searchsorted(book_side.price, limit_price, side='right')
+    else:
+        count = np.searchsorted(-book_side.price, -limit_price, side='right')
+    return float(np.sum(book_side.volume[:count]))
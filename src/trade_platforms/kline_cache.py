@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+import time
+from os.path import exists, join
+
+import numpy as np
+import pandas as pd
+
+## Default directory of the cached klines.
+KLINE_CACHE_DIRECTORY = 'src/data/kline_cache'
+## Default size limit of the cache in bytes.
+KLINE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_EXTENSION = '.npz'
+## Name of the stored flag telling the entry holds the whole response (no candle is missing or open).
+_COMPLETE = '__complete__'
+
+
+## On-disk cache of parsed klines responses.
+#  Entries are content addressed by the request (symbol, interval, startTime, endTime, limit)
+#  and hold the closed candles of the response as columns.
+#  Closed candles never change, so they are served from disk, only the still open tail
+#  of a response is requested again. The least recently used entries are evicted
+#  when the cache grows over its size limit.
+class KlineCache():
+    def __init__(self, directory=KLINE_CACHE_DIRECTORY, max_bytes=KLINE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        ## Number of responses served entirely from disk.
+        self.hits = 0
+        ## Number of responses (partially) requested from the platform.
+        self.misses = 0
+
+    ## Returns the entry path of the request.
+    def entry_path(self, symbol, interval, start_ms, end_ms, limit):
+        key = f"{symbol}|{interval}|{start_ms}|{end_ms}|{limit}"
+        return join(self.directory, f"{hashlib.sha256(key.encode()).hexdigest()}{CACHE_EXTENSION}")
+
+    ## Returns the klines of the request, closed candles come from the cache.
+    #  @param interval_ms length of a candle in milliseconds.
+    #  @param request function(start_ms, end_ms, limit) requesting parsed klines from the platform,
+    #  it returns None for an invalid symbol.
+    #  @return data frame of the klines, None for an invalid symbol.
+    def fetch(self, symbol, interval, interval_ms, start_ms, end_ms, limit, request):
+        path = self.entry_path(symbol, interval, start_ms, end_ms, limit)
+        (cached, complete) = self._load(path)
+        if complete:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        if cached is None or len(cached) == 0:
+            df = request(start_ms, end_ms, limit)
+        else:
+            # Only the candles after the cached ones are requested.
+            last_start_ms = int(cached['startTime'].iloc[-1].value // 1000000)
+            tail = request(last_start_ms + 1, end_ms, limit - len(cached))
+            if tail is None:
+                return None
+            df = pd.concat([cached, tail], ignore_index=True) if len(tail) > 0 else cached
+        if df is None:
+            return None
+        now_ms = time.time() * 1000
+        if len(df) == 0:
+            closed_count = 0
+        else:
+            close_ms = df['closeTime'].to_numpy(dtype='datetime64[ns]').view(np.int64) // 1000000
+            closed_count = int(np.count_nonzero(close_ms < now_ms))
+        complete = closed_count == len(df) and \
+            (len(df) == limit or (end_ms is not None and end_ms <= now_ms - interval_ms))
+        if complete or closed_count > 0:
+            self._store(path, df.iloc[:closed_count], complete)
+        return df
+
+    def _load(self, path):
+        if not exists(path):
+            return (None, False)
+        try:
+            with np.load(path) as entry:
+                columns = {name: entry[name] for name in entry.files if name != _COMPLETE}
+                complete = bool(entry[_COMPLETE])
+        except (OSError, ValueError, KeyError):
+            # Broken entries (for example of an interrupted write) are fetched again.
+            return (None, False)
+        # Access time of the entry, used by the eviction.
+        os.utime(path)
+        return (pd.DataFrame(columns), complete)
+
+    def _store(self, path, df, complete):
+        # Datetime columns keep their unit, the columns are stored as they are.
+        columns = {name: df[name].to_numpy() for name in df.columns}
+        columns[_COMPLETE] = np.array(complete)
+        with self.lock:
+            if not exists(self.directory):
+                os.makedirs(self.directory)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                np.savez(f, **columns)
+            os.replace(temp_path, path)
+            self._evict()
+
+    ## Removes the least recently used entries while the cache is larger than its limit.
+    def _evict(self):
+        entries = [entry for entry in os.scandir(self.directory)
+                   if entry.is_file() and entry.name.endswith(CACHE_EXTENSION)]
+        total = sum(entry.stat().st_size for entry in entries)
+        if total <= self.max_bytes:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+    ## Removes all entries.
+    def clear(self):
+        with self.lock:
+            if not exists(self.directory):
+                return
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(CACHE_EXTENSION):
+                    os.remove(entry.path)
+
+    ## Returns the number of entries and their total size in bytes.
+    def size(self):
+        if not exists(self.directory):
+            return (0, 0)
+        entries = [entry for entry in os.scandir(self.directory)
+                   if entry.is_file() and entry.name.endswith(CACHE_EXTENSION)]
+        return (len(entries), sum(entry.stat().st_size for entry in entries))
@@ -0,0 +1,154 @@
+import numpy as np
+
+from trade_platforms.fill_engine import BookSide
+
+
+def _levels(levels):
+    """Converts [[price, quantity], ...] (strings or numbers) to float arrays."""
+    if len(levels) == 0:
+        return (np.empty(0), np.empty(0))
+    levels = np.asarray(levels, dtype=np.float64)
+    return (levels[:, 0], levels[:, 1])
+
+
+## One side of the local order book.
+#  Levels are kept sorted best first in typed arrays. Sorting uses a key
+#  (the price for asks, the negated price for bids), so the best level is always at index 0.
+class _BookLevels():
+    def __init__(self, sign):
+        self.sign = sign
+        self.keys = np.empty(0)
+        self.volumes = np.empty(0)
+        self._cumulative = None
+
+    def reset(self, prices, volumes):
+        keep = volumes > 0.0
+        keys = prices[keep] * self.sign
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.volumes = volumes[keep][order]
+        self._cumulative = None
+
+    ## Applies level updates, a zero quantity removes the level.
+    def update(self, prices, volumes):
+        if len(prices) == 0:
+            return
+        keys = prices * self.sign
+        index = np.searchsorted(self.keys, keys)
+        found = index < len(self.keys)
+        found[found] = self.keys[index[found]] == keys[found]
+        removed = found & (volumes == 0.0)
+        changed = found & (volumes > 0.0)
+        added = ~found & (volumes > 0.0)
+        self.volumes[index[changed]] = volumes[changed]
+        if removed.any():
+            keep = np.ones(len(self.keys), dtype=bool)
+            keep[index[removed]] = False
+            self.keys = self.keys[keep]
+            self.volumes = self.volumes[keep]
+        if added.any():
+            order = np.argsort(keys[added], kind='stable')
+            new_keys = keys[added][order]
+            positions = np.searchsorted(self.keys, new_keys)
+            self.keys = np.insert(self.keys, positions, new_keys)
+            self.volumes = np.insert(self.volumes, positions, volumes[added][order])
+        self._cumulative = None
+
+    ## Cumulative volume of the levels, computed once after every update.
+    def cumulative(self):
+        if self._cumulative is None:
+            self._cumulative = np.cumsum(self.volumes)
+        return self._cumulative
+
+    def __len__(self):
+        return len(self.keys)
+
+
+## Local L2 order book kept in sync with the platform.
+#  It is seeded from a REST snapshot and kept current by applying the diff-depth stream events
+#  ('U' first and 'u' last update id, 'b' bids and 'a' asks, like the Binance <symbol>@depth stream).
+#  Events are checked for continuity: a missing update marks the book out of sync,
+#  it has to be seeded again from a new snapshot.
+class LocalOrderBook():
+    def __init__(self):
+        self.bid_levels = _BookLevels(-1.0)
+        self.ask_levels = _BookLevels(1.0)
+        ## Id of the last applied update, None before the first snapshot.
+        self.last_update_id = None
+        ## False until the snapshot and the first stream event are connected, and after a gap.
+        self.synced = False
+        ## True while the first event after the snapshot is still expected.
+        self.waiting_first_event = False
+
+    ## Seeds the book from a depth snapshot {'lastUpdateId', 'bids', 'asks'}.
+    #  @param expect_events true if diff-depth events will follow the snapshot.
+    def apply_snapshot(self, snapshot, expect_events=False):
+        self.bid_levels.reset(*_levels(snapshot['bids']))
+        self.ask_levels.reset(*_levels(snapshot['asks']))
+        self.last_update_id = int(snapshot['lastUpdateId'])
+        self.synced = True
+        self.waiting_first_event = expect_events
+
+    ## Applies a diff-depth event.
+    #  @return true if it was applied, false if it was older than the book or it did not connect
+    #  to the previous update (the book is out of sync then).
+    def apply_diff(self, event):
+        if self.last_update_id is None:
+            return False
+        first_id = int(event['U'])
+        last_id = int(event['u'])
+        # Already contained by the snapshot.
+        if last_id <= self.last_update_id:
+            return False
+        if self.waiting_first_event:
+            connected = first_id <= self.last_update_id + 1
+        else:
+            connected = first_id == self.last_update_id + 1
+        if not self.synced or not connected:
+            self.synced = False
+            return False
+        self.bid_levels.update(*_levels(event['b']))
+        self.ask_levels.update(*_levels(event['a']))
+        self.last_update_id = last_id
+        self.waiting_first_event = False
+        return True
+
+    ## Seeds the book from the snapshot and applies the buffered events received around it.
+    #  @return true if the book is in sync afterwards.
+    def sync(self, snapshot, events):
+        self.apply_snapshot(snapshot, expect_events=True)
+        for event in events:
+            self.apply_diff(event)
+        return self.synced
+
+    def best_bid(self):
+        if len(self.bid_levels) == 0:
+            return None
+        return float(-self.bid_levels.keys[0])
+
+    def best_ask(self):
+        if len(self.ask_levels) == 0:
+            return None
+        return float(self.ask_levels.keys[0])
+
+    def mid_price(self):
+        if len(self.bid_levels) == 0 or len(self.ask_levels) == 0:
+            return None
+        return (self.best_bid() + self.best_ask()) / 2.0
+
+    ## Returns the best depth bid levels (descending prices).
+    def bids(self, depth=None):
+        return BookSide(-self.bid_levels.keys[:depth], self.bid_levels.volumes[:depth])
+
+    ## Returns the best depth ask levels (ascending prices).
+    def asks(self, depth=None):
+        return BookSide(self.ask_levels.keys[:depth], self.ask_levels.volumes[:depth])
+
+    ## Returns the volume resting at or better than the price.
+    #  @param side 'bid' or 'ask'
+    def cumulative_volume(self, side, price):
+        levels = self.bid_levels if side == 'bid' else self.ask_levels
+        count = int(np.searchsorted(levels.keys, price * levels.sign, side='right'))
+        if count == 0:
+            return 0.0
+        return float(levels.cumulative()[count - 1])
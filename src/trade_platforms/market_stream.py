@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+
+import websockets
+
+## Base url of the Binance market data streams.
+BINANCE_STREAM_URL = 'wss://stream.binance.com:9443'
+BINANCE_TESTNET_STREAM_URL = 'wss://stream.testnet.binance.vision'
+## First and maximal wait before reconnecting in seconds, the wait doubles after every failed attempt.
+RECONNECT_DELAY_MIN = 0.5
+RECONNECT_DELAY_MAX = 30.0
+
+
+def binance_stream_names(symbol, interval, depth_speed_ms=100):
+    """
+        Returns the bookTicker, diff-depth and kline stream names of a market.
+
+        Parameters:
+            - symbol (str): market symbol, for example 'BTCUSDT'.
+            - interval (str): kline interval, for example '1m'.
+            - depth_speed_ms (int): update speed of the depth stream, 100 or 1000.
+    """
+    symbol = symbol.lower()
+    return [f"{symbol}@bookTicker", f"{symbol}@depth@{depth_speed_ms}ms", f"{symbol}@kline_{interval}"]
+
+
+def stream_type(stream_name):
+    """Returns the type of a stream ('bookTicker', 'depth', 'kline', ...) from its name."""
+    return stream_name.split('@')[1].split('_')[0]
+
+
+## Market data stream client.
+#  Connects to a combined stream ({"stream": <name>, "data": <event>} messages) on an asyncio
+#  event loop running on a background thread and passes every event to the handler of its
+#  stream type. Dropped connections are reopened with an exponential back off, on_connect
+#  is called after every (re)connection so the consumers can resynchronize their state.
+class MarketStream():
+    def __init__(self, url, streams, handlers, on_connect=None):
+        self.url = f"{url}/stream?streams={'/'.join(streams)}"
+        ## Stream type -> function(event), see stream_type().
+        self.handlers = handlers
+        self.on_connect = on_connect
+        self.loop = None
+        self.thread = None
+        self.task = None
+        self.running = False
+        ## Set while the connection is open.
+        self.connected = threading.Event()
+        ## Number of reconnections after the first connection attempt.
+        self.reconnect_count = 0
+        ## Last connection or handler error.
+        self.last_error = None
+
+    ## Starts the background thread, the connection is opened asynchronously (see wait_connected()).
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name='MarketStream', daemon=True)
+        self.thread.start()
+
+    ## Closes the connection and stops the background thread.
+    def stop(self, timeout=5.0):
+        if self.thread is None:
+            return
+        self.running = False
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(timeout)
+        self.thread = None
+        self.connected.clear()
+
+    ## Waits until the connection is open.
+    #  @return true if it is open.
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self._listen())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    async def _listen(self):
+        delay = RECONNECT_DELAY_MIN
+        while self.running:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    delay = RECONNECT_DELAY_MIN
+                    if self.on_connect is not None:
+                        self.on_connect()
+                    self.connected.set()
+                    async for message in websocket:
+                        self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Closed connection, network or handshake error.
+                self.last_error = e
+            self.connected.clear()
+            if not self.running:
+                break
+            self.reconnect_count += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2.0, RECONNECT_DELAY_MAX)
+
+    def _dispatch(self, message):
+        message = json.loads(message)
+        if 'stream' not in message:
+            return
+        handler = self.handlers.get(stream_type(message['stream']))
+        if handler is None:
+            return
+        try:
+            handler(message['data'])
+        except Exception as e:
+            # A failing handler does not drop the connection.
+            self.last_error = e
@@ -0,0 +1,38 @@
+import threading
+
+
+def _empty_balance(coin, amount=0.0):
+    """Returns the balance record of a coin in the format of the simulated wallets."""
+    return {
+        "coin": coin,
+        "free": amount,
+        "spotBorrow": 0.0,
+        "total": amount,
+        "usdValue": amount,
+        "availableWithoutBorrow": amount
+    }
+
+
+## Simulated wallet balances of all coins, shared by the simulated markets of a run.
+#  A market trading BASE-QUOTE moves its base and quote coins, markets sharing a coin
+#  (for example the quote currency) spend the same balance.
+#  The markets are evaluated in parallel, balance updates have to hold the lock.
+class MultiAssetLedger():
+    def __init__(self):
+        ## Coin -> balance record (coin, free, spotBorrow, total, usdValue, availableWithoutBorrow).
+        self.balances = dict()
+        self.lock = threading.RLock()
+
+    ## Adds a coin with empty balance, known coins are kept.
+    def add_coin(self, coin):
+        with self.lock:
+            if coin not in self.balances:
+                self.balances[coin] = _empty_balance(coin)
+
+    ## Empties all balances and sets the start balance of a coin.
+    #  The balances dictionary is updated in place, the markets keep sharing it.
+    def set_start_balance(self, coin, balance):
+        with self.lock:
+            for known_coin in list(self.balances.keys()):
+                self.balances[known_coin] = _empty_balance(known_coin)
+            self.balances[coin] = _empty_balance(coin, balance)
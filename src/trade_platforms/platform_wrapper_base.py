@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from typing import List
 from enum import Enum
@@ -5,6 +6,8 @@ import pandas as pd
 import time
 import plotly.graph_objects as go
 
+from trade_platforms.cycle_scheduler import CycleScheduler
+
 
 ## Enum to identify platforms
 class Platforms(Enum):
@@ -12,6 +15,15 @@ class Platforms(Enum):
     Binance = "Binance"
 
 
+## Market data a cycle can fetch before trading, see PlatformWrapper.set_cycle_fetches().
+CYCLE_FETCH_ORDERBOOK = 'orderbook'
+CYCLE_FETCH_PRICE = 'price'
+CYCLE_FETCH_BALANCES = 'balances'
+CYCLE_FETCHES = (CYCLE_FETCH_ORDERBOOK, CYCLE_FETCH_PRICE, CYCLE_FETCH_BALANCES)
+## Depth of the orderbook fetched every cycle.
+CYCLE_ORDERBOOK_DEPTH = 100
+
+
 ## Base class for platfrom wrappers.
 # Implements all common functionalities
 # for platforms and platform simulators
@@ -39,6 +51,19 @@ class PlatformWrapper():
         self.start_time = datetime.now()
         ## Message showing details every cycle.
         self.cyclic_message_appendix = ''
+        ## Aligns the cycles to wall-clock boundaries instead of the fixed wait time, see set_cycle_alignment().
+        self.cycle_scheduler = None
+        ## Last fired CycleTick of the cycle scheduler.
+        self.cycle_tick = None
+        ## Data fetched at the beginning of every cycle, see set_cycle_fetches().
+        self.cycle_fetches = (CYCLE_FETCH_ORDERBOOK, CYCLE_FETCH_PRICE)
+        ## Seconds the cycle waits for its fetches, None waits until all of them are done.
+        self.cycle_fetch_deadline = None
+        ## Fetches run in parallel on the fetch executor, enabled on wrappers fetching from remote.
+        self.fetch_concurrently = False
+        self.fetch_executor = None
+        ## Balances fetched in the current cycle, see fetch_balances().
+        self.cycle_balances = None
 
     # Interface to place_order.
     def place_order(self):
@@ -94,6 +119,11 @@ class PlatformWrapper():
     def get_current_candle(self):
         return None
 
+    ## Returns the last count closed candles of a higher timeframe.
+    #  Implemented by the wrappers replaying candles.
+    def get_closed_candles(self, timeframe, count):
+        return None
+
     ## Fetches the current market price from remote.
     #  Implemented on real platform wrappers.
     def fetch_current_price(self):
@@ -108,6 +138,11 @@ class PlatformWrapper():
     def fetch_orderbook(self, depth):
         pass
 
+    ## Fetches the wallet balances from remote.
+    #  Implemented on real platform wrappers.
+    def fetch_balances(self):
+        return None
+
     ## Returns the current cycle timestamp.
     def get_cycle_timestamp(self):
         return self.cycle_timestamp
@@ -123,21 +158,71 @@ class PlatformWrapper():
 
     ## Evaluates processes common for all type of platforms.
     def evaluate(self, trade):
+        # The wait comes before the fetches, so the trade acts on fresh (streamed) market data.
+        if self.cycle_scheduler is None and self.sleep_time > 0:
+            time.sleep(self.sleep_time)
+        if self.cycle_scheduler is not None:
+            # Waits before fetching, so the cycle acts on the freshly closed candle.
+            self.cycle_tick = self.cycle_scheduler.wait()
+            if self.cycle_tick.missed > 0:
+                print(f"Cycle overrun: {self.cycle_tick.missed} cycle(s) skipped, \
+late by {self.cycle_tick.lateness:.3f}s")
         self.update_cycle_timestamp()
-        (self.current_bids, self.current_asks) = self.fetch_orderbook(100)
+        self._fetch_cycle_data()
         if self.allow_cycle_progress_print:
             print(f"Cycle: {self.cycle}, \
-time: {self.cycle_timestamp}, orders: {len(self.get_order_history())} \
+time: {self.cycle_timestamp}, orders: {self.get_open_order_count()} \
 {self.cyclic_message_appendix}")
             self.cycle += 1
-        self.current_price = self.fetch_current_price()
-        if self.sleep_time > 0:
-            time.sleep(self.sleep_time)
         running = True
         if trade is not None:
             running = trade()
         return (running, self.cycle_timestamp)
 
+    def _run_cycle_fetch(self, fetch):
+        if fetch == CYCLE_FETCH_ORDERBOOK:
+            return self.fetch_orderbook(CYCLE_ORDERBOOK_DEPTH)
+        if fetch == CYCLE_FETCH_PRICE:
+            return self.fetch_current_price()
+        return self.fetch_balances()
+
+    def _store_cycle_fetch(self, fetch, result):
+        if fetch == CYCLE_FETCH_ORDERBOOK:
+            (self.current_bids, self.current_asks) = result
+        elif fetch == CYCLE_FETCH_PRICE:
+            self.current_price = result
+        else:
+            self.cycle_balances = result
+
+    ## Fetches the declared data of the cycle (see set_cycle_fetches()).
+    #  Remote fetches are started at once, so the cycle waits about one round trip instead of their sum.
+    #  Data not fetched until the deadline keeps its previous value, the late fetch is cancelled
+    #  or its result is discarded, so data of a past cycle is never stored as fresh.
+    #  Every cycle starts its own fetches.
+    def _fetch_cycle_data(self):
+        self.cycle_balances = None
+        if not self.fetch_concurrently:
+            for fetch in self.cycle_fetches:
+                self._store_cycle_fetch(fetch, self._run_cycle_fetch(fetch))
+            return
+        if self.fetch_executor is None:
+            # Late fetches of the previous cycle may still occupy workers.
+            self.fetch_executor = ThreadPoolExecutor(
+                max_workers=2 * len(CYCLE_FETCHES), thread_name_prefix='CycleFetch')
+        futures = {
+            fetch: self.fetch_executor.submit(self._run_cycle_fetch, fetch)
+            for fetch in self.cycle_fetches}
+        wait(futures.values(), timeout=self.cycle_fetch_deadline)
+        late = list()
+        for (fetch, future) in futures.items():
+            if future.done():
+                self._store_cycle_fetch(fetch, future.result())
+            else:
+                future.cancel()
+                late.append(fetch)
+        if len(late) > 0:
+            print(f"Cycle fetch deadline missed: {', '.join(late)}, the previous data is used")
+
     def get_closed_order_history(
             self,
             side=None,
@@ -156,6 +241,11 @@ time: {self.cycle_timestamp}, orders: {len(self.get_order_history())} \
         """Returns the entire order history"""
         return None
 
+    ## Returns the number of open orders, cheap enough to be called every cycle.
+    #  None if the wrapper does not track its orders locally.
+    def get_open_order_count(self):
+        return None
+
     def get_account_info(self):
         return None
 
@@ -177,3 +267,37 @@ time: {self.cycle_timestamp}, orders: {len(self.get_order_history())} \
     def set_wait_time(self, sleep_seconds):
         """Sets the wait time between cycles when running the platform."""
         self.sleep_time = sleep_seconds
+
+    def set_cycle_alignment(self, period_sec, offset_sec=0.0):
+        """
+            Starts the cycles at wall-clock boundaries instead of waiting a fixed time between them.
+
+            Parameters:
+                - period_sec (int): cycle period in seconds, for example the candle resolution,
+                  None restores the fixed wait time.
+                - offset_sec (float): delay of the cycles after the boundaries in seconds.
+        """
+        self.cycle_scheduler = None if period_sec is None else CycleScheduler(period_sec, offset_sec)
+        self.cycle_tick = None
+
+    def get_cycle_stats(self):
+        """Returns the timing statistics of the aligned cycles, None without alignment."""
+        if self.cycle_scheduler is None:
+            return None
+        return self.cycle_scheduler.get_stats()
+
+    def set_cycle_fetches(self, fetches=(CYCLE_FETCH_ORDERBOOK, CYCLE_FETCH_PRICE), deadline_sec=None):
+        """
+            Declares the data fetched at the beginning of every cycle.
+
+            Parameters:
+                - fetches (list): CYCLE_FETCH_ORDERBOOK, CYCLE_FETCH_PRICE and/or CYCLE_FETCH_BALANCES,
+                  undeclared data is not fetched.
+                - deadline_sec (float): seconds the cycle waits for its fetches, data not fetched
+                  by then keeps its previous value, the late result is discarded. None waits until all fetches are done.
+        """
+        for fetch in fetches:
+            if fetch not in CYCLE_FETCHES:
+                raise Exception(f"Unknown cycle fetch: {fetch}")
+        self.cycle_fetches = tuple(fetches)
+        self.cycle_fetch_deadline = deadline_sec
@@ -0,0 +1,58 @@
+import threading
+import time
+
+
+## Thread safe token bucket throttling the requests sent to a platform.
+#  Tokens are request weights, they refill continuously up to the capacity.
+#  The bucket can be synchronized with the usage the platform reports
+#  (for example the X-MBX-USED-WEIGHT-1M header of Binance), so requests sent by other
+#  processes on the same IP are accounted for too.
+class TokenBucket():
+    def __init__(self, capacity, refill_per_sec):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        ## No tokens are given out before this time (monotonic seconds), see pause().
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_sec)
+        self.updated = now
+
+    ## Takes the tokens if they are available.
+    #  @return 0.0 if the tokens are taken, otherwise the seconds until they are available.
+    def try_acquire(self, tokens=1):
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.paused_until and self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return max(self.paused_until - now, (tokens - self.tokens) / self.refill_per_sec)
+
+    ## Waits until the tokens are available and takes them.
+    def acquire(self, tokens=1):
+        wait = self.try_acquire(tokens)
+        while wait > 0.0:
+            time.sleep(wait)
+            wait = self.try_acquire(tokens)
+
+    ## Limits the available tokens to what the platform reports as unused.
+    #  @param used the weight used within the current window reported by the platform.
+    def sync_used(self, used):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - used)
+
+    ## Gives out no tokens for the given time (for example after a HTTP 429 with Retry-After).
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+
+def request_weight_limiter(weight_per_minute):
+    """Returns a token bucket allowing weight_per_minute request weight per minute."""
+    return TokenBucket(weight_per_minute, weight_per_minute / 60.0)
@@ -0,0 +1,80 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+
+from trade_platforms.rate_limiter import TokenBucket
+
+## Request priorities, lower values are served first when the weight budget is short.
+PRIORITY_ORDER = 0
+PRIORITY_MARKET_DATA = 1
+PRIORITY_HISTORY = 2
+
+
+## Central scheduler of the REST requests of a platform.
+#  Every request takes its weight from the token bucket before it is sent.
+#  When the budget is short the requests wait in priority order (orders first, history last)
+#  instead of failing, and a request identical to one already waiting or in flight
+#  is not sent again, it gets the result of the first one.
+class RequestScheduler():
+    def __init__(self, rate_limiter: TokenBucket):
+        self.rate_limiter = rate_limiter
+        self.condition = threading.Condition()
+        ## Waiting requests, heap of (priority, sequence number).
+        self.waiting = list()
+        self.sequence = itertools.count()
+        ## Request key -> Future of the waiting or in flight request.
+        self.in_flight = dict()
+        ## Counters: 'sent', 'coalesced' and 'weight' (total weight taken).
+        self.stats = {'sent': 0, 'coalesced': 0, 'weight': 0}
+
+    ## Sends the request when its weight is available and returns its result.
+    #  @param key hashable identity of the request, identical concurrent requests are coalesced.
+    #  @param weight request weight of the call.
+    #  @param priority PRIORITY_ORDER, PRIORITY_MARKET_DATA or PRIORITY_HISTORY.
+    #  @param call function sending the request.
+    def submit(self, key, weight, priority, call):
+        with self.condition:
+            future = self.in_flight.get(key)
+            coalesced = future is not None
+            if coalesced:
+                self.stats['coalesced'] += 1
+            else:
+                future = Future()
+                self.in_flight[key] = future
+        if coalesced:
+            return future.result()
+        return self._run(key, min(weight, self.rate_limiter.capacity), priority, call, future)
+
+    def _run(self, key, weight, priority, call, future):
+        ticket = (priority, next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            while True:
+                # Only the first request in priority order may take tokens.
+                if self.waiting[0] == ticket:
+                    wait = self.rate_limiter.try_acquire(weight)
+                    if wait == 0.0:
+                        heapq.heappop(self.waiting)
+                        break
+                    self.condition.wait(wait)
+                else:
+                    self.condition.wait()
+            self.stats['sent'] += 1
+            self.stats['weight'] += weight
+            self.condition.notify_all()
+        try:
+            result = call()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.condition:
+                del self.in_flight[key]
+
+    ## Returns the number of requests waiting for their weight.
+    def waiting_count(self):
+        with self.condition:
+            return len(self.waiting)
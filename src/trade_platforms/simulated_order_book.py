@@ -0,0 +1,167 @@
+from bisect import bisect_left, bisect_right, insort
+import pandas as pd
+
+## Fields of a simulated order, they match the platform order history fields.
+ORDER_FIELDS = (
+    "avgFillPrice",
+    "clientId",
+    "createdAt",
+    "filledSize",
+    "future",
+    "id",
+    "ioc",
+    "market",
+    "postOnly",
+    "price",
+    "reduceOnly",
+    "remainingSize",
+    "side",
+    "size",
+    "status",
+    "type")
+
+
+## Compact record of a single simulated order.
+#  Fields are accessible both as attributes and dictionary style (order['price']),
+#  so the order execution code can handle it the same way as a platform order.
+class SimulatedOrder():
+    __slots__ = ORDER_FIELDS
+
+    def __init__(self, **fields):
+        for name in ORDER_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in ORDER_FIELDS}
+
+    def __repr__(self):
+        return f"SimulatedOrder({self.to_dict()})"
+
+
+## Orders of one side of the book grouped by price.
+#  Prices are kept sorted so the orders within a price range are found with a binary search.
+class _PriceLevels():
+    def __init__(self):
+        ## Sorted list of the prices that have at least one open order.
+        self.prices = list()
+        ## Price -> dictionary of order id -> order (in placement order).
+        self.levels = dict()
+
+    def add(self, order):
+        level = self.levels.get(order.price)
+        if level is None:
+            level = dict()
+            self.levels[order.price] = level
+            insort(self.prices, order.price)
+        level[order.id] = order
+
+    def remove(self, order):
+        level = self.levels.get(order.price)
+        if level is None or order.id not in level:
+            return False
+        del level[order.id]
+        if len(level) == 0:
+            del self.levels[order.price]
+            del self.prices[bisect_left(self.prices, order.price)]
+        return True
+
+    ## Returns the orders with low <= price <= high, lowest price first.
+    def in_range(self, low, high):
+        first = bisect_left(self.prices, low)
+        last = bisect_right(self.prices, high)
+        orders = list()
+        for price in self.prices[first:last]:
+            orders.extend(self.levels[price].values())
+        return orders
+
+
+## Price indexed store of the simulated orders.
+#  Open limit orders are kept in price levels per side, market orders in placement order.
+#  Every order (including the closed and cancelled ones) is reachable by id.
+class SimulatedOrderBook():
+    def __init__(self):
+        ## Order id -> order of every order placed.
+        self.orders_by_id = dict()
+        ## Open buy limit orders.
+        self.bids = _PriceLevels()
+        ## Open sell limit orders.
+        self.asks = _PriceLevels()
+        ## Open market orders, order id -> order.
+        self.market_orders = dict()
+        self.open_count = 0
+
+    def _side(self, order):
+        if order.side == 'buy':
+            return self.bids
+        return self.asks
+
+    ## Adds a new open order.
+    def add(self, order):
+        self.orders_by_id[order.id] = order
+        if order.type == 'market':
+            self.market_orders[order.id] = order
+        else:
+            self._side(order).add(order)
+        self.open_count += 1
+
+    def get(self, order_id):
+        return self.orders_by_id.get(order_id)
+
+    def _remove_open(self, order):
+        if order.type == 'market':
+            removed = self.market_orders.pop(order.id, None) is not None
+        else:
+            removed = self._side(order).remove(order)
+        if removed:
+            self.open_count -= 1
+        return removed
+
+    ## Cancels an open order.
+    #  @return the cancelled order, or None if it is unknown or not open anymore.
+    def cancel(self, order_id):
+        order = self.orders_by_id.get(order_id)
+        if order is None or not self._remove_open(order):
+            return None
+        order.status = 'cancelled'
+        return order
+
+    ## Removes the order from the open orders if it has been closed since.
+    def update(self, order):
+        if order.status == 'closed':
+            self._remove_open(order)
+
+    ## Returns the open market orders.
+    def open_market_orders(self):
+        return list(self.market_orders.values())
+
+    ## Returns the open limit orders with low <= price <= high.
+    #  @param side 'buy', 'sell' or None for both sides.
+    def limit_orders_in_range(self, low, high, side=None):
+        if side == 'buy':
+            return self.bids.in_range(low, high)
+        if side == 'sell':
+            return self.asks.in_range(low, high)
+        return self.bids.in_range(low, high) + self.asks.in_range(low, high)
+
+    ## Returns all open orders.
+    def open_orders(self):
+        orders = self.open_market_orders()
+        for levels in (self.bids, self.asks):
+            for price in levels.prices:
+                orders.extend(levels.levels[price].values())
+        return orders
+
+    ## Returns the open orders as a data frame.
+    def to_dataframe(self):
+        return pd.DataFrame(
+            [order.to_dict() for order in self.open_orders()],
+            columns=ORDER_FIELDS)
+
+    def __len__(self):
+        return self.open_count
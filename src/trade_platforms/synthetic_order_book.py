@@ -0,0 +1,69 @@
+import numpy as np
+
+from trade_platforms.fill_engine import BookSide
+
+
+def generate_order_book_ladders(
+        volumes, depth=10, spread=0.0002, level_step=0.0001, volume_fraction=0.05, seed=None):
+    """
+        Generates synthetic L2 order book ladders for a whole candle data set at once.
+        Ladders are relative to the mid price, so the book of a candle can be placed around
+        any price of the candle (see order_book_at()).
+
+        Parameters:
+            - volumes (np.ndarray): candle volumes, the liquidity of the book follows them.
+            - depth (int): number of levels per side.
+            - spread (float): average bid-ask spread relative to the mid price.
+            - level_step (float): average distance of the levels relative to the mid price.
+            - volume_fraction (float): part of the candle volume resting on each side of the book.
+            - seed (int or np.random.Generator): seed of the random generator.
+
+        Returns:
+            - (dict): 'bid_offsets', 'ask_offsets' (relative distance of the levels from the mid price,
+              increasing) and 'bid_volumes', 'ask_volumes', all (candle count, depth) arrays.
+    """
+    rng = np.random.default_rng(seed)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    shape = (len(volumes), depth)
+    # Deeper levels hold more volume.
+    profile = (1.0 + np.arange(depth) / depth) / (1.0 + (depth - 1) / (2.0 * depth)) / depth
+    level_volume = (volumes * volume_fraction)[:, np.newaxis] * profile
+    ladders = dict()
+    for side in ('bid', 'ask'):
+        half_spread = (spread / 2.0) * rng.uniform(0.5, 1.5, (len(volumes), 1))
+        gaps = level_step * rng.exponential(1.0, shape)
+        gaps[:, 0] = 0.0
+        ladders[f'{side}_offsets'] = half_spread + np.cumsum(gaps, axis=1)
+        ladders[f'{side}_volumes'] = level_volume * rng.gamma(2.0, 0.5, shape)
+    return ladders
+
+
+def order_book_at(ladders, row, price, depth=None):
+    """
+        Places the ladders of a candle around the price.
+
+        Returns:
+            - bids (BookSide): descending prices and volumes.
+            - asks (BookSide): ascending prices and volumes.
+    """
+    depth = ladders['bid_offsets'].shape[1] if depth is None else depth
+    return (
+        BookSide(price * (1.0 - ladders['bid_offsets'][row, :depth]), ladders['bid_volumes'][row, :depth]),
+        BookSide(price * (1.0 + ladders['ask_offsets'][row, :depth]), ladders['ask_volumes'][row, :depth]))
+
+
+def touching_side(ladders, row, price, side, depth=None) -> BookSide:
+    """
+        Places one side of the ladders of a candle so its best level is exactly at the price.
+        Used to match limit orders against a price the market traded at (for example the low
+        of the candle for buy orders, the asks are placed there).
+
+        Parameters:
+            - side (str): 'buy' for the asks a buy order crosses, 'sell' for the bids.
+    """
+    depth = ladders['bid_offsets'].shape[1] if depth is None else depth
+    if side == 'buy':
+        offsets = ladders['ask_offsets'][row, :depth]
+        return BookSide(price * (1.0 + (offsets - offsets[0])), ladders['ask_volumes'][row, :depth])
+    offsets = ladders['bid_offsets'][row, :depth]
+    return BookSide(price * (1.0 - (offsets - offsets[0])), ladders['bid_volumes'][row, :depth])
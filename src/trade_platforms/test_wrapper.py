@@ -2,63 +2,29 @@ from datetime import datetime, timedelta
 import pandas as pd
 import plotly.graph_objects as go
 from gui.popup import show_error_box
-from os.path import exists
 import time
-import random
+import numpy as np
 from typing import Callable
 
 from trade_platforms.validation_wrapper import ValidationWrapper
-from trade_platforms.binance_wrapper import Binance
-
-
-def _parse_resolution(resolution):
-    if resolution == '15m':
-        return 15
-    if resolution == '1m':
-        return 1
-
-
-def fragment_candle(candle):
-    diff = int(abs(candle['open'] - candle['close']))
-    fragments = [0]
-    sum = 0
-    for _ in range(1, 15):
-        fragment = random.randint(-30, 30)
-        fragments.append(fragment)
-        sum += fragment
-
-    if sum != 0 and diff != 0:
-        ratio = (sum / diff)
-    elif sum == 0 and diff != 0:
-        fragments[0] = -fragments[0]
-        sum += 2 * fragments[0]
-        ratio = (sum / diff)
-    elif sum != 0 and diff == 0:
-        ratio = (sum / (diff + 0.1))
-    else:
-        ratio = 1
-
-    final_fragments = []
-    for fragment in fragments:
-        fragment /= ratio
-        if sum != 0 and diff == 0:
-            fragment -= (0.1 / 15)
-        final_fragments.append(fragment)
-
-    sum = 0
-    for fragment in final_fragments:
-        sum += fragment
-
-    return final_fragments
+from trade_platforms.candle_columns import CandleColumns
+from trade_platforms.candle_history import CandleHistory
+from trade_platforms.candle_resampler import CandleResampler
+from trade_platforms.candle_paths import generate_candle_paths
+from trade_platforms.synthetic_order_book import generate_order_book_ladders, order_book_at, touching_side
+from trade_platforms.columnar_dataset import is_columnar_dataset, open_columnar_dataset
+from trade_platforms.dataset_coverage import read_coverage_report, coverage_ratio
+from trade_platforms.dataset_catalog import find_covering_datasets
 
 
 ## Test platform client wrapper.
 #  Simulates platform behavior using pregenerated test data.
 #  No connection is used to a real platform.
 class TestWrapper(ValidationWrapper):
-    def __init__(self, platforms, resolution_sec=60):
-        super(TestWrapper, self).__init__(platforms, "TestWrapper")
+    def __init__(self, platforms, resolution_sec=60, market=None):
+        super(TestWrapper, self).__init__(platforms, "TestWrapper", market)
         # Stores the test data set the wrapper will feed to the bot.
+        # It is held as NumPy columns (see @CandleColumns) so per cycle replay cost is constant.
         self.test_data = None
         # Start time of test data playback
         self.start_time = datetime(2021, 2, 1, 0, 0)
@@ -68,86 +34,247 @@ class TestWrapper(ValidationWrapper):
         self.test_data_location = None
         # Overall progress (for calculating progress percentage)
         self.time_progress = self.start_time
-        # Data is stored in chunks (for example daily),
-        # this progress count contains the progress
-        # of processing a single chunk. It is reset to 0 on a new chunk.
+        # Playback position (row index) in the test data.
         self.row_progress = 0
-        self.candle_progress = 0
-        self.candle_fragments = []
+        # First row of the playback.
+        self.start_row = 0
+        # Row after the last row of the playback.
+        self.end_row = 0
+        # Played data sets, list of (CandleColumns, first row, row after the last row).
+        # The interval can be played from several data sets one after another, see set_data_segments().
+        self.data_segments = list()
+        # Index of the played segment of data_segments.
+        self.segment_index = 0
+        # Start time of the previously played candle (epoch ns), None before the first candle.
+        self.previous_start_time = None
         ## See @PlatformWrapper
         self.allow_cycle_progress_print = False
+        ## The market data is replayed locally, the cycle fetches run in sequence.
+        self.fetch_concurrently = False
+        ## Headless mode, no popups and progress prints (for example in parameter sweep processes).
+        self.headless = False
         # Current chunk
         self.current_chunk = None
-        self.accumulated_history_candles = pd.DataFrame({
-            "close": [],
-            "high": [],
-            "low": [],
-            "open": [],
-            "startTime": [],
-            "volume": []
-        })
+        # Keeps the higher timeframe candles up to date, see set_resample_timeframes().
+        self.resampler = None
         self.candle_plot = None
         # Stores the candle resolution in minutes.
         self.resolution_sec = resolution_sec
         # When replaying historical data it is possible that some frames are missing.
         # This counter keeps count of those.
         self.missing_element_count = 0
+        # Ratio of the present candles of the playback interval based on the data set coverage report.
+        # None if the data set has no report.
+        self.data_coverage = None
+        # Detected gaps of the played back data, list of (first candle after the gap, missing candle count).
+        self.data_gaps = list()
         # Stores the historical data that has been already processed in the run.
-        if isinstance(self.platform, Binance):
-            self.candle_history = pd.DataFrame({
-                "startTime": [],
-                "open": [],
-                "high": [],
-                "low": [],
-                "close": [],
-                "volume": [],
-                "closeTime": [],
-                "quoteAssetVolume": [],
-                "noOfTrades": [],
-                "takerByBaseAssetVol": [],
-                "takerByQuoteAssetVol": [],
-                "ignore": []
-            })
+        # Unbounded by default, see set_history_capacity().
+        self.candle_history = CandleHistory()
+        # Number of sub-candle ticks per candle, 0 replays whole candles (see set_sub_candle_ticks()).
+        self.tick_count = 0
+        # Seed of the sub-candle path generator.
+        self.tick_seed = None
+        self.tick_rng = None
+        # Tick position within the current candle.
+        self.tick_progress = 0
+        # Price of the current and the previous tick.
+        self.tick_price = None
+        self.previous_tick_price = None
+        # Parameters of the synthetic order book, see set_synthetic_order_book().
+        self.order_book_settings = {
+            "depth": 10, "spread": 0.0002, "level_step": 0.0001, "volume_fraction": 0.05}
+        self.order_book_seed = None
+        self.order_book_rng = None
+        # Generated tick paths and order book ladders of the candles
+        # [block_first_row, block_first_row + block_size).
+        self.tick_paths = None
+        self.order_book_ladders = None
+        self.block_first_row = 0
+        # Number of candles the tick paths and order books are generated for at once.
+        # A block holds 4 * depth order book and tick_count tick path float64 values per candle.
+        self.block_size = 65536
 
     ## Sets the start and end time of the loadable test data.
-    #  @param test_data_location test data location
+    #  Columnar data sets are memory mapped, only the interval is read from disk,
+    #  HDF data sets are loaded entirely.
+    #  @param test_data_location test data location (.h5 file or .cols directory), a list of locations
+    #  in time order played one after another, or None to look the data sets covering the interval up
+    #  in the data set catalog (see trade_platforms.dataset_catalog).
     #  @param start_time test data feed starting time
     #  @param end_time test data feed end time
     def set_data_interval(self, test_data_location, start_time, end_time):
+        if test_data_location is None:
+            test_data_location = find_covering_datasets(
+                self._catalog_market(), "candles", start_time, end_time, self.resolution_sec)
+            if test_data_location is None:
+                raise Exception(
+                    f"set_data_interval(): No data set covers {start_time} - {end_time}")
         self.test_data_location = test_data_location
-        self.test_data = pd.HDFStore(self.test_data_location)['data']
-        self.test_data = self.test_data.reset_index(drop=True)
-        self.start_time = start_time
-        self.end_time = end_time
-        if self.start_time == self.end_time:
+        locations = [test_data_location] if isinstance(test_data_location, str) else test_data_location
+        # Data quality is checked from the coverage reports, without reading the data sets.
+        coverages = list()
+        for location in locations:
+            coverage_report = read_coverage_report(location)
+            if coverage_report is not None:
+                coverages.append(coverage_ratio(coverage_report, start_time, end_time))
+        self.data_coverage = min(coverages) if len(coverages) > 0 else None
+        if self.data_coverage is not None and self.data_coverage < 1.0 and not self.headless:
+            print(f"Test data covers {self.data_coverage * 100:.3f}% of the requested interval")
+        segments = list()
+        for location in locations:
+            if is_columnar_dataset(location):
+                segments.append(open_columnar_dataset(location, start_time, end_time))
+            else:
+                segments.append(CandleColumns.from_hdf(location))
+        self.set_data_segments(segments, start_time, end_time)
+
+    ## Returns the market of the wrapped platform in the form the data set catalog uses.
+    def _catalog_market(self):
+        return {
+            "platform_type": self.platform.name.split('-')[0],
+            "base_currency": self.platform.base_currency,
+            "quote_currency": self.platform.quote_currency}
+
+    ## Sets an already loaded test data set and the start and end time of the playback.
+    #  @param test_data CandleColumns data set
+    #  @param start_time test data feed starting time
+    #  @param end_time test data feed end time
+    def set_data_columns(self, test_data, start_time, end_time):
+        self.set_data_segments([test_data], start_time, end_time)
+
+    ## Sets already loaded test data sets played one after another, without copying them.
+    #  Every data set continues after the last candle played from the previous one,
+    #  so overlapping data sets are played once.
+    #  @param segments CandleColumns data sets in time order
+    #  @param start_time test data feed starting time
+    #  @param end_time test data feed end time
+    def set_data_segments(self, segments, start_time, end_time):
+        if start_time == end_time:
             raise Exception(
                 "set_data_interval(): Start and end times are the same")
+        self.data_segments = list()
+        next_time = pd.Timestamp(start_time).value
+        side = 'left'
+        for test_data in segments:
+            if not test_data.is_sorted():
+                test_data = test_data.sorted()
+            # Playback starts at the first candle at or after the start time.
+            first = test_data.seek(next_time, side=side)
+            last = test_data.seek(end_time, side='right')
+            if first < last:
+                self.data_segments.append((test_data, first, last))
+                next_time = int(test_data.start_time[last - 1])
+                side = 'right'
+        if len(self.data_segments) == 0:
+            raise Exception(
+                f"set_data_interval(): No candle found between {start_time} and {end_time}")
+        self.start_time = start_time
+        self.end_time = end_time
         self.time_progress = self.start_time
-        start = pd.to_datetime(start_time)
-        self.row_progress = \
-            self.test_data.index[self.test_data['startTime'] == start].values[0]
-
-    def _accumulate_history_candles(self, data, resolution):
-        data = data.iloc[0]
-        if len(self.accumulated_history_candles) == 0:
-            self.accumulated_history_candles = data
-            return self.accumulated_history_candles
-
-        if data['high'] > self.accumulated_history_candles['high']:
-            self.accumulated_history_candles['high'] = data['high']
-        if data['low'] < self.accumulated_history_candles['low']:
-            self.accumulated_history_candles['low'] = data['low']
-        self.accumulated_history_candles['volume'] += data['volume']
-        time_diff = data['startTime'] - self.accumulated_history_candles['startTime']
-        if time_diff >= timedelta(minutes=_parse_resolution(resolution)):
-            self.accumulated_history_candles = data
-        self.accumulated_history_candles['close'] = data['close']
-        return self.accumulated_history_candles
+        self.segment_index = 0
+        (self.test_data, self.row_progress, self.end_row) = self.data_segments[0]
+        self.start_row = self.row_progress
+        self.previous_start_time = None
+        self.missing_element_count = 0
+        self.data_gaps = list()
+        self._reset_ticks()
+
+    ## Continues the playback with the next data segment.
+    def _next_data_segment(self):
+        self.segment_index += 1
+        (self.test_data, self.row_progress, self.end_row) = self.data_segments[self.segment_index]
+        # Generated blocks are indexed by the rows of the played data set.
+        self.tick_paths = None
+        self.order_book_ladders = None
+
+    ## Enables sub-candle replay. Every candle is split to tick_count ticks along a generated
+    #  path consistent with its open/high/low/close (see generate_candle_paths()),
+    #  evaluate() steps one tick per cycle and limit orders fill in the order the path reaches them.
+    #  @param tick_count number of ticks per candle (at least 4), 0 replays whole candles.
+    #  @param seed seed of the path generator, the same seed replays the same paths.
+    def set_sub_candle_ticks(self, tick_count=15, seed=None):
+        self.tick_count = tick_count
+        self.tick_seed = seed
+        self._reset_ticks()
+
+    ## Sets the parameters of the synthetic L2 order book the orders are matched against
+    #  in Test mode (see generate_order_book_ladders()).
+    #  @param depth number of levels per side.
+    #  @param spread average bid-ask spread relative to the price.
+    #  @param level_step average distance of the levels relative to the price.
+    #  @param volume_fraction part of the candle volume resting on each side of the book.
+    #  @param seed seed of the order book generator.
+    def set_synthetic_order_book(
+            self, depth=10, spread=0.0002, level_step=0.0001, volume_fraction=0.05, seed=None):
+        self.order_book_settings = {
+            "depth": depth, "spread": spread, "level_step": level_step, "volume_fraction": volume_fraction}
+        self.order_book_seed = seed
+        self._reset_ticks()
+
+    def _reset_ticks(self):
+        self.tick_rng = np.random.default_rng(self.tick_seed)
+        self.order_book_rng = np.random.default_rng(self.order_book_seed)
+        self.tick_progress = 0
+        self.tick_price = None
+        self.previous_tick_price = None
+        self.tick_paths = None
+        self.order_book_ladders = None
+        self.block_first_row = 0
+
+    ## Returns the row of the candle at the playback position within the generated block.
+    #  Tick paths and order book ladders are generated for blocks of candles with single vectorized calls.
+    def _block_row(self):
+        row = self.row_progress - self.block_first_row
+        if self.order_book_ladders is None or row < 0 or \
+                row >= len(self.order_book_ladders['bid_offsets']):
+            first = self.row_progress
+            last = min(self.end_row, first + self.block_size)
+            columns = self.test_data.slice(first, last)
+            if self.tick_count > 0:
+                self.tick_paths = generate_candle_paths(
+                    columns['open'], columns['high'], columns['low'], columns['close'],
+                    self.tick_count, self.tick_rng)
+            volumes = columns['volume'] if 'volume' in columns else np.ones(last - first)
+            self.order_book_ladders = generate_order_book_ladders(
+                volumes, seed=self.order_book_rng, **self.order_book_settings)
+            self.block_first_row = first
+            row = 0
+        return row
+
+    ## Returns zero-copy column slices of the whole playback interval.
+    #  Used by the vectorized backtest, that processes the entire interval at once.
+    #  Columns of several data segments are concatenated (copied).
+    def get_data_columns(self):
+        if len(self.data_segments) == 1:
+            return self.test_data.slice(self.start_row, self.end_row)
+        slices = [test_data.slice(first, last) for (test_data, first, last) in self.data_segments]
+        return {name: np.concatenate([columns[name] for columns in slices])
+                for name in slices[0].keys() if all(name in columns for columns in slices)}
+
+    ## Limits the number of candles kept in the run history.
+    #  @param capacity maximum number of retained candles, None keeps all of them.
+    def set_history_capacity(self, capacity):
+        self.candle_history = CandleHistory(capacity)
+
+    ## Enables incremental resampling of the replayed candles to higher timeframes.
+    #  @param timeframes list of timeframes, for example ['5m', '1h', '1d']
+    #  @param capacity maximum number of retained closed candles per timeframe, None keeps all of them.
+    def set_resample_timeframes(self, timeframes, capacity=None):
+        self.resampler = CandleResampler(timeframes, self.resolution_sec, capacity)
+
+    ## Returns the last count closed candles of the timeframe.
+    def get_closed_candles(self, timeframe, count):
+        if self.resampler is None:
+            raise Exception("get_closed_candles(): set_resample_timeframes() has to be called first")
+        return self.resampler.get_closed_candles(timeframe, count)
 
     def historical_data(self, start_time, end_time, resolution_sec):
-        """Returns the historical test data."""
-        return self.candle_history[
-            self.candle_history['startTime'] >= start_time]
+        """
+            Returns the already replayed test data between start_time and end_time.
+            The returned data frame shares memory with the history buffer.
+        """
+        return self.candle_history.to_dataframe(start_time, end_time)
 
     # Updates the current cycle timestamp.
     def update_cycle_timestamp(self):
@@ -156,8 +283,11 @@ class TestWrapper(ValidationWrapper):
     def fetch_current_price(self):
         """
             Returns the current market ask. In test mode
-            that is the closing price of the candle.
+            that is the closing price of the candle,
+            or the price of the current tick in sub-candle replay.
         """
+        if self.tick_count > 0:
+            return self.tick_price
         return self.current_data['close']
 
     def get_candle_opening_price(self):
@@ -171,21 +301,23 @@ class TestWrapper(ValidationWrapper):
     def get_start_timestamp(self):
         return self.start_time
 
-    ## Fetches the orderbook from test data set.
+    ## Returns the synthetic orderbook around the current price.
+    #  @return (bids, asks) BookSide arrays.
     def fetch_orderbook(self, depth):
-        return (None, None)
+        row = self._block_row()
+        return order_book_at(self.order_book_ladders, row, self.fetch_current_price(), depth)
 
     ## Plots the historical data
     #  @param start_date Not used
     #  @param end_date Not used
     #  @param resolution Not used
     def plot_historical(self, start_date=None, end_date=None, resolution=None):
-        df = self.candle_history
+        df = self.candle_history.columns()
 
         self.candle_plot = go.Figure()
         self.candle_plot.update_layout(
             title={
-                'text': "USD/BTC",
+                'text': f"{self.USD}/{self.BASE}",
                 'x': 0.5,
                 'xanchor': 'center'
             },
@@ -195,7 +327,7 @@ class TestWrapper(ValidationWrapper):
         )
         self.candle_plot.add_trace(
             go.Candlestick(
-                x=df['startTime'],
+                x=df['startTime'].view('datetime64[ns]'),
                 open=df['open'],
                 high=df['high'],
                 low=df['low'],
@@ -209,48 +341,68 @@ class TestWrapper(ValidationWrapper):
     def show_candles(self):
         self.candle_plot.show()
 
-    ## Executes sell/buy action on a single order.
-    #  @param order the single order that needs action.
-    def _execute_single_order(self, order):
-        if order['side'] == 'buy':
-            self._execute_buy(order['price'], order['size'])
-            return self._update_order(order, order['size'])
-        else:
-            self._execute_sell(order['price'], order['size'])
-            return self._update_order(order, order['size'])
-
-    ## Evaluate orders.
-    #  Currently if it is a market order it will be executed on the average of the current
-    #  candle data 'open', 'close' values and if it is limit order, it will
-    #  action at order price if it is between the 'open' and 'close' values.
+    ## Evaluate orders on the synthetic orderbook, the same way as in Validation mode.
+    #  Market orders walk the orderbook around the current price. Limit orders are matched
+    #  against the orderbook touching the lowest (buy orders) and highest (sell orders) price
+    #  of the candle, or of the move from the previous to the current tick in sub-candle replay,
+    #  where limit orders are executed in the order the price reaches them.
     def evaluate_orders(self):
-        if self.get_current_price() >= self.lowest_order_price and \
-                self.get_current_price() <= self.highest_order_price:
-            # Only interested in orders, those prices are withing the current candle.
-            self.orders_of_interest = self.orders[
-                (self.orders['status'] != 'closed') &
-                (((self.current_data['high'] <= self.current_data['low']) &
-                 (self.orders['price'] >= self.current_data['high']) &
-                 (self.orders['price'] <= self.current_data['low'])) |
-                 ((self.current_data['high'] > self.current_data['low']) &
-                 (self.orders['price'] <= self.current_data['high']) &
-                 (self.orders['price'] >= self.current_data['low'])))]
-
-            self.orders_of_interest = \
-                self.orders_of_interest.apply(self._execute_single_order, axis=1)
-            self.order_placed = False
-            # # Throw away closed orders to increase performance.
-            # self.orders = self.orders[
-            #     ((self.current_data['open'] <= self.current_data['close']) &
-            #      ((self.orders['price'] < self.current_data['open']) |
-            #      (self.orders['price'] > self.current_data['close']))) |
-            #     ((self.current_data['open'] > self.current_data['close']) &
-            #      ((self.orders['price'] > self.current_data['open']) |
-            #      (self.orders['price'] < self.current_data['close'])))]
-
-            # Instead of removing closed orders, they state will change to closed
-            self.orders = pd.concat([self.orders, self.orders_of_interest])
-            self.orders = self.orders[self.orders['status'] == 'closed']
+        if self.tick_count > 0:
+            low = min(self.previous_tick_price, self.tick_price)
+            high = max(self.previous_tick_price, self.tick_price)
+        else:
+            low = min(self.current_data['low'], self.current_data['high'])
+            high = max(self.current_data['low'], self.current_data['high'])
+        row = self._block_row()
+        self._match_orders(
+            self.current_bids, self.current_asks,
+            limit_bids=touching_side(self.order_book_ladders, row, high, 'sell'),
+            limit_asks=touching_side(self.order_book_ladders, row, low, 'buy'),
+            falling=self.tick_count > 0 and self.tick_price < self.previous_tick_price)
+        self.order_placed = False
+
+    ## Returns the start time of the candle at the playback position.
+    def current_data_start_time(self):
+        return pd.Timestamp(int(self.test_data.start_time[self.row_progress])).to_pydatetime()
+
+    ## Returns the start time (epoch ns) of the candle the next evaluate() plays,
+    #  None at the end of the playback.
+    #  Used to replay several markets in time order.
+    def next_candle_time(self):
+        if self.test_data is None:
+            return None
+        (test_data, row) = (self.test_data, self.row_progress)
+        if row >= self.end_row:
+            if self.segment_index + 1 >= len(self.data_segments):
+                return None
+            (test_data, row, _) = self.data_segments[self.segment_index + 1]
+        return int(test_data.start_time[row])
+
+    ## Counts the candles missing between the previous and the current playback position.
+    def _check_data_gap(self):
+        start_time = int(self.test_data.start_time[self.row_progress])
+        previous_start_time = self.previous_start_time
+        self.previous_start_time = start_time
+        if previous_start_time is None:
+            return
+        missing = int((start_time - previous_start_time) // (self.resolution_sec * 1000000000)) - 1
+        if missing <= 0:
+            return
+        self.missing_element_count += missing
+        self.data_gaps.append((self.current_data_start_time(), missing))
+        if not self.headless:
+            print(f"Data gap: {missing} candle(s) missing before {self.current_data_start_time()}")
+
+    ## Prints the summary of the missing candles at the end of the playback.
+    def _report_data_gaps(self):
+        if self.headless or len(self.data_gaps) == 0:
+            return
+        print(f"Test data had {len(self.data_gaps)} gap(s), {self.missing_element_count} candle(s) missing")
+
+    ## Returns the detected gaps of the played back data.
+    #  @return list of (first candle after the gap, missing candle count)
+    def get_data_gaps(self):
+        return self.data_gaps
 
     def evaluate(self, trade: Callable[[], None]) -> tuple:
         """
@@ -265,32 +417,55 @@ class TestWrapper(ValidationWrapper):
                 - progress_time (int): returns the current progerss time.
         """
         begin = time.time()
-        if not exists(self.test_data_location):
-            show_error_box("Dataset does not exist")
+        if self.test_data is None:
+            if not self.headless:
+                show_error_box("Dataset does not exist")
             return (False, self.time_progress)
 
-        # Finish simulation when it is at the end of the data set.
-        if self.time_progress > self.end_time:
-            return (False, self.time_progress)
+        # Finish simulation when it is at the end of the last data segment.
+        if self.row_progress >= self.end_row:
+            if self.segment_index + 1 >= len(self.data_segments):
+                self._report_data_gaps()
+                return (False, self.time_progress)
+            self._next_data_segment()
+
+        # Playback follows the time index of the data set, missing candles are skipped and counted.
+        if self.tick_progress == 0:
+            self._check_data_gap()
+            self.current_data = self.test_data.candle(self.row_progress)
+            self.candle_history.append(self.current_data)
+            if self.resampler is not None:
+                self.resampler.update_candle(self.current_data)
+        self.time_progress = self.current_data_start_time()
+        if self.tick_count > 0:
+            row = self._block_row()
+            tick_path = self.tick_paths[row]
+            tick_length = timedelta(seconds=self.resolution_sec / self.tick_count)
+            self.time_progress += tick_length * self.tick_progress
+            self.tick_price = float(tick_path[self.tick_progress])
+            self.previous_tick_price = self.tick_price if self.tick_progress == 0 else \
+                float(tick_path[self.tick_progress - 1])
 
         # Calculate progress.
         percentage = ((self.time_progress - self.start_time) /
                       (self.end_time - self.start_time)) * 100
 
-        self.current_data = self.test_data.loc[self.row_progress]
-        self.candle_history = pd.concat(
-            [self.candle_history, pd.DataFrame([self.current_data])])
-
         (running, _) = super().evaluate(trade)
-        self.time_progress += timedelta(seconds=self.resolution_sec)
-        # if self.candle_progress >= 15:
-        #     self.candle_progress = -1
-        self.row_progress += 1
-        # self.candle_progress += 1
+        if self.tick_count > 0:
+            self.time_progress += tick_length
+            self.tick_progress += 1
+            if self.tick_progress == self.tick_count:
+                self.tick_progress = 0
+                self.row_progress += 1
+        else:
+            self.time_progress += timedelta(seconds=self.resolution_sec)
+            self.row_progress += 1
 
+        if self.headless:
+            return (running, self.time_progress)
         end = time.time()
         print(f"{percentage:.3f}% \
-exec time: {end - begin:.3f}, date: {self.current_data['startTime'] + timedelta(seconds=self.resolution_sec)}, \
+exec time: {end - begin:.3f}, date: {self.time_progress}, \
 orders: {len(self.orders)} {self.cyclic_message_appendix}")
 
         return (running, self.time_progress)
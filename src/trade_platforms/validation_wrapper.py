@@ -1,12 +1,13 @@
 from typing import List
-import pandas as pd
-import sys
 import decimal
+import numpy as np
 
 decimal.getcontext().prec = 6
 
 from trade_platforms.platform_wrapper_base import PlatformWrapper
-from trade_platforms.binance_wrapper import Binance
+from trade_platforms.multi_asset_ledger import MultiAssetLedger
+from trade_platforms.simulated_order_book import SimulatedOrder, SimulatedOrderBook
+from trade_platforms.fill_engine import as_book_side, crossing_volume, estimate_slippage, walk_book
 
 
 def truncate(value):
@@ -16,49 +17,38 @@ def truncate(value):
 ## Validation platform client wrapper.
 #  Gets all the data from the actual platform, but the actions
 #  are simulated in this class.
+#  A wrapper simulates one market, the wrappers of several markets share a MultiAssetLedger.
 class ValidationWrapper(PlatformWrapper):
-    def __init__(self, platforms, name="ValidationWrapper"):
+    def __init__(self, platforms, name="ValidationWrapper", market=None):
         super(ValidationWrapper, self).__init__(name)
-        # List of real platforms the validation shall happen on.
+        # Real platform of the simulated market, the first platform by default.
         self.platform = None
         if platforms is not None:
-            self.platform = list(platforms.values())[0]
+            self.platform = platforms[market] if market is not None else list(platforms.values())[0]
 
+        ## Base and quote currency of the simulated market.
+        self.BASE = 'BTC'
         self.USD = 'USDT'
+        if getattr(self.platform, 'base_currency', None) is not None:
+            self.BASE = self.platform.base_currency
+        if getattr(self.platform, 'quote_currency', None) is not None:
+            self.USD = self.platform.quote_currency
+        ## The market data is fetched from the real platform, in parallel.
+        self.fetch_concurrently = True
 
         ## Current datast element data of the processing.
         self.current_data = None
 
         # ---------- Balances
-        ## Simulated balance data.
+        ## Simulated balances, see share_ledger().
+        self.ledger = None
         self.balances = None
+        self.share_ledger(MultiAssetLedger())
         self.order_placed = False
 
         # ---------- Orders
-        ## Stores the highest order price ever made. Needed optimize order search
-        self.highest_order_price = 0
-        ## Stores the lowest order price ever made. Needed optimize order search
-        self.lowest_order_price = sys.maxsize
-        self.orders_of_interest = None
-        ## Simulated order history data frame
-        self.orders = pd.DataFrame({
-            "avgFillPrice": [],
-            "clientId": [],
-            "createdAt": [],
-            "filledSize": [],
-            "future": [],
-            "id": [],
-            "ioc": [],
-            "market": [],
-            "postOnly": [],
-            "price": [],
-            "reduceOnly": [],
-            "remainingSize": [],
-            "side": [],
-            "size": [],
-            "status": [],
-            "type": []})
-        self.orders.set_index('price')
+        ## Simulated orders, indexed by id and by price (see @SimulatedOrderBook).
+        self.orders = SimulatedOrderBook()
         ## Order id watermark.
         self.order_id_watermark = 0
 
@@ -98,26 +88,17 @@ class ValidationWrapper(PlatformWrapper):
         }
 
     ## Sets the inital test balance in quote currency.
+    #  The balances of the other coins of the ledger are emptied.
     #  @param balance Amount of the initial balance
     def set_start_balance(self, balance):
-        self.balances = {
-            self.USD: {
-                "coin": self.USD,
-                "free": balance,
-                "spotBorrow": 0.0,
-                "total": balance,
-                "usdValue": balance,
-                "availableWithoutBorrow": balance
-            },
-            "BTC": {
-                "coin": "BTC",
-                "free": 0.0,
-                "spotBorrow": 0.0,
-                "total": 0.0,
-                "usdValue": 0.0,
-                "availableWithoutBorrow": 0.0
-            }
-        }
+        self.ledger.set_start_balance(self.USD, balance)
+
+    ## Simulates the market on the balances of the ledger, shared with the other simulated markets.
+    def share_ledger(self, ledger):
+        self.ledger = ledger
+        self.balances = ledger.balances
+        ledger.add_coin(self.BASE)
+        ledger.add_coin(self.USD)
 
     ## Returns the simulation start timestamp.
     def get_start_timestamp(self):
@@ -133,50 +114,61 @@ The price will be replaced with market value')
         amount_in_usd = truncate(volume * price)
         if amount_in_usd == 0:
             return None
-        if side == 'buy' and self.balances[self.USD]['free'] < amount_in_usd:
-            return None
-        elif side == 'buy' and self.balances[self.USD]['free'] >= amount_in_usd:
-            self.balances[self.USD]['free'] -= amount_in_usd
-            self.balances[self.USD]['free'] = truncate(self.balances[self.USD]['free'])
-        elif side == 'sell' and self.balances['BTC']['free'] < volume:
-            return None
-        elif side == 'sell' and self.balances['BTC']['free'] >= volume:
-            self.balances['BTC']['free'] -= volume
-            self.balances['BTC']['free'] = truncate(self.balances['BTC']['free'])
-
-        if price > self.highest_order_price:
-            self.highest_order_price = price
-        if price < self.lowest_order_price:
-            self.lowest_order_price = price
+        # Other markets may spend the same coins in parallel.
+        with self.ledger.lock:
+            if side == 'buy' and self.balances[self.USD]['free'] < amount_in_usd:
+                return None
+            elif side == 'buy' and self.balances[self.USD]['free'] >= amount_in_usd:
+                self.balances[self.USD]['free'] -= amount_in_usd
+                self.balances[self.USD]['free'] = truncate(self.balances[self.USD]['free'])
+            elif side == 'sell' and self.balances[self.BASE]['free'] < volume:
+                return None
+            elif side == 'sell' and self.balances[self.BASE]['free'] >= volume:
+                self.balances[self.BASE]['free'] -= volume
+                self.balances[self.BASE]['free'] = truncate(self.balances[self.BASE]['free'])
 
         self.order_placed = True
-        new_order = pd.json_normalize({
-            "avgFillPrice": 0,
-            "clientId": None,
-            "createdAt": self.get_cycle_timestamp(),
-            "filledSize": 0.000,
-            "future": "BTC-USD",
-            "id": self.order_id_watermark,
-            "ioc": False,
-            "market": "BTC-USD",
-            "postOnly": False,
-            "price": price,
-            "reduceOnly": False,
-            "remainingSize": volume,
-            "side": side,
-            "size": volume,
-            "status": "open",
-            "type": type
-        })
-        self.orders = pd.concat([self.orders, new_order])
+        self.orders.add(SimulatedOrder(
+            avgFillPrice=0,
+            clientId=None,
+            createdAt=self.get_cycle_timestamp(),
+            filledSize=0.000,
+            future=f"{self.BASE}-{self.USD}",
+            id=self.order_id_watermark,
+            ioc=False,
+            market=f"{self.BASE}-{self.USD}",
+            postOnly=False,
+            price=price,
+            reduceOnly=False,
+            remainingSize=volume,
+            side=side,
+            size=volume,
+            status="open",
+            type=type))
 
         response = {"id": self.order_id_watermark}
         self.order_id_watermark += 1
         return response
 
-    ## Cancels the simulated order
+    ## Cancels the simulated order and releases its reserved balance.
+    #  @param order order id, or the order (response) holding the 'id'.
+    #  @return the cancelled order, None if it is unknown or not open anymore.
     def cancel_order(self, order):
-        pass
+        order_id = order
+        if not isinstance(order, int):
+            order_id = order['id']
+        cancelled = self.orders.cancel(order_id)
+        if cancelled is None:
+            return None
+        with self.ledger.lock:
+            if cancelled['side'] == 'buy':
+                self.balances[self.USD]['free'] += \
+                    truncate(cancelled['remainingSize'] * cancelled['price'])
+                self.balances[self.USD]['free'] = truncate(self.balances[self.USD]['free'])
+            else:
+                self.balances[self.BASE]['free'] += cancelled['remainingSize']
+                self.balances[self.BASE]['free'] = truncate(self.balances[self.BASE]['free'])
+        return cancelled
 
     ## Returns the current price.
     def fetch_current_price(self):
@@ -198,7 +190,11 @@ The price will be replaced with market value')
         return self.balances
 
     def get_order(self, order_id):
-        return self.orders[self.orders['id'] == order_id]
+        return self.orders.get(order_id)
+
+    ## Returns the number of open simulated orders, without building the order history.
+    def get_open_order_count(self):
+        return len(self.orders)
 
     def get_order_history(
             self,
@@ -209,35 +205,37 @@ The price will be replaced with market value')
         """
             Returns the full order history
             TODO: Implement filters.
-            Note: for performance purposes, all closed orders are thrown away
-            They are not retainable when calling the function.
+            Note: only the open orders are returned,
+            closed ones are still accessible through get_order().
         """
-        return self.orders
+        return self.orders.to_dataframe()
 
     ## Executes a buy order by updating the appropriate wallet values.
     def _execute_buy(self, price, volume):
         received_amount_btc = (volume - volume * self.account_info['takerFee'])
         amount_to_pay = volume * price
-        self.balances[self.USD]['total'] -= amount_to_pay
-        self.balances[self.USD]['usdValue'] = self.balances[self.USD]['total']
-        self.balances['BTC']['total'] += received_amount_btc
-        self.balances['BTC']['free'] += received_amount_btc
-        self.balances[self.USD]['total'] = truncate(self.balances[self.USD]['total'])
-        self.balances['BTC']['total'] = truncate(self.balances['BTC']['total'])
-        self.balances['BTC']['free'] = truncate(self.balances['BTC']['free'])
-        self.balances['BTC']['usdValue'] = self.balances['BTC']['total'] * price
+        with self.ledger.lock:
+            self.balances[self.USD]['total'] -= amount_to_pay
+            self.balances[self.USD]['usdValue'] = self.balances[self.USD]['total']
+            self.balances[self.BASE]['total'] += received_amount_btc
+            self.balances[self.BASE]['free'] += received_amount_btc
+            self.balances[self.USD]['total'] = truncate(self.balances[self.USD]['total'])
+            self.balances[self.BASE]['total'] = truncate(self.balances[self.BASE]['total'])
+            self.balances[self.BASE]['free'] = truncate(self.balances[self.BASE]['free'])
+            self.balances[self.BASE]['usdValue'] = self.balances[self.BASE]['total'] * price
 
     ## Executes a sell order by updating the appropriate wallet values.
     def _execute_sell(self, price, volume):
         amount_earned_usd = (volume - volume * self.account_info['takerFee']) * price
-        self.balances[self.USD]['total'] += amount_earned_usd
-        self.balances[self.USD]['free'] += amount_earned_usd
-        self.balances[self.USD]['total'] = truncate(self.balances[self.USD]['total'])
-        self.balances[self.USD]['free'] = truncate(self.balances[self.USD]['free'])
-        self.balances[self.USD]['usdValue'] = self.balances[self.USD]['total']
-        self.balances['BTC']['total'] -= volume
-        self.balances['BTC']['total'] = (self.balances['BTC']['total'])
-        self.balances['BTC']['usdValue'] = self.balances['BTC']['total'] * price
+        with self.ledger.lock:
+            self.balances[self.USD]['total'] += amount_earned_usd
+            self.balances[self.USD]['free'] += amount_earned_usd
+            self.balances[self.USD]['total'] = truncate(self.balances[self.USD]['total'])
+            self.balances[self.USD]['free'] = truncate(self.balances[self.USD]['free'])
+            self.balances[self.USD]['usdValue'] = self.balances[self.USD]['total']
+            self.balances[self.BASE]['total'] -= volume
+            self.balances[self.BASE]['total'] = (self.balances[self.BASE]['total'])
+            self.balances[self.BASE]['usdValue'] = self.balances[self.BASE]['total'] * price
 
     ## Updates the order after succesfull sell or buy.
     def _update_order(self, order, volume):
@@ -253,83 +251,88 @@ The price will be replaced with market value')
             raise Exception("Invalid filledSize and/or remainingSize")
         return order
 
-    ## Executes action on a single market order.
-    def _execute_market_action(self, order, orderbook, _execute_order):
-        for _, orderbook_item in orderbook.iterrows():
-            volume = orderbook_item['volume']
-            if volume > order['remainingSize']:
-                volume = order['remainingSize']
-            _execute_order(orderbook_item['price'], volume)
-            order = self._update_order(order, volume)
-            if order['status'] == 'closed':
-                break
-        return order
-
-    ## Executes action on a single limit order.
-    def _execute_limit_action(self, order, orderbook, _execute_order):
-        orderbook_item = \
-            orderbook[orderbook['price'] == round(order['price'])]
+    ## Executes a market order walking the opposite side of the orderbook.
+    #  The fills of all consumed levels are computed at once (see fill_engine.walk_book())
+    #  and the balances are updated once, at the volume weighted average price.
+    #  Levels better than the order price are not used.
+    #  @param bids, asks BookSide of the orderbook.
+    def _execute_market(self, order, bids, asks):
+        if order['side'] == 'buy':
+            usable = asks.price >= order['price']
+            (book_side, _execute_order) = (asks, self._execute_buy)
+        else:
+            usable = bids.price <= order['price']
+            (book_side, _execute_order) = (bids, self._execute_sell)
+        (vwap, filled, _) = walk_book(
+            book_side.price[usable], book_side.volume[usable], order['remainingSize'])
+        if filled <= 0.0:
+            return order
+        _execute_order(vwap, filled)
+        return self._update_order(order, filled)
 
+    ## Executes a limit order on the order price, against the volume of the opposite side
+    #  levels the limit price crosses.
+    #  @param bids, asks BookSide of the orderbook.
+    def _execute_limit(self, order, bids, asks):
+        if order['side'] == 'buy':
+            volume = crossing_volume(asks, order['price'], 'buy')
+            _execute_order = self._execute_buy
+        else:
+            volume = crossing_volume(bids, order['price'], 'sell')
+            _execute_order = self._execute_sell
         # No appropriate market ask/bid found in the orderbook.
-        if len(orderbook_item['volume']) == 0:
+        if volume <= 0.0:
             return order
-
-        volume = orderbook_item['volume'].iloc[0]
         if volume > order['remainingSize']:
             volume = order['remainingSize']
         _execute_order(order['price'], volume)
         return self._update_order(order, volume)
 
-    ## Checks the order side of a market order and executes the appropriate action
-    #  this can be either a sell or buy.
-    def _execute_market(self, order):
-        if order['side'] == 'buy':
-            orderbook = \
-                self.current_asks[self.current_asks['price'] >= order['price']]
-            return self._execute_market_action(
-                order, orderbook, self._execute_buy)
-        else:
-            orderbook = \
-                self.current_bids[self.current_bids['price'] <= order['price']]
-            return self._execute_market_action(
-                order, orderbook, self._execute_sell)
-
-    ## Checks the order side of a limit order and executes the appropriate action
-    #  this can be either a sell or buy.
-    def _execute_limit(self, order):
-        if order['side'] == 'buy':
-            return self._execute_limit_action(
-                order, self.current_asks, self._execute_buy)
-        else:
-            return self._execute_limit_action(
-                order, self.current_bids, self._execute_sell)
+    ## Estimates the slippage of market orders of many sizes on the current orderbook.
+    #  @param side 'buy' walks the asks, 'sell' walks the bids.
+    #  @param sizes order sizes in base currency.
+    #  @return (slippage, filled) arrays, see fill_engine.estimate_slippage().
+    def estimate_slippage(self, side, sizes):
+        orderbook = self.current_asks if side == 'buy' else self.current_bids
+        book_side = as_book_side(orderbook, side)
+        return estimate_slippage(book_side.price, book_side.volume, sizes)
+
+    ## Executes the open orders on the orderbook, shared by the Validation and Test modes.
+    #  Market orders walk bids/asks, limit orders are executed against the levels they cross
+    #  on limit_asks (buy orders) and limit_bids (sell orders), by default bids/asks.
+    #  Only the crossing limit orders are visited.
+    #  @param falling limit orders are executed in descending price order (the price was falling),
+    #  ascending by default.
+    def _match_orders(self, bids, asks, limit_bids=None, limit_asks=None, falling=False):
+        for order in self.orders.open_market_orders():
+            self.orders.update(self._execute_market(order, bids, asks))
+
+        limit_bids = bids if limit_bids is None else limit_bids
+        limit_asks = asks if limit_asks is None else limit_asks
+        orders_of_interest = list()
+        if len(limit_asks.price) > 0:
+            orders_of_interest += self.orders.limit_orders_in_range(
+                limit_asks.price[0], np.inf, side='buy')
+        if len(limit_bids.price) > 0:
+            orders_of_interest += self.orders.limit_orders_in_range(
+                -np.inf, limit_bids.price[0], side='sell')
+        orders_of_interest.sort(key=lambda order: order['price'], reverse=falling)
+        for order in orders_of_interest:
+            self.orders.update(self._execute_limit(order, limit_bids, limit_asks))
 
     ## Run through all orders and execute buy or sell if conditions are met.
     def evaluate_orders(self):
-        # Skip execution if none of the order prices are within range.
-        if self.get_current_price() >= self.lowest_order_price and \
-                self.get_current_price() <= self.highest_order_price:
-            self.orders_of_interest_market = self.orders[self.orders['type'] == 'market']
-            self.orders_of_interest_market = \
-                self.orders_of_interest_market.apply(self._execute_market, axis=1)
-            self.orders_of_interest_limit = \
-                self.orders[self.orders['type'] == 'limit']
-            self.orders_of_interest_limit = \
-                self.orders_of_interest_limit.apply(self._execute_limit, axis=1)
-            open_market_orders = \
-                self.orders_of_interest_market[
-                    self.orders_of_interest_market['status'] != 'closed']
-            open_limit_orders = \
-                self.orders_of_interest_limit[
-                    self.orders_of_interest_limit['status'] != 'closed']
-            self.orders = open_market_orders
-            self.orders = self.orders.append(open_limit_orders)
+        if self.current_asks is None or self.current_bids is None:
+            return
+        self._match_orders(
+            as_book_side(self.current_bids, 'sell'), as_book_side(self.current_asks, 'buy'))
 
     def evaluate(self, trade):
         """Evaluates validation tasks."""
         (running, now) = super().evaluate(trade)
-        self.balances['BTC']['usdValue'] = \
-            self.balances['BTC']['total'] * self.get_current_price()
+        with self.ledger.lock:
+            self.balances[self.BASE]['usdValue'] = \
+                self.balances[self.BASE]['total'] * self.get_current_price()
         self.evaluate_orders()
         return (running, now)
 
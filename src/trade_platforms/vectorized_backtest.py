@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+
+def _forward_fill(values, initial):
+    """Replaces NaN values with the last valid value (initial before the first one)."""
+    valid = ~np.isnan(values)
+    index = np.where(valid, np.arange(len(values)), -1)
+    np.maximum.accumulate(index, out=index)
+    filled = values[np.maximum(index, 0)]
+    filled[index < 0] = initial
+    return filled
+
+
+## Result of a vectorized backtest.
+class VectorizedBacktestResult():
+    def __init__(self, start_time, price, positions, equity, fees):
+        ## Candle start times.
+        self.start_time = start_time
+        ## Prices the positions were evaluated and traded on.
+        self.price = price
+        ## Held fraction of the equity in base currency after each candle.
+        self.positions = positions
+        ## Equity in quote currency after each candle (fees deduced).
+        self.equity = equity
+        ## Fee paid in quote currency on each candle.
+        self.fees = fees
+
+    @property
+    def start_balance(self):
+        return float(self.equity[0] + self.fees[0])
+
+    @property
+    def final_balance(self):
+        return float(self.equity[-1])
+
+    @property
+    def total_return(self):
+        return self.final_balance / self.start_balance - 1.0
+
+    ## Number of candles the position was changed on.
+    @property
+    def trade_count(self):
+        return int(np.count_nonzero(self.fees))
+
+    ## Largest relative drop of the equity from its running maximum.
+    @property
+    def max_drawdown(self):
+        running_max = np.maximum.accumulate(self.equity)
+        return float(np.max(1.0 - self.equity / running_max))
+
+    def metrics(self):
+        return {
+            "start_balance": self.start_balance,
+            "final_balance": self.final_balance,
+            "total_return": self.total_return,
+            "max_drawdown": self.max_drawdown,
+            "trade_count": self.trade_count,
+            "total_fees": float(np.sum(self.fees))
+        }
+
+    def to_dataframe(self):
+        return pd.DataFrame({
+            "startTime": self.start_time.view('datetime64[ns]'),
+            "price": self.price,
+            "position": self.positions,
+            "equity": self.equity,
+            "fee": self.fees}, copy=False)
+
+
+def run_vectorized_backtest(
+        candles: dict, positions, start_balance: float, fee: float,
+        initial_position: float = 0.0, price_column: str = 'close') -> VectorizedBacktestResult:
+    """
+        Computes fills, fees and the equity curve of a target position series in bulk.
+
+        The target position of a candle is traded on the price of the same candle
+        (the closing price by default, like a market order in Test mode),
+        and held until the next candle.
+        Positions are fractions of the equity kept in base currency (0 = all quote, 1 = all base).
+        NaN positions keep the previous position.
+        The held fraction is treated as constant between changes,
+        fees are only paid on the changes (the drift of the fraction is not rebalanced).
+
+        Parameters:
+            - candles (dict): column name -> NumPy array, needs startTime and the price column.
+            - positions (array): target positions, one per candle.
+            - start_balance (float): starting equity in quote currency.
+            - fee (float): taker fee ratio paid on the traded amount.
+            - initial_position (float): position held before the first candle.
+            - price_column (str): the column the positions are traded on.
+
+        Returns:
+            - (VectorizedBacktestResult): the equity curve, positions and fees.
+    """
+    price = np.asarray(candles[price_column], dtype=np.float64)
+    positions = _forward_fill(np.asarray(positions, dtype=np.float64), initial_position)
+    if len(positions) != len(price):
+        raise Exception("run_vectorized_backtest(): positions and candles lengths differ")
+
+    held = np.empty_like(positions)
+    held[0] = initial_position
+    held[1:] = positions[:-1]
+    returns = np.zeros_like(price)
+    returns[1:] = price[1:] / price[:-1] - 1.0
+    turnover = np.abs(positions - held)
+
+    growth = 1.0 + held * returns
+    fee_ratio = fee * turnover
+    equity = start_balance * np.cumprod(growth * (1.0 - fee_ratio))
+    fees = equity / (1.0 - fee_ratio) * fee_ratio
+    return VectorizedBacktestResult(
+        np.asarray(candles['startTime']), price, positions, equity, fees)